@@ -0,0 +1,3 @@
+# Benchmarks of the training stack, run through the benchmark command of main.py.
+# The suites import the modules they measure themselves, so that importing this
+# package stays cheap.
@@ -0,0 +1,209 @@
+import os
+import copy
+import json
+import time
+import logging
+import argparse
+import subprocess
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger()
+
+# train arguments of the reduced configuration, applied before the ones given
+# to the benchmark, so that any of them can be overridden
+DEFAULT_TRAIN_ARGS: List[str] = [
+    "--fps", "0",
+    "--headless",
+    "--warm-start",
+    "--observe-for", "5000",
+    "--explore", "100000",
+    "--max-replay", "20000",
+    "--max-frames", "300000",
+    "--checkpoint-freq", "100000",
+    "--metrics-interval", "30"
+]
+
+
+def get_commit() -> Optional[str]:
+    """
+    Gets the commit the benchmark is run on, so that results can be matched to it.
+
+    Returns:
+        Optional[str]: The hash of the commit, or None if it can't be found.
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class TimeToScore:
+    """
+    Evaluates the greedy policy during training, recording the training time and
+    frames needed to first reach every target score. Used as the callback of
+    :meth:`Solver.train_network`, stopping training once every target is reached
+    or the time budget is spent. The time spent evaluating is not counted.
+    """
+
+    def __init__(self, solver, targets: Sequence[float], eval_every: int, eval_episodes: int,
+                 max_seconds: Optional[float], seed: int):
+        """
+        Args:
+            solver (Solver): The solver being trained.
+            targets (Sequence[float]): The mean greedy scores to reach.
+            eval_every (int): The number of frames between evaluations.
+            eval_episodes (int): The number of episodes per evaluation.
+            max_seconds (Optional[float]): The training time budget. Unlimited if None.
+            seed (int): The seed of the evaluation games, the same games are played by every evaluation.
+        """
+
+        self.solver = solver
+        self.targets = sorted(targets)
+        self.eval_every = eval_every
+        self.eval_episodes = eval_episodes
+        self.max_seconds = max_seconds
+        self.seed = seed
+
+        # the frames and training seconds at which every target was reached
+        self.reached: Dict[float, Dict[str, float]] = {}
+        # the results of every evaluation
+        self.evals: List[Dict[str, Any]] = []
+        # the frame and training seconds when training stopped
+        self.frames = 0
+        self.seconds = 0.0
+
+        self._start = time.perf_counter()
+        self._eval_seconds = 0.0
+
+    @property
+    def training_seconds(self) -> float:
+        return time.perf_counter() - self._start - self._eval_seconds
+
+    def __call__(self, frame: int) -> bool:
+        self.frames = frame
+        self.seconds = self.training_seconds
+
+        if frame % self.eval_every == 0:
+            self._evaluate(frame)
+
+        done = len(self.reached) == len(self.targets)
+        out_of_time = self.max_seconds is not None and self.seconds >= self.max_seconds
+        return done or out_of_time
+
+    def _evaluate(self, frame: int) -> None:
+        from net.evaluation import evaluate
+        from net.runtime import Policy
+
+        start = time.perf_counter()
+
+        # capping the score, a good policy would otherwise play forever
+        model = self.solver.model
+        model.eval()
+        results = evaluate(Policy.from_module(model, self.solver.device), self.eval_episodes,
+                           frames_per_action=self.solver.args.frames_per_action, max_score=int(np.ceil(self.targets[-1])),
+                           seed=self.seed)
+        model.train()
+
+        self._eval_seconds += time.perf_counter() - start
+
+        score = results['score_mean']
+        self.evals.append({'frame': frame, 'seconds': self.seconds, 'score_mean': score,
+                           'score_max': results['score_max']})
+        for target in self.targets:
+            if target not in self.reached and score >= target:
+                self.reached[target] = {'frames': frame, 'seconds': self.seconds}
+                logger.info("Reached a mean score of %g at frame %d, after %.1f seconds", target, frame, self.seconds)
+
+
+def run_end_to_end(train_args: argparse.Namespace, seeds: Sequence[int], targets: Sequence[float], eval_every: int,
+                   eval_episodes: int, max_seconds: Optional[float]) -> Dict[str, Any]:
+    """
+    Trains from scratch once per seed, measuring the time to reach the target
+    greedy scores. Every run writes to its own experiment folder, inside the
+    benchmark's.
+
+    Args:
+        train_args (argparse.Namespace): The arguments of the train command.
+        seeds (Sequence[int]): The seeds, one run each.
+        targets (Sequence[float]): The mean greedy scores to reach.
+        eval_every (int): The number of frames between evaluations.
+        eval_episodes (int): The number of episodes per evaluation.
+        max_seconds (Optional[float]): The training time budget of every run. Unlimited if None.
+
+    Returns:
+        Dict[str, Any]: The configuration, the results of every run and a summary per target.
+    """
+
+    from net import Solver
+    from net.utils import CheckpointManager
+
+    runs = []
+    for seed in seeds:
+        args = copy.copy(train_args)
+        args.seed = seed
+        args.exp_name = os.path.join(train_args.exp_name, f"seed_{seed}")
+
+        checkpoint_mgr = CheckpointManager('model', args.out_dir, args.exp_name, frequency=args.checkpoint_freq)
+        if checkpoint_mgr.latest() is not None:
+            raise ValueError(f"{checkpoint_mgr.out_dir} already has checkpoints, the runs must start from scratch")
+
+        logger.info("Running seed %d", seed)
+        solver = Solver(args, checkpoint_mgr)
+        tracker = TimeToScore(solver, targets, eval_every, eval_episodes, max_seconds, seed=seed)
+        solver.train_network(callback=tracker)
+
+        runs.append({
+            'seed': seed,
+            'frames': tracker.frames,
+            'seconds': tracker.seconds,
+            'reached': {str(target): tracker.reached.get(target) for target in tracker.targets},
+            'evals': tracker.evals
+        })
+
+    # summarizing every target over the seeds
+    summary = {}
+    for target in sorted(targets):
+        reached = [run['reached'][str(target)] for run in runs if run['reached'][str(target)] is not None]
+        summary[str(target)] = {
+            'reached': len(reached),
+            'runs': len(runs),
+            'frames_median': float(np.median([r['frames'] for r in reached])) if reached else None,
+            'seconds_median': float(np.median([r['seconds'] for r in reached])) if reached else None
+        }
+
+    return {
+        'commit': get_commit(),
+        'config': {k: v for k, v in vars(train_args).items() if k not in ("exp_name", "out_dir")},
+        'seeds': list(seeds),
+        'targets': sorted(targets),
+        'eval_every': eval_every,
+        'eval_episodes': eval_episodes,
+        'max_seconds': max_seconds,
+        'summary': summary,
+        'runs': runs
+    }
+
+
+def write_results(results: Dict[str, Any], path: str) -> None:
+    """
+    Writes the results to a JSON file, and logs the summary.
+
+    Args:
+        results (Dict[str, Any]): The results of :func:`run_end_to_end`.
+        path (str): The path of the JSON file.
+    """
+
+    with open(path, "w") as f:
+        json.dump(results, f, indent=4)
+
+    for target, summary in results['summary'].items():
+        if summary['reached'] == 0:
+            logger.info("Score %s: not reached in %d run(s)", target, summary['runs'])
+        else:
+            logger.info("Score %s: reached in %d/%d run(s), median %.0f frames, %.1f seconds", target,
+                        summary['reached'], summary['runs'], summary['frames_median'], summary['seconds_median'])
+    logger.info("Results written to %s", path)
@@ -0,0 +1,239 @@
+import time
+import logging
+import resource
+import tempfile
+import tracemalloc
+from typing import Dict, Any, List, Callable, Sequence
+
+import numpy as np
+
+import torch
+import torch.optim as optim
+import torch.nn.functional as F
+
+from net.model import Model
+from net.replay import ReplayMemory
+from net.solver import td_targets
+from net.utils import CheckpointManager
+
+logger = logging.getLogger()
+
+# number of valid actions
+NUM_ACTIONS: int = 2
+
+
+def measure(name: str, fn: Callable[[], Any], iterations: int, items: int = 1, warmup: int = 5,
+            device: torch.device = torch.device("cpu"), **params) -> Dict[str, Any]:
+    """
+    Times a function, along with the memory it allocates at its peak.
+
+    Args:
+        name (str): The name of the benchmark.
+        fn (Callable[[], Any]): The function, called once per iteration.
+        iterations (int): The number of timed iterations.
+        items (int): The number of items (transitions, samples, etc.) processed per iteration.
+        warmup (int): The number of untimed iterations run first.
+        device (torch.device): The device the function runs on, synchronized after every iteration.
+        **params: The parameters of the benchmark, stored with the results.
+
+    Returns:
+        Dict[str, Any]: The timings, throughput and peak memory.
+    """
+
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+
+    for _ in range(warmup):
+        fn()
+    sync()
+
+    if device.type == "cuda":
+        # torch < 1.4 only has the older name, deprecated since
+        if hasattr(torch.cuda, "reset_peak_memory_stats"):
+            torch.cuda.reset_peak_memory_stats(device)
+        else:
+            torch.cuda.reset_max_memory_allocated(device)
+    # numpy reports its allocations to tracemalloc, torch's cpu allocations are
+    # only visible in the peak resident set size
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+
+    times = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        sync()
+        times[i] = time.perf_counter() - start
+
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on linux
+    rss_increase = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+
+    result = {
+        'name': name,
+        'params': params,
+        'iterations': iterations,
+        'mean_ms': float(times.mean() * 1000),
+        'p50_ms': float(np.percentile(times, 50) * 1000),
+        'p90_ms': float(np.percentile(times, 90) * 1000),
+        'items_per_second': float(items * iterations / times.sum()),
+        'traced_peak_mb': traced_peak / 2 ** 20,
+        'rss_peak_increase_mb': rss_increase / 2 ** 20
+    }
+    if device.type == "cuda":
+        result['cuda_peak_mb'] = torch.cuda.max_memory_allocated(device) / 2 ** 20
+
+    logger.info("%s %s: %.3f ms (p90 %.3f ms), %.1f items/sec, peak %.1f MB traced", name, params,
+                result['mean_ms'], result['p90_ms'], result['items_per_second'], result['traced_peak_mb'])
+    return result
+
+
+def _fill(replay: ReplayMemory, rng: np.random.Generator, chunk_size: int = 4096) -> None:
+    """
+    Fills a replay memory with random transitions.
+    """
+
+    while len(replay) < replay.capacity:
+        n = min(chunk_size, replay.capacity - len(replay))
+        frames = rng.integers(0, 256, (n,) + replay.frame_shape, dtype=np.uint8)
+        replay.extend(frames, rng.integers(0, NUM_ACTIONS, n), rng.random(n, dtype=np.float32), frames,
+                      rng.random(n) < 0.01)
+
+
+def bench_replay(replay_sizes: Sequence[int], batch_sizes: Sequence[int], iterations: int,
+                 device: torch.device) -> List[Dict[str, Any]]:
+    """
+    Benchmarks appending to the replay memory, assembling minibatches as numpy
+    arrays and sampling them as tensors on the device.
+    """
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (84, 84), dtype=np.uint8)
+
+    results = []
+    for size in replay_sizes:
+        results.append(measure("replay/allocate", lambda: ReplayMemory(size), iterations=3, warmup=0,
+                               max_replay=size))
+
+        replay = ReplayMemory(size)
+        results.append(measure("replay/append", lambda: replay.append(frame, 1, 0.1, frame, False),
+                               iterations=iterations * 10, max_replay=size))
+
+        _fill(replay, rng)
+        for batch_size in batch_sizes:
+            out = tuple(np.empty((batch_size,) + getattr(replay, field).shape[1:], dtype=getattr(replay, field).dtype)
+                        for field in ReplayMemory.FIELDS)
+            results.append(measure("replay/gather", lambda: replay.gather(batch_size, out=out), iterations,
+                                   items=batch_size, max_replay=size, batch_size=batch_size))
+            results.append(measure("replay/sample", lambda: replay.sample(batch_size, device), iterations,
+                                   items=batch_size, device=device, max_replay=size, batch_size=batch_size))
+
+    return results
+
+
+def bench_model(batch_sizes: Sequence[int], iterations: int, device: torch.device,
+                gamma: float = 0.99) -> List[Dict[str, Any]]:
+    """
+    Benchmarks the forward and backward passes of the model, computing the TD
+    targets and stepping the optimizer.
+    """
+
+    model = Model(input_dim=(84, 84)).to(device)
+    optimizer = optim.Adam(model.parameters(), lr=1e-4)
+
+    results = []
+    for batch_size in batch_sizes:
+        states = torch.rand(batch_size, 1, 84, 84, device=device)
+        actions = F.one_hot(torch.randint(NUM_ACTIONS, (batch_size,), device=device), NUM_ACTIONS).float()
+        rewards = torch.rand(batch_size, device=device)
+        terminals = torch.rand(batch_size, device=device) < 0.01
+        next_q_values = torch.rand(batch_size, NUM_ACTIONS, device=device)
+
+        def forward():
+            with torch.no_grad():
+                model(states)
+
+        def backward():
+            optimizer.zero_grad()
+            q_values = torch.sum(model(states) * actions, dim=1)
+            F.mse_loss(q_values, rewards).backward()
+
+        results.append(measure("model/forward", forward, iterations, items=batch_size, device=device,
+                               batch_size=batch_size))
+        results.append(measure("model/forward_backward", backward, iterations, items=batch_size, device=device,
+                               batch_size=batch_size))
+        results.append(measure("td_targets", lambda: td_targets(rewards, terminals, next_q_values, gamma),
+                               iterations, items=batch_size, device=device, batch_size=batch_size))
+
+    # the step doesn't depend on the batch size, the gradients are left from the backward passes
+    results.append(measure("optimizer/step", optimizer.step, iterations, device=device))
+
+    return results
+
+
+def bench_checkpoint(replay_sizes: Sequence[int], iterations: int) -> List[Dict[str, Any]]:
+    """
+    Benchmarks saving and restoring checkpoints, with and without the replay memory.
+    """
+
+    rng = np.random.default_rng(0)
+    model = Model(input_dim=(84, 84))
+    optimizer = optim.Adam(model.parameters(), lr=1e-4)
+
+    results = []
+    for size in replay_sizes:
+        replay = ReplayMemory(size)
+        _fill(replay, rng)
+
+        for save_replay in (False, True):
+            with tempfile.TemporaryDirectory() as out_dir:
+                checkpoint_mgr = CheckpointManager('model', out_dir, "benchmark", frequency=1, retain=2,
+                                                   save_replay=save_replay)
+                frames = iter(range(10 ** 9))
+
+                results.append(measure(
+                    "checkpoint/save", lambda: checkpoint_mgr.save(model, optimizer, next(frames), 0.1, replay=replay),
+                    iterations, warmup=1, max_replay=size, replay=save_replay
+                ))
+                results.append(measure(
+                    "checkpoint/restore", lambda: checkpoint_mgr.restore(model, optimizer, replay=replay),
+                    iterations, warmup=1, max_replay=size, replay=save_replay
+                ))
+
+    return results
+
+
+def run_learner(replay_sizes: Sequence[int], batch_sizes: Sequence[int], iterations: int,
+                device: torch.device) -> Dict[str, Any]:
+    """
+    Benchmarks the learner alone, without an emulator: the replay memory, the
+    model, the TD targets, the optimizer and the checkpoints.
+
+    Args:
+        replay_sizes (Sequence[int]): The replay memory sizes to benchmark.
+        batch_sizes (Sequence[int]): The batch sizes to benchmark.
+        iterations (int): The number of timed iterations per benchmark. Checkpoints
+            use a tenth of them.
+        device (torch.device): The device to run the model on.
+
+    Returns:
+        Dict[str, Any]: The configuration and the results of every benchmark.
+    """
+
+    from benchmarks.end_to_end import get_commit
+
+    results = bench_replay(replay_sizes, batch_sizes, iterations, device)
+    results += bench_model(batch_sizes, iterations, device)
+    results += bench_checkpoint(replay_sizes, max(1, iterations // 10))
+
+    return {
+        'commit': get_commit(),
+        'device': str(device),
+        'torch_threads': torch.get_num_threads(),
+        'replay_sizes': list(replay_sizes),
+        'batch_sizes': list(batch_sizes),
+        'results': results,
+        'rss_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
@@ -5,4 +5,6 @@ GRAVITY = 0.75
 PIPE_VGAP = 200
 PIPE_HGAP = 300
 PIPE_SPEED = 3
+PIPE_WIDTH = 100
+PIPE_HEIGHT = 400
 JUMP_SPEED = 10
@@ -1,4 +1,4 @@
-from typing import List, Tuple, Callable, Dict, Union
+from typing import List, Tuple, Callable, Dict, Union, Optional
 from abc import ABC, abstractmethod
 from enum import Enum
 import pygame
@@ -13,14 +13,45 @@ class Entity:
         self.tag = tag
         self.remove = False
 
+        # the components used every frame, cached to avoid looking them up
+        self.transform_component: Optional['TransformComponent'] = None
+        self.render_component: Optional['RenderComponent'] = None
+        self.collision_component: Optional['CollisionComponent'] = None
+
+        # the geometry of the entity, cached when its render component is added,
+        # since the image of an entity doesn't change
+        self.width: float = 0
+        self.height: float = 0
+        self.half_width: float = 0
+        self.half_height: float = 0
+
     def add_component(self, component: 'Component') -> None:
         self.components.update({component.id: component})
+        self._cache_component(component.id)
 
     def remove_component(self, component_id: 'ComponentID') -> None:
         try:
             del self.components[component_id]
         except KeyError:
             pass
+        self._cache_component(component_id)
+
+    def _cache_component(self, component_id: 'ComponentID') -> None:
+        """
+        Updates the cached component, and the geometry derived from it, after
+        the component with the given id is added or removed.
+        """
+
+        component = self.components.get(component_id)
+        if component_id == ComponentID.Transform:
+            self.transform_component = component
+        elif component_id == ComponentID.Render:
+            self.render_component = component
+            self.width, self.height = component.image.get_size() if component is not None else (0, 0)
+            self.half_width = self.width / 2
+            self.half_height = self.height / 2
+        elif component_id == ComponentID.Collision:
+            self.collision_component = component
 
     def get_component(self, component_id: 'ComponentID') -> 'Component':
         return self.components.get(component_id)
@@ -33,31 +64,14 @@ class Entity:
     def y(self) -> float:
         return self.transform_component.pos.y
 
-    @property
-    def width(self) -> float:
-        return self.render_component.image.get_rect().width
-
-    @property
-    def height(self) -> float:
-        return self.render_component.image.get_rect().height
-        
-    @property
-    def transform_component(self) -> 'TransformComponent':
-        return self.components.get(ComponentID.Transform)
-
-    @property
-    def render_component(self) -> 'RenderComponent':
-        return self.components.get(ComponentID.Render)
-
-    @property
-    def collision_component(self) -> 'CollisionComponent':
-        return self.components.get(ComponentID.Collision)
-
     @property
     def is_collidable(self):
-        return bool(self.collision_component)
+        return self.collision_component is not None
 
 class Component(ABC):
+    # components are created for every pipe, and accessed every frame
+    __slots__ = ("parent", "id")
+
     def __init__(self, ID: 'ComponentID', parent: Entity):
         self.parent = parent
         self.id: 'ComponentID' = ID
@@ -80,6 +94,8 @@ class ComponentID(Enum):
 
 
 class TransformComponent(Component):
+    __slots__ = ("pos", "rot", "scale")
+
     def __init__(self, parent: Entity, pos: Vector2 = Vector2(0, 0), 
                  rot: Vector2 = Vector2(0, 0),
                  scale: Vector2 = Vector2(1, 1),
@@ -97,10 +113,14 @@ class TransformComponent(Component):
 
 
 class TranslationComponent(Component):
-    def __init__(self, parent: Entity, accel: Vector2 = Vector2(0, 0), vel: Vector2 = Vector2(0, 0)):
+    __slots__ = ("transform", "velocity", "acceleration")
+
+    def __init__(self, parent: Entity, accel: Vector2 = Vector2(0, 0), vel: Vector2 = None):
         Component.__init__(self, ComponentID.Translation, parent)
         self.transform = parent.transform_component
-        self.velocity = vel
+        # a new vector is created when no velocity is given, since the
+        # velocity is updated in place
+        self.velocity = Vector2(0, 0) if vel is None else vel
         self.acceleration = accel
 
     def update(self, delta: float) -> None:
@@ -113,14 +133,19 @@ class TranslationComponent(Component):
 
 
 class RenderComponent(Component):
+    __slots__ = ("transform", "image")
+
     def __init__(self, parent: Entity, img_path: str = None, 
                  color: Tuple[int, int, int] = None,
-                 size: Tuple[float, float] = None):
+                 size: Tuple[float, float] = None, image: pygame.Surface = None):
         
         Component.__init__(self, ComponentID.Render, parent)
         self.transform = parent.transform_component
 
-        if img_path is not None:
+        if image is not None:
+            # sharing an existing image, which must not be drawn on
+            self.image: pygame.Surface = image
+        elif img_path is not None:
             self.image: pygame.Surface = pygame.image.load(img_path).convert_alpha()
         else:
             self.image: pygame.Surface = pygame.Surface(size).convert_alpha()
@@ -134,15 +159,19 @@ class RenderComponent(Component):
     
 
 class CollisionComponent(Component, pygame.sprite.Sprite):
-    def __init__(self, parent: Entity, callback: Callable[[Entity], Entity] = None):
+    def __init__(self, parent: Entity, callback: Callable[[Entity], Entity] = None, mask: pygame.Mask = None):
         Component.__init__(self, ComponentID.Collision, parent)
         pygame.sprite.Sprite.__init__(self)
 
         self.transform: TransformComponent = parent.transform_component
         self.image: pygame.Surface = parent.render_component.image
-        self.mask: pygame.Mask = pygame.mask.from_surface(self.image)
+        # the mask can be shared by entities with the same image
+        self.mask: pygame.Mask = pygame.mask.from_surface(self.image) if mask is None else mask
 
         self.callback = callback
+
+        # the bounds, moved in place instead of being recreated on every check
+        self._rect: pygame.Rect = self.image.get_rect()
         
     def on_collide(self, entity: Entity) -> Entity:
         if self.callback is not None:
@@ -152,16 +181,17 @@ class CollisionComponent(Component, pygame.sprite.Sprite):
     @property
     def rect(self) -> pygame.Rect:
         """
-        The bounds of the sprite.
+        The bounds of the sprite. The same rect is returned every time, moved
+        to the current position.
         
         Returns:
             pygame.Rect: The bounds.
         """
 
-        rect: pygame.Rect = self.image.get_rect()
-        rect.x = self.transform.pos.x
-        rect.y = self.transform.pos.y
-        return rect
+        pos = self.transform.pos
+        self._rect.x = pos.x
+        self._rect.y = pos.y
+        return self._rect
 
     def update(self, delta: float) -> None:
         pass
@@ -172,6 +202,9 @@ class CollisionComponent(Component, pygame.sprite.Sprite):
 
 
 class AreaExitTriggerComponent(Component):
+    __slots__ = ("transform", "callback", "area", "contain", "image_dim", "offset", "_half_width", "_half_height",
+                 "_offset_x", "_offset_y", "_left", "_right", "_top", "_bottom")
+
     def __init__(self, parent: Entity, callback: Callable[[Entity, 'Direction', Vector2], None], 
                  area: pygame.Rect, contain: bool = False, offset: Vector2 = Vector2(0, 0)):
         Component.__init__(self, ComponentID.AreaExitTrigger, parent)
@@ -193,28 +226,38 @@ class AreaExitTriggerComponent(Component):
             self.offset = Vector2(self.image_dim.x / 2 + offset.x, self.image_dim.y / 2 + offset.y)
         else:
             self.offset = Vector2(-self.image_dim.x / 2 - offset.x, -self.image_dim.y / 2 - offset.y)
-            
+
+        # caching the values used every frame as floats, so that checking the
+        # bounds doesn't go through the vectors and the rect
+        self._half_width: float = self.image_dim.x / 2
+        self._half_height: float = self.image_dim.y / 2
+        self._offset_x: float = self.offset.x
+        self._offset_y: float = self.offset.y
+        self._left: float = area.x
+        self._right: float = area.x + area.width
+        self._top: float = area.y
+        self._bottom: float = area.y + area.height
 
     def update(self, delta: float) -> None:
         if self.callback is None:
             return 
 
-        center_x = self.transform.pos.x + (self.image_dim.x / 2)
-        center_y = self.transform.pos.y + (self.image_dim.y / 2)
+        pos = self.transform.pos
+        center_x = pos.x + self._half_width
+        center_y = pos.y + self._half_height
 
-        if center_x - self.offset.x < self.area.x:
-            self.callback(self.parent, Direction.left, Vector2(self.area.x - (center_x - self.offset.x), 0))
+        # the vectors passed to the callback are only created when it is called
+        if center_x - self._offset_x < self._left:
+            self.callback(self.parent, Direction.left, Vector2(self._left - (center_x - self._offset_x), 0))
 
-        elif center_x + self.offset.x > self.area.x + self.area.width:
-            self.callback(self.parent, Direction.right,
-                          Vector2((self.area.x + self.area.width) - (center_x + self.offset.x), 0))
+        elif center_x + self._offset_x > self._right:
+            self.callback(self.parent, Direction.right, Vector2(self._right - (center_x + self._offset_x), 0))
 
-        elif center_y - self.offset.y < self.area.y:
-            self.callback(self.parent, Direction.up, Vector2(0, self.area.y - (center_y - self.offset.y)))
+        elif center_y - self._offset_y < self._top:
+            self.callback(self.parent, Direction.up, Vector2(0, self._top - (center_y - self._offset_y)))
 
-        elif center_y + self.offset.y > self.area.y + self.area.height:
-            self.callback(self.parent, Direction.down,
-                          Vector2(0, (self.area.y + self.area.height) - (center_y + self.offset.y)))
+        elif center_y + self._offset_y > self._bottom:
+            self.callback(self.parent, Direction.down, Vector2(0, self._bottom - (center_y + self._offset_y)))
     
 
     def render(self, screen: pygame.Surface) -> None:
@@ -222,6 +265,8 @@ class AreaExitTriggerComponent(Component):
 
 
 class AttachCallbacksComponent(Component):
+    __slots__ = ()
+
     def __init__(self, parent: Entity, callbacks: Dict[str, Callable]):
         super(AttachCallbacksComponent, self).__init__(ComponentID.AttachCallbacks, parent)
 
@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import List, Tuple, Optional
 import pygame
 from pygame import Vector2
 import game.core as core
@@ -45,8 +45,8 @@ class EntityManager:
 
             # updating score
             if entity.tag == "u_pipe":
-                player_mid = EntityManager.player.x + (EntityManager.player.width / 2)
-                pipe_mid = entity.x + (entity.width / 2)
+                player_mid = EntityManager.player.x + EntityManager.player.half_width
+                pipe_mid = entity.x + entity.half_width
                 if pipe_mid < player_mid < pipe_mid + 4:
                     count+=1
 
@@ -140,10 +140,23 @@ class KeyboardManager:
 
 
 class GUIManager:
-    def __init__(self, screen: pygame.Surface, font: pygame.font.Font):
+    def __init__(self, screen: pygame.Surface, font_path: str, font_size: int):
         self.screen = screen
-        self.font = font
-        
+        self.font_path = font_path
+        self.font_size = font_size
+        self._font: Optional[pygame.font.Font] = None
+
+    @property
+    def font(self) -> pygame.font.Font:
+        """
+        The score font, loaded (and the font module initialized) on first use.
+        """
+
+        if self._font is None:
+            pygame.font.init()
+            self._font = pygame.font.Font(self.font_path, self.font_size)
+        return self._font
+
     def render_score(self, score: int) -> None:
         text = self.font.render(str(score), False, (255, 255, 255))
         self.screen.blit(text, ((WIDTH / 2) - 20, HEIGHT * 0.1))
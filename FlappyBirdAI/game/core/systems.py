@@ -27,6 +27,10 @@ class CollisionSystem:
             entity: Entity = EntityManager.entities[i]
             if not entity.is_collidable:
                 continue
+            # only the entity handles the collision, skipping the checks that
+            # would have no effect, such as between two pipes
+            if entity.collision_component.callback is None:
+                continue
 
             # for every other entity
             for j in range(i+1, num):
@@ -0,0 +1,372 @@
+import os
+import sys
+import random
+from typing import List, Union, Dict, Any, Optional
+
+import pygame
+from pygame import Vector2
+
+import numpy as np
+
+from game import paths
+from profiling import Profiler
+import game.core as core
+from game.constants import *
+from game.core.systems import CollisionSystem, Controller
+from game.core.managers import EntityManager, KeyboardManager, GUIManager
+
+
+class Emulator:
+    def __init__(self, attach_keyboard=False, res_folder="res/", headless=False, fps: Optional[int] = FPS,
+                 profiler: Profiler = None, render_interval: int = 1):
+        if render_interval < 1:
+            raise ValueError("render_interval should be at least 1")
+
+        # rendering to a dummy display, if headless. Has to be set before
+        # the display is initialized.
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+        # initializing only the display, the font module is initialized when
+        # the score is first drawn, and the other modules (such as audio) are unused
+        pygame.display.init()
+        # creating screen
+        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        # creating clock to manage FPS
+        self.clock = pygame.time.Clock()
+        # flushing the entities of a previous emulator of the process, the managers are global
+        EntityManager.flush()
+        # creating player
+        EntityCreator.init()
+
+        # initializing manager
+        EntityManager.init(player=EntityCreator.player)
+
+        # creating keyboard manager to handle keyboard inputs
+        self.keyboard_manager = KeyboardManager(player=EntityCreator.player)
+
+        # creating controller to controller the player
+        self.controller = Controller(player=EntityCreator.player)
+
+        # score
+        self.score = 0
+
+        # initializing keyboard attached flag
+        self.keyboard_attached = attach_keyboard
+
+        # frame rate cap, None to run as fast as possible
+        self.fps = fps
+
+        # profiler timing the stages of a step, disabled by default
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        # the score is not drawn when headless, as nobody sees it
+        self.headless = headless
+
+        # the simulation advances on every step, while the frame is only rendered
+        # and captured every render_interval steps, unless requested
+        self.render_interval = render_interval
+        # number of steps since the emulator was created
+        self.ticks = 0
+
+        # creating GUI manager, which loads the score font when the score is first drawn
+        self.gui = GUIManager(self.screen, os.path.join(res_folder, "fonts", "Flappy-Bird.ttf"), 100)
+ 
+    def step(self, actions: List[int] = None, render: Optional[bool] = None) -> Union['GameState', bool]:
+        """
+        Advances the game by a frame. The entities, collisions and score are
+        updated on every step, rendering doesn't affect them, so the game plays
+        exactly the same whether the frames are rendered or not.
+
+        Args:
+            actions (List[int]): The one hot encoded action to perform.
+            render (Optional[bool]): Whether to render and capture the frame. None to
+                render every ``render_interval`` steps. The last frame of an episode is
+                always rendered.
+
+        Returns:
+            Union[GameState, bool]: The state of the game, whose frame is None if it wasn't
+            rendered, or False if the game should exit.
+        """
+        # initializing reward
+        reward = 0.1
+        # initializing is_terminal
+        is_terminal = False
+        # initializing flag that determines whether game should exit or not
+        should_exit = False
+
+        # clearing events or processing them, if the keyboard is attached
+        if self.keyboard_attached:
+            should_exit = self.handle_events()
+        else:
+            # handling quit events
+            if (self.handle_events()):
+                sys.exit()
+            # applying action
+            self.controller.update(actions)
+        # updating entities
+        with self.profiler.stage("emulator/update"):
+            player_dead, delta_score = EntityManager.update_entities(delta=1)
+        # updating collision system
+        with self.profiler.stage("emulator/collision"):
+            CollisionSystem.update()
+        # updating score
+        self.score += delta_score
+        if (delta_score != 0):
+            reward = 1
+        # deciding whether the frame is rendered
+        self.ticks += 1
+        if render is None:
+            render = self.ticks % self.render_interval == 0
+        state: Optional[np.ndarray] = None
+        if render or player_dead:
+            # rendering entities
+            with self.profiler.stage("emulator/render"):
+                EntityManager.render_entities(self.screen)
+            # getting the state before the score is rendered on the screen
+            with self.profiler.stage("emulator/capture"):
+                state = pygame.surfarray.array3d(pygame.display.get_surface())
+            if not self.headless:
+                with self.profiler.stage("emulator/display"):
+                    # rendering score
+                    self.gui.render_score(self.score)
+                    # updating display
+                    pygame.display.update()
+
+        # getting the score before the game is reset
+        score = self.score
+
+        # checking if the player is dead
+        if player_dead:
+            reward = -1
+            is_terminal = True
+            self.reset()
+
+        # keeps frame rate constant and gets time passed since
+        # previous call
+        if self.fps:
+            self.clock.tick(self.fps)
+
+        if not should_exit:
+            return GameState(
+                frame=state,
+                reward=reward,
+                is_terminal=is_terminal,
+                score=score
+            )
+        return False
+
+    def handle_events(self) -> bool:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return True
+            if event.type == pygame.KEYDOWN and self.keyboard_attached:
+                self.keyboard_manager.down(event)
+            if event.type == pygame.KEYUP and self.keyboard_attached:
+                self.keyboard_manager.up(event)
+        
+        return False
+                
+
+    def reset(self) -> None:
+        # clearing events
+        pygame.event.pump()
+
+        # flushing old entities
+        EntityManager.flush()
+
+        # creating new player and initial pipes
+        EntityCreator.init()
+
+        # initializing manager
+        EntityManager.init(EntityCreator.player)
+
+        # updating the keyboard manager's player
+        self.keyboard_manager.reset(EntityCreator.player)
+
+        # updating the controller's player
+        self.controller.reset(EntityCreator.player)
+
+        # reseting score
+        self.score = 0
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Gets the state of the game, which is enough to recreate it using
+        :meth:`set_state`. The state of the random number generator used to
+        place the pipes is not included.
+
+        Returns:
+            Dict[str, Any]: The state.
+        """
+
+        entities = []
+        for entity in EntityManager.entities:
+            translation: core.TranslationComponent = entity.get_component(core.ComponentID.Translation)
+            entities.append({
+                'tag': entity.tag,
+                'pos': tuple(entity.transform_component.pos),
+                'vel': tuple(translation.velocity),
+                'remove': entity.remove
+            })
+
+        return {'score': self.score, 'entities': entities}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """
+        Recreates the game from a state returned by :meth:`get_state`.
+
+        Args:
+            state (Dict[str, Any]): The state.
+        """
+
+        # flushing old entities
+        EntityManager.flush()
+
+        # recreating the entities, in the same order
+        for entity_state in state['entities']:
+            pos = Vector2(entity_state['pos'])
+            vel = Vector2(entity_state['vel'])
+            if entity_state['tag'] == "player":
+                EntityCreator.createPlayer(pos=pos, vel=vel)
+            else:
+                EntityCreator.createPipe(entity_state['tag'], pos=pos)
+            EntityManager.entities[-1].remove = entity_state['remove']
+
+        # initializing manager
+        EntityManager.init(EntityCreator.player)
+
+        # updating the keyboard manager's and the controller's player
+        self.keyboard_manager.reset(EntityCreator.player)
+        self.controller.reset(EntityCreator.player)
+
+        # restoring score
+        self.score = state['score']
+
+
+class EntityCreator:
+    player: core.Entity
+
+    # the image and mask shared by all the pipes, created with the first pipe.
+    # Neither is ever drawn on, so a new pipe doesn't have to allocate them.
+    pipe_image: Optional[pygame.Surface] = None
+    pipe_mask: Optional[pygame.Mask] = None
+
+    @staticmethod
+    def init(num_pipes: int=5) -> None:
+        # creating the player
+        EntityCreator.createPlayer()
+
+        # creating the pipes
+        x = WIDTH
+        for _ in range(num_pipes):
+            EntityCreator.createPipePair(x=x)
+            x += PIPE_HGAP
+
+    @staticmethod
+    def createPlayer(pos: Vector2 = None, vel: Vector2 = None) -> None:
+        """
+        Creates the player.
+
+        Args:
+            pos (Vector2): The position of the player. Defaults to the starting position.
+            vel (Vector2): The velocity of the player. Defaults to no velocity.
+        """
+
+        def on_window_exit(entity: core.Entity, direction: core.Direction, dpos: Vector2) -> None:
+            entity.remove = True
+
+        def on_collide(entity: core.Entity, other: core.Entity) -> core.Entity:
+            return entity
+
+        def jump(entity: core.Entity) -> None:
+            physics: core.TranslationComponent = entity.get_component(core.ComponentID.Translation)
+            physics.velocity.update(0, -JUMP_SPEED)
+
+        player = core.Entity(tag="player")
+        player.add_component(core.TransformComponent(player, pos=pygame.Vector2(200, 280) if pos is None else pos))
+        player.add_component(core.TranslationComponent(player, accel=Vector2(0, GRAVITY), vel=vel))
+        player.add_component(core.RenderComponent(player, color=(255, 0, 0), size=(64, 64)))
+        player.add_component(core.CollisionComponent(player, on_collide))
+        player.add_component(core.AreaExitTriggerComponent(player, on_window_exit, pygame.Rect(0, 0, WIDTH, HEIGHT),
+                                                           contain=False))
+        player.add_component(core.AttachCallbacksComponent(player, {
+            'jump': jump
+        }))
+
+        EntityCreator.player = player
+        EntityManager.add_entity(player)
+
+    @staticmethod
+    def createPipePair(x: int = 500) -> None:
+        y_1 = random.randint(-350, -50)
+
+        EntityCreator.createPipe("u_pipe", pos=Vector2(x, y_1))
+        EntityCreator.createPipe("d_pipe", pos=Vector2(x, y_1 + PIPE_HEIGHT + PIPE_VGAP))
+
+    @staticmethod
+    def createPipe(tag: str, pos: Vector2) -> None:
+        """
+        Creates a single pipe.
+
+        Args:
+            tag (str): "u_pipe" for the upper pipe, "d_pipe" for the lower pipe.
+            pos (Vector2): The position of the pipe.
+        """
+
+        if EntityCreator.pipe_image is None:
+            EntityCreator.pipe_image = pygame.Surface((PIPE_WIDTH, PIPE_HEIGHT)).convert_alpha()
+            EntityCreator.pipe_image.fill((0, 255, 0))
+            EntityCreator.pipe_mask = pygame.mask.from_surface(EntityCreator.pipe_image)
+
+        pipe = core.Entity(tag=tag)
+        pipe.add_component(core.TransformComponent(pipe, pos=pos))
+        pipe.add_component(core.TranslationComponent(pipe, vel=Vector2(-PIPE_SPEED, 0)))
+        pipe.add_component(core.RenderComponent(pipe, image=EntityCreator.pipe_image))
+        pipe.add_component(core.CollisionComponent(pipe, mask=EntityCreator.pipe_mask))
+        pipe.add_component(core.AreaExitTriggerComponent(pipe, EntityCreator.onPipeExit,
+                                                         pygame.Rect(0, 0, WIDTH, HEIGHT), offset=Vector2(100, 0)))
+
+        EntityManager.add_entity(pipe)
+
+    @staticmethod
+    def onPipeExit(entity: core.Entity, direction: core.Direction, dpos: Vector2) -> None:
+        """
+        Removes a pipe that left the screen, creating a new pair after the last one.
+
+        Args:
+            entity (core.Entity): The pipe.
+            direction (core.Direction): The side of the screen the pipe left from.
+            dpos (Vector2): How far the pipe is outside of the screen.
+        """
+
+        if direction != core.Direction.left:
+            return
+
+        entity.remove = True
+        x = 0
+        for i in range(len(EntityManager.entities) - 1, -1, -1):
+            if EntityManager.entities[i].tag == "u_pipe":
+                x = EntityManager.entities[i].transform_component.pos.x
+                break
+
+        EntityCreator.createPipePair(x + PIPE_HGAP)
+
+
+class GameState:
+    def __init__(self, frame: np.array, reward: float, is_terminal: bool, score: int):
+        self.frame = frame
+        self.reward = reward
+        self.is_terminal = is_terminal
+        self.score = score
+
+    def __getitem__(self, key) -> Union[np.array, float, bool, int]:
+        if key == 0:
+            return self.frame
+        elif key == 1:
+            return self.reward
+        elif key == 2:
+            return self.is_terminal
+        elif key == 3:
+            return self.score
+        else:
+            raise IndexError
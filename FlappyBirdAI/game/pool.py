@@ -0,0 +1,183 @@
+import random
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from typing import List, Dict, Any, Callable, Optional, Sequence
+
+import numpy as np
+
+
+
+def _worker(conn: Connection, res_folder: str, preprocess: Optional[Callable[[np.ndarray], np.ndarray]],
+            fps: Optional[int], render_interval: int, seed: Optional[int]) -> None:
+    """
+    Runs an emulator in a separate process, stepping it on request.
+
+    Args:
+        conn (Connection): The connection to the pool.
+        res_folder (str): The path to the resources folder.
+        preprocess (Optional[Callable[[np.ndarray], np.ndarray]]): Transform applied to
+            the frames before they are sent back, if any.
+        fps (Optional[int]): The frame rate cap of the emulator.
+        render_interval (int): The number of steps between rendered frames, when not requested.
+        seed (Optional[int]): The seed of the random number generator placing the pipes, if any.
+    """
+
+    # importing here, so that only the worker processes import pygame
+    from game.emulator import Emulator, GameState
+
+    # the pipes are placed using the global random number generator
+    if seed is not None:
+        random.seed(seed)
+
+    emulator = Emulator(res_folder=res_folder, headless=True, fps=fps, render_interval=render_interval)
+
+    try:
+        while True:
+            command, data = conn.recv()
+            if command == "step":
+                actions, render = data
+                frame, reward, is_terminal, score = emulator.step(actions, render=render)
+                if preprocess is not None and frame is not None:
+                    frame = preprocess(frame)
+                conn.send(GameState(frame=frame, reward=reward, is_terminal=is_terminal, score=score))
+            elif command == "reset":
+                emulator.reset()
+                conn.send(None)
+            elif command == "get_state":
+                conn.send(emulator.get_state())
+            elif command == "set_state":
+                emulator.set_state(data)
+                conn.send(None)
+            elif command == "close":
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        conn.close()
+
+
+class EmulatorPool:
+    """
+    A pool of headless emulators, each running in its own process. The
+    entities of the game are global to a process, hence only one emulator
+    can run per process.
+    """
+
+    def __init__(self, num_envs: int, res_folder: str = "res/",
+                 preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 fps: Optional[int] = None, render_interval: int = 1, seed: Optional[int] = None):
+        """
+        Args:
+            num_envs (int): The number of emulators.
+            res_folder (str): The path to the resources folder.
+            preprocess (Optional[Callable[[np.ndarray], np.ndarray]]): Transform applied to
+                the frames in the worker processes. Must be picklable.
+            fps (Optional[int]): The frame rate cap of the emulators. None to run as fast as possible.
+            render_interval (int): The number of steps between rendered frames, when not requested.
+            seed (Optional[int]): Seeds the games, every emulator gets a different seed. Unseeded if None.
+        """
+
+        self.num_envs = num_envs
+
+        ctx = mp.get_context("spawn")
+        self._conns: List[Connection] = []
+        self._processes: List[mp.Process] = []
+        for index in range(num_envs):
+            parent_conn, child_conn = ctx.Pipe()
+            worker_seed = seed + index if seed is not None else None
+            process = ctx.Process(target=_worker, daemon=True,
+                                  args=(child_conn, res_folder, preprocess, fps, render_interval, worker_seed))
+            process.start()
+            child_conn.close()
+
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+
+    def step(self, actions: Sequence[List[int]], indices: Sequence[int] = None,
+             render: Sequence[Optional[bool]] = None) -> List['GameState']:
+        """
+        Steps the emulators in parallel.
+
+        Args:
+            actions (Sequence[List[int]]): The actions to perform, one per emulator stepped.
+            indices (Sequence[int]): The emulators to step. Defaults to all of them.
+            render (Sequence[Optional[bool]]): Whether to render the frames, one per emulator
+                stepped. Defaults to rendering every ``render_interval`` steps.
+
+        Returns:
+            List[GameState]: The states returned by the emulators, in the order of ``indices``.
+        """
+
+        if indices is None:
+            indices = range(self.num_envs)
+
+        if render is None:
+            render = [None] * len(actions)
+
+        for index, action, render_frame in zip(indices, actions, render):
+            self._conns[index].send(("step", (action, render_frame)))
+
+        return [self._conns[index].recv() for index in indices]
+
+    def reset(self, indices: Sequence[int] = None) -> None:
+        """
+        Resets the emulators.
+
+        Args:
+            indices (Sequence[int]): The emulators to reset. Defaults to all of them.
+        """
+
+        if indices is None:
+            indices = range(self.num_envs)
+
+        for index in indices:
+            self._conns[index].send(("reset", None))
+        for index in indices:
+            self._conns[index].recv()
+
+    def get_state(self, index: int) -> Dict[str, Any]:
+        """
+        Gets the state of an emulator, see :meth:`Emulator.get_state`.
+
+        Args:
+            index (int): The emulator.
+
+        Returns:
+            Dict[str, Any]: The state.
+        """
+
+        self._conns[index].send(("get_state", None))
+        return self._conns[index].recv()
+
+    def set_state(self, index: int, state: Dict[str, Any]) -> None:
+        """
+        Recreates the game of an emulator from a state, see :meth:`Emulator.set_state`.
+
+        Args:
+            index (int): The emulator.
+            state (Dict[str, Any]): The state.
+        """
+
+        self._conns[index].send(("set_state", state))
+        self._conns[index].recv()
+
+    def close(self) -> None:
+        """
+        Stops the worker processes.
+        """
+
+        for conn in self._conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self) -> 'EmulatorPool':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,380 @@
+import json
+import socket
+import struct
+import asyncio
+import logging
+from typing import List, Dict, Any, Tuple, Callable, Optional, Sequence, Union
+
+import numpy as np
+
+from game.pool import EmulatorPool
+
+logger = logging.getLogger()
+
+# Every message is a header, holding the command and the length of the payload,
+# followed by the payload. Responses echo the command of the request. Integers
+# are big endian, arrays are sent as the raw bytes of numpy arrays.
+HEADER = struct.Struct("!BI")
+
+# returns the number of emulators and the shape of the frames:
+# num_envs (u32), ndim (u8), dims (u16 * ndim)
+HELLO = 0
+# steps a batch of emulators. Request: count (u16), indices (u16 * count),
+# actions (u8 * count), render flags (u8 * count, 2 to follow the render interval).
+# Response: rewards (f32 * count), terminals (u8 * count), scores (u32 * count),
+# rendered (u8 * count), then the rendered frames (u8), one after the other
+STEP = 1
+# resets a batch of emulators. Request: count (u16), indices (u16 * count)
+RESET = 2
+# gets the state of an emulator. Request: index (u16). Response: the state as json
+GET_STATE = 3
+# sets the state of an emulator. Request: index (u16), then the state as json
+SET_STATE = 4
+# error response, the payload is the message
+ERROR = 255
+
+COUNT = struct.Struct("!H")
+HELLO_HEADER = struct.Struct("!IB")
+
+# render flag asking the emulator to follow its render interval
+RENDER_DEFAULT = 2
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    Parses a server address, either "unix:<path>" or "<host>:<port>".
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        Tuple[int, Union[str, Tuple[str, int]]]: The socket family and the address.
+    """
+
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid address '{address}', expected unix:<path> or <host>:<port>")
+    return socket.AF_INET, (host, int(port))
+
+
+class EmulatorServer:
+    """
+    Hosts a pool of headless emulators behind a socket, stepping batches of them
+    on request. The frames are preprocessed on the server, so that only small
+    frames are sent. Requests of every client are served one at a time, as the
+    pool steps its emulators in parallel already.
+    """
+
+    def __init__(self, num_envs: int, res_folder: str = "res/",
+                 preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 frame_shape: Tuple[int, ...] = (84, 84), render_interval: int = 1):
+        """
+        Args:
+            num_envs (int): The number of emulators.
+            res_folder (str): The path to the resources folder.
+            preprocess (Optional[Callable[[np.ndarray], np.ndarray]]): Transform applied to
+                the frames in the worker processes. Must be picklable. Raw frames are sent if None.
+            frame_shape (Tuple[int, ...]): The shape of the preprocessed frames.
+            render_interval (int): The number of steps between rendered frames, when not requested.
+        """
+
+        from game.constants import WIDTH, HEIGHT
+
+        self.num_envs = num_envs
+        # the raw frames are captured as (width, height, channels)
+        self.frame_shape = tuple(frame_shape) if preprocess is not None else (WIDTH, HEIGHT, 3)
+        self.pool = EmulatorPool(num_envs, res_folder=res_folder, preprocess=preprocess,
+                                 render_interval=render_interval)
+
+        # the pool can only run a request at a time
+        self._lock = asyncio.Lock()
+
+    async def serve(self, address: str) -> None:
+        """
+        Serves clients until cancelled.
+
+        Args:
+            address (str): The address to listen on, "unix:<path>" or "<host>:<port>".
+        """
+
+        family, bind_address = parse_address(address)
+        if family == socket.AF_UNIX:
+            server = await asyncio.start_unix_server(self._handle, path=bind_address)
+        else:
+            server = await asyncio.start_server(self._handle, host=bind_address[0], port=bind_address[1])
+
+        logger.info("Serving %d emulators on %s", self.num_envs, address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername") or "unix socket"
+        logger.info("Client connected from %s", peer)
+
+        # sending the responses right away, instead of waiting to coalesce them
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        try:
+            while True:
+                command, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = await reader.readexactly(length)
+
+                try:
+                    async with self._lock:
+                        response = await asyncio.get_running_loop().run_in_executor(
+                            None, self._dispatch, command, payload
+                        )
+                except Exception as e:
+                    logger.exception("Failed to handle command %d", command)
+                    command, response = ERROR, str(e).encode()
+
+                writer.write(HEADER.pack(command, len(response)) + response)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            logger.info("Client from %s disconnected", peer)
+            writer.close()
+
+    def _dispatch(self, command: int, payload: bytes) -> bytes:
+        """
+        Runs a request on the pool, in a worker thread.
+
+        Args:
+            command (int): The command.
+            payload (bytes): The payload of the request.
+
+        Returns:
+            bytes: The payload of the response.
+        """
+
+        if command == HELLO:
+            shape = self.frame_shape
+            return HELLO_HEADER.pack(self.num_envs, len(shape)) + struct.pack(f"!{len(shape)}H", *shape)
+
+        if command == STEP:
+            (count,) = COUNT.unpack_from(payload)
+            indices = np.frombuffer(payload, dtype=">u2", count=count, offset=COUNT.size).astype(np.int64)
+            actions = np.frombuffer(payload, dtype=np.uint8, count=count, offset=COUNT.size + 2 * count)
+            render = np.frombuffer(payload, dtype=np.uint8, count=count, offset=COUNT.size + 3 * count)
+            self._check_indices(indices)
+
+            one_hot = [[int(action == 0), int(action == 1)] for action in actions]
+            states = self.pool.step(one_hot, indices=indices.tolist(),
+                                    render=[None if flag == RENDER_DEFAULT else bool(flag) for flag in render])
+
+            rewards = np.array([state.reward for state in states], dtype=">f4")
+            terminals = np.array([state.is_terminal for state in states], dtype=np.uint8)
+            scores = np.array([state.score for state in states], dtype=">u4")
+            rendered = np.array([state.frame is not None for state in states], dtype=np.uint8)
+            frames = [np.ascontiguousarray(state.frame, dtype=np.uint8).tobytes()
+                      for state in states if state.frame is not None]
+            return b"".join([rewards.tobytes(), terminals.tobytes(), scores.tobytes(), rendered.tobytes()] + frames)
+
+        if command == RESET:
+            (count,) = COUNT.unpack_from(payload)
+            indices = np.frombuffer(payload, dtype=">u2", count=count, offset=COUNT.size).astype(np.int64)
+            self._check_indices(indices)
+            self.pool.reset(indices.tolist())
+            return b""
+
+        if command == GET_STATE:
+            (index,) = COUNT.unpack_from(payload)
+            self._check_indices([index])
+            return json.dumps(self.pool.get_state(index)).encode()
+
+        if command == SET_STATE:
+            (index,) = COUNT.unpack_from(payload)
+            self._check_indices([index])
+            self.pool.set_state(index, json.loads(payload[COUNT.size:].decode()))
+            return b""
+
+        raise ValueError(f"Unknown command {command}")
+
+    def _check_indices(self, indices: Sequence[int]) -> None:
+        for index in indices:
+            if not 0 <= index < self.num_envs:
+                raise IndexError(f"No emulator {index}, the server has {self.num_envs}")
+
+
+class EmulatorClient:
+    """
+    Blocking client of an :class:`EmulatorServer`, with the interface of an
+    :class:`EmulatorPool`, so that it can be used wherever a pool is.
+    """
+
+    def __init__(self, address: str, timeout: Optional[float] = None):
+        """
+        Args:
+            address (str): The address of the server, "unix:<path>" or "<host>:<port>".
+            timeout (Optional[float]): The socket timeout, in seconds. Blocks forever if None.
+        """
+
+        family, connect_address = parse_address(address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(connect_address)
+        if family != socket.AF_UNIX:
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        response = self._request(HELLO, b"")
+        self.num_envs, ndim = HELLO_HEADER.unpack_from(response)
+        self.frame_shape: Tuple[int, ...] = struct.unpack_from(f"!{ndim}H", response, HELLO_HEADER.size)
+        self._frame_size = int(np.prod(self.frame_shape))
+
+    def _request(self, command: int, payload: bytes) -> bytes:
+        self._sock.sendall(HEADER.pack(command, len(payload)) + payload)
+
+        response_command, length = HEADER.unpack(self._recv_exactly(HEADER.size))
+        response = self._recv_exactly(length)
+        if response_command == ERROR:
+            raise RuntimeError(f"The emulator server failed: {response.decode()}")
+        return response
+
+    def _recv_exactly(self, size: int) -> bytes:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            n = self._sock.recv_into(view[received:])
+            if n == 0:
+                raise ConnectionError("The emulator server closed the connection")
+            received += n
+        return bytes(buffer)
+
+    @staticmethod
+    def _pack_indices(indices: Sequence[int]) -> bytes:
+        return COUNT.pack(len(indices)) + np.asarray(indices, dtype=">u2").tobytes()
+
+    def step(self, actions: Sequence[List[int]], indices: Sequence[int] = None,
+             render: Sequence[Optional[bool]] = None) -> List['GameState']:
+        """
+        Steps the emulators of the server, in a single round trip.
+
+        Args:
+            actions (Sequence[List[int]]): The one hot encoded actions, one per emulator stepped.
+            indices (Sequence[int]): The emulators to step. Defaults to all of them.
+            render (Sequence[Optional[bool]]): Whether to render the frames, one per emulator
+                stepped. Defaults to following the render interval of the server.
+
+        Returns:
+            List[GameState]: The states returned by the emulators, in the order of ``indices``.
+        """
+
+        from game.emulator import GameState
+
+        if indices is None:
+            indices = range(self.num_envs)
+        indices = list(indices)
+        count = len(indices)
+
+        action_indices = np.array([int(np.argmax(action)) for action in actions], dtype=np.uint8)
+        render_flags = np.array([RENDER_DEFAULT if flag is None else int(flag)
+                                 for flag in (render if render is not None else [None] * count)], dtype=np.uint8)
+        response = self._request(STEP, self._pack_indices(indices) + action_indices.tobytes() + render_flags.tobytes())
+
+        rewards = np.frombuffer(response, dtype=">f4", count=count)
+        terminals = np.frombuffer(response, dtype=np.uint8, count=count, offset=4 * count)
+        scores = np.frombuffer(response, dtype=">u4", count=count, offset=5 * count)
+        rendered = np.frombuffer(response, dtype=np.uint8, count=count, offset=9 * count)
+
+        states = []
+        offset = 10 * count
+        for i in range(count):
+            frame = None
+            if rendered[i]:
+                frame = np.frombuffer(response, dtype=np.uint8, count=self._frame_size,
+                                      offset=offset).reshape(self.frame_shape)
+                offset += self._frame_size
+            states.append(GameState(frame=frame, reward=float(rewards[i]), is_terminal=bool(terminals[i]),
+                                    score=int(scores[i])))
+
+        return states
+
+    def reset(self, indices: Sequence[int] = None) -> None:
+        """
+        Resets emulators of the server.
+
+        Args:
+            indices (Sequence[int]): The emulators to reset. Defaults to all of them.
+        """
+
+        self._request(RESET, self._pack_indices(list(indices if indices is not None else range(self.num_envs))))
+
+    def get_state(self, index: int) -> Dict[str, Any]:
+        """
+        Gets the state of an emulator of the server, see :meth:`Emulator.get_state`.
+        """
+
+        return json.loads(self._request(GET_STATE, COUNT.pack(index)).decode())
+
+    def set_state(self, index: int, state: Dict[str, Any]) -> None:
+        """
+        Recreates the game of an emulator of the server, see :meth:`Emulator.set_state`.
+        """
+
+        self._request(SET_STATE, COUNT.pack(index) + json.dumps(state).encode())
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def __enter__(self) -> 'EmulatorClient':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class RemoteEmulator:
+    """
+    One emulator of a server, with the interface of an :class:`Emulator`, so that
+    it can be trained on. The frames are preprocessed by the server, and every
+    step is rendered whatever the render interval of the server, since the
+    frames are stacked into the states.
+    """
+
+    def __init__(self, client: EmulatorClient, index: int, frame_shape: Optional[Tuple[int, ...]] = None):
+        """
+        Args:
+            client (EmulatorClient): The client of the server.
+            index (int): The emulator to use.
+            frame_shape (Optional[Tuple[int, ...]]): The shape of the preprocessed
+                frames expected from the server, not checked if None.
+
+        Raises:
+            ValueError: If the server sends frames of another shape, such as a
+                server started with ``--raw-frames``.
+        """
+
+        if not 0 <= index < client.num_envs:
+            raise IndexError(f"No emulator {index}, the server has {client.num_envs}")
+        if frame_shape is not None and tuple(client.frame_shape) != tuple(frame_shape):
+            raise ValueError(f"The server sends frames of shape {tuple(client.frame_shape)}, "
+                             f"{tuple(frame_shape)} are expected. Start it without --raw-frames")
+
+        self.client = client
+        self.index = index
+        # the emulators of the server run uncapped, kept for compatibility
+        self.fps: Optional[int] = None
+
+    def step(self, actions: List[int] = None, render: Optional[bool] = None) -> 'GameState':
+        # always rendering, a skipped frame would leave a hole in the stack
+        return self.client.step([actions if actions is not None else [1, 0]], indices=[self.index],
+                                render=[True])[0]
+
+    def reset(self) -> None:
+        self.client.reset([self.index])
+
+    def get_state(self) -> Dict[str, Any]:
+        return self.client.get_state(self.index)
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.client.set_state(self.index, state)
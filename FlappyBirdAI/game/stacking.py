@@ -0,0 +1,186 @@
+from typing import Callable, Optional, Tuple, List
+
+import numpy as np
+
+from profiling import Profiler
+
+
+class FrameStack:
+    """
+    Ring buffer of the last k frames. Every frame is written twice, k slots
+    apart, so that the last k frames are always a contiguous slice of the
+    buffer, and the stack can be returned as a view without copying.
+    """
+
+    def __init__(self, k: int, frame_shape: Tuple[int, ...] = (84, 84), dtype: np.dtype = np.uint8):
+        self.k = k
+        self._buffer: np.ndarray = np.zeros((2 * k,) + tuple(frame_shape), dtype=dtype)
+        # index of the oldest frame of the stack
+        self._start = 0
+
+    def push(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Adds a frame to the stack, dropping the oldest one.
+
+        Args:
+            frame (np.ndarray): The frame.
+
+        Returns:
+            np.ndarray: The stack.
+        """
+
+        self._buffer[self._start] = frame
+        self._buffer[self._start + self.k] = frame
+        self._start = (self._start + 1) % self.k
+        return self.frames
+
+    def reset(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Fills the stack with a single frame.
+
+        Args:
+            frame (np.ndarray): The frame.
+
+        Returns:
+            np.ndarray: The stack.
+        """
+
+        self._buffer[:] = frame
+        self._start = 0
+        return self.frames
+
+    def set(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Sets the frames of the stack.
+
+        Args:
+            frames (np.ndarray): The frames, oldest first, of shape (k, ...).
+
+        Returns:
+            np.ndarray: The stack.
+        """
+
+        self._buffer[:self.k] = frames
+        self._buffer[self.k:] = frames
+        self._start = 0
+        return self.frames
+
+    @property
+    def frames(self) -> np.ndarray:
+        """
+        The stack, oldest frame first, as a view of shape (k, ...). The view is
+        overwritten by the next push, and must not be written to.
+        """
+
+        return self._buffer[self._start:self._start + self.k]
+
+    @property
+    def latest(self) -> np.ndarray:
+        """
+        The most recent frame.
+        """
+
+        return self._buffer[self._start + self.k - 1]
+
+
+class StackedState:
+    def __init__(self, frame: np.ndarray, observation: np.ndarray, reward: float, is_terminal: bool, score: int):
+        # the new preprocessed frame, the last frame of the episode if terminal
+        self.frame = frame
+        # the stack of frames to choose the next action on. Starts the next
+        # episode if terminal.
+        self.observation = observation
+        self.reward = reward
+        self.is_terminal = is_terminal
+        self.score = score
+
+
+class StackedEmulator:
+    """
+    Wraps an emulator to preprocess its frames and stack the last k of them,
+    starting a new stack when an episode ends.
+    """
+
+    # the action performed to get the first frame of an episode
+    NO_OP: List[int] = [1, 0]
+
+    def __init__(self, emulator, preprocess: Optional[Callable[[np.ndarray], np.ndarray]], k: int = 4,
+                 frame_shape: Tuple[int, ...] = (84, 84), profiler: Profiler = None):
+        """
+        Args:
+            emulator: The emulator. Anything with a ``step`` method taking the actions and a render
+                flag, and returning a ``GameState``.
+            preprocess (Optional[Callable[[np.ndarray], np.ndarray]]): The transform converting
+                the frames of the emulator to uint8 frames of ``frame_shape``. None if the emulator
+                returns preprocessed frames.
+            k (int): The number of frames to stack.
+            frame_shape (Tuple[int, ...]): The shape of the preprocessed frames.
+            profiler (Profiler): The profiler timing the preprocessing, disabled by default.
+        """
+
+        self.emulator = emulator
+        self.preprocess = preprocess if preprocess is not None else (lambda frame: frame)
+        self.stack = FrameStack(k, frame_shape)
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        # the most recent preprocessed frame
+        self.last_frame: Optional[np.ndarray] = None
+
+    def reset(self) -> np.ndarray:
+        """
+        Starts a new stack by doing nothing for a frame, and filling the stack with that frame.
+
+        Returns:
+            np.ndarray: The stack.
+        """
+
+        frame = self.emulator.step(StackedEmulator.NO_OP, render=True).frame
+        self.last_frame = self.preprocess(frame)
+        return self.stack.reset(self.last_frame)
+
+    def restore(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Restores the stack, when resuming.
+
+        Args:
+            frames (np.ndarray): The frames of the stack, oldest first.
+
+        Returns:
+            np.ndarray: The stack.
+        """
+
+        self.last_frame = np.array(frames[-1])
+        return self.stack.set(frames)
+
+    def step(self, actions: List[int]) -> StackedState:
+        """
+        Performs the actions in the emulator and stacks the resulting frame. If the
+        episode ends, a new stack is started from the first frame of the next episode.
+        If the emulator doesn't render the frame, the stack is left as is, so an emulator
+        rendering every n-th frame stacks every n-th frame.
+
+        Args:
+            actions (List[int]): The actions.
+
+        Returns:
+            StackedState: The new frame and the stack to choose the next action on, along
+            with the reward, the terminal flag and the score.
+        """
+
+        frame, reward, is_terminal, score = self.emulator.step(actions)
+
+        if frame is None:
+            return StackedState(frame=None, observation=self.stack.frames, reward=reward, is_terminal=is_terminal,
+                                score=score)
+
+        with self.profiler.stage("preprocess"):
+            frame = self.preprocess(frame)
+
+        if is_terminal:
+            # the emulator has already started a new episode
+            observation = self.reset()
+        else:
+            self.last_frame = frame
+            observation = self.stack.push(frame)
+
+        return StackedState(frame=frame, observation=observation, reward=reward, is_terminal=is_terminal, score=score)
@@ -1,27 +1,114 @@
 import os
 import sys
+import json
 import logging
 import argparse
 import traceback
+from pathlib import Path
 from datetime import datetime
 
-from net import Solver
-from net.utils import CheckpointManager
+# only lightweight modules are imported here. The heavy ones (torch, the
+# emulator, etc.) are imported by the commands that need them, which keeps
+# the startup of the commands, and of the processes they spawn, fast.
+from game.constants import FPS
+
+
+def setup_logging(args: argparse.Namespace, out_dir: str, log_name: str = "log") -> logging.Logger:
+    """
+    Sets up the root logger to write to a file in the experiment folder, and
+    to stdout if verbose.
+
+    Args:
+        args (argparse.Namespace): The arguments.
+        out_dir (str): The experiment folder.
+        log_name (str): The name of the log file.
+
+    Returns:
+        logging.Logger: The logger.
+    """
+
+    # creating logger
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG if args.debug else logging.INFO)
+    # creating formatter for the logger
+    formatter = logging.Formatter("[%(asctime)s %(levelname)s] %(message)s", "%d-%m-%Y %H:%M:%S")
+    # creating the log file and setting format
+    file_handler = logging.FileHandler(os.path.join(out_dir, log_name))
+    file_handler.setFormatter(formatter)
+    # attaching log file to logger
+    logger.addHandler(file_handler)
+    # printing to stdout, if verbose
+    if args.verbose:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+        logger.addHandler(stream_handler)
+    # attaching except hook callback
+    sys.excepthook = lambda tp, val, tb: logger.error(f"Unhandled Exception:\nType: {tp}\nValue: {val}\n"
+                                                      f"Traceback: {''.join(traceback.format_tb(tb))}")
+
+    return logger
+
+
+def create_checkpoint_manager(args: argparse.Namespace) -> 'CheckpointManager':
+    from net.utils import CheckpointManager
+
+    return CheckpointManager('model', args.out_dir, args.exp_name,
+                             frequency=getattr(args, "checkpoint_freq", 1),
+                             save_replay=getattr(args, "checkpoint_replay", False))
+
+
+def train_worker(rank: int, args: argparse.Namespace) -> None:
+    """
+    Runs one of the data parallel learners, in its own process.
+
+    Args:
+        rank (int): The rank of the learner.
+        args (argparse.Namespace): The arguments.
+    """
+
+    from net import Solver, distributed
+
+    checkpoint_mgr = create_checkpoint_manager(args)
+    logger = setup_logging(args, checkpoint_mgr.out_dir, "log" if rank == 0 else f"log.rank{rank}")
+
+    distributed.init(rank, args.world_size, args.dist_port)
+    try:
+        Solver(args, checkpoint_mgr).train_network()
+    except Exception:
+        logger.exception("Learner %d failed", rank)
+        raise
+    finally:
+        distributed.cleanup()
 
-from game import Emulator
 
 if __name__ == "__main__":
     # creating argument parsers
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(help="Train or test", dest="command")
 
+    # arguments common to all the commands
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--exp-name", default=datetime.now().strftime("%d_%m_%Y_%H_%M_%S"), help="Name of the experiment")
+    common.add_argument("--out-dir", default="./runs/", help="The path to the folder to store the experiment results")
+    common.add_argument("--verbose", action="store_true", help="Enables verbose output.")
+    common.add_argument("--debug", action="store_true", help="Enables debug mode")
+
     # arguments for training the network
-    trainer = subparsers.add_parser("train")
-    trainer.add_argument("--exp-name", default=datetime.now().strftime("%d_%m_%Y_%H_%M_%S"), help="Name of the experiment")
-    trainer.add_argument("--out-dir", default="./runs/", help="The path to the folder to store the experiment results")
-    trainer.add_argument("--log-freq", default=1, type=int, help="Logging frequency (to stdout, if verbose, and to log file)")
-    trainer.add_argument("--summary-freq", default=1, type=int, help="Logging frequency (to graphs, etc.)")
+    trainer = subparsers.add_parser("train", parents=[common])
+    trainer.add_argument("--metrics-interval", default=10, type=float, help=
+                         "Interval (in seconds) at which the mean, min and max of the logged values are written "
+                         "to the log file (and stdout, if verbose) and to the graphs")
     trainer.add_argument("--checkpoint-freq", default=100, type=int, help="Checkpoint frequency (in frames)")
+    trainer.add_argument("--checkpoint-replay", action="store_true", help=
+                         "Saves the replay memory with every checkpoint, so that training can be resumed exactly. "
+                         "Consider increasing the checkpoint frequency, as the replay memory can be large")
+    trainer.add_argument("--in-channels", default=1, type=int, help=
+                         "Number of the latest stacked frames the model takes as input channels, up to 4. 1 runs "
+                         "the model on the latest frame only. Checkpoints of a model taking 1 channel are migrated. "
+                         "The replay memory stores this many frames per state")
+    trainer.add_argument("--n-step", default=1, type=int, help=
+                         "Number of frames the stored transitions span. The rewards over them are discounted "
+                         "into the return the TD target bootstraps from, propagating sparse rewards faster")
     trainer.add_argument("--batch-size", default=32, type=int, help="The batch size")
     trainer.add_argument("--lr", default=1e-4, type=float, help="The learning rate")
     trainer.add_argument("--initial-epsilon", default=1, type=float, help="The initial value of epsilon")
@@ -29,42 +116,279 @@ if __name__ == "__main__":
     trainer.add_argument("--frames-per-action", default=4, type=int, help=
                          "The number of frames to be passed before an action can be performed")
     trainer.add_argument("--max-replay", default=50000, type=int, help="Maximum size of replay memory")
+    trainer.add_argument("--skip-memory-check", action="store_true", help=
+                         "Starts training even if the replay memory wouldn't fit in the available memory at capacity")
+    trainer.add_argument("--memory-interval", default=60, type=float, help=
+                         "Interval (in seconds) at which the memory held by the replay memory, the model, the "
+                         "optimizer and the emulator, and the resident set size are logged. 0 disables it")
     trainer.add_argument("--observe-for", default=100000, type=int, help="Number of frames to observe before training")
+    trainer.add_argument("--frames-per-update", default=1, type=int, help=
+                         "Number of emulator frames between updates of the network, once training")
+    trainer.add_argument("--gradient-steps", default=1, type=int, help="Number of gradient steps per update")
+    trainer.add_argument("--warm-start", action="store_true", help=
+                         "Fills the replay memory using random actions, at full emulator speed, while observing")
+    trainer.add_argument("--dataset", default=None, help=
+                         "A dataset made by the generate command, pre-filling the replay memory. The loaded "
+                         "transitions count towards --observe-for. Has to be generated with the same --in-channels")
+    trainer.add_argument("--max-frames", default=None, type=int, help="Stops training at this frame")
+    trainer.add_argument("--prefetch", default=0, type=int, help=
+                         "Number of minibatches sampled ahead in a background thread, 0 to sample when needed")
+    trainer.add_argument("--fps", default=FPS, type=int, help="Frame rate cap of the emulator, 0 to run uncapped")
+    trainer.add_argument("--headless", action="store_true", help="Runs the emulator without opening a window")
+    trainer.add_argument("--emulator-address", default=None, help=
+                         "Plays on an emulator of a server started with the serve command, as unix:<path> or "
+                         "<host>:<port>, instead of a local one. Each data parallel learner uses the emulator "
+                         "matching its rank. The remote emulators run uncapped")
     trainer.add_argument("--explore", default=1000000, type=int, help="Number of frames across which the epsilon should be decreased")
     trainer.add_argument("--gamma", default=0.99, type=float, help="rate of decay of past observations")
-    trainer.add_argument("--verbose", action="store_true", help="Enables verbose output.")
-    trainer.add_argument("--debug", action="store_true", help="Enables debug mode")
+    trainer.add_argument("--seed", default=None, type=int, help="Seed for the random number generators")
+    trainer.add_argument("--profile", action="store_true", help=
+                         "Times the stages of the training loop, logging rolling percentiles with the other values")
+    trainer.add_argument("--profile-trace", default=None, help=
+                         "Writes a Chrome trace of the timed stages to this path when training stops. Requires --profile")
+    trainer.add_argument("--quantized-actor", default=0, type=int, help=
+                         "Acts using an int8 quantized copy of the model, refreshed every these many frames. "
+                         "0 to disable. cpu only")
+    trainer.add_argument("--quantized-agreement", default=0.95, type=float, help=
+                         "Warns if the quantized actor's greedy actions agree with the model less often than this")
+    trainer.add_argument("--num-threads", default=None, type=int, help="Number of threads used by torch")
+    trainer.add_argument("--world-size", default=1, type=int, help=
+                         "Number of data parallel learner processes, each playing its own game and sampling its own "
+                         "minibatch, with the gradients averaged across them. cpu only")
+    trainer.add_argument("--dist-port", default=29500, type=int, help="Port used to set up the data parallel learners")
     trainer.add_argument("--cuda", action="store_true", help="Uses cuda")
 
+    # arguments for exporting the trained network
+    exporter = subparsers.add_parser("export", parents=[common])
+    exporter.add_argument("--checkpoint", default=None, help=
+                          "The checkpoint to export. Defaults to the latest checkpoint of the experiment")
+    exporter.add_argument("--output", required=True, help="The path to write the exported model to")
+    exporter.add_argument("--precision", default="fp32", help="The precision of the weights: fp32, fp16 or int8")
+
+    # arguments for evaluating the trained network
+    evaluator = subparsers.add_parser("eval", parents=[common])
+    evaluator.add_argument("--checkpoint", default=None, help=
+                           "The checkpoint to evaluate. Defaults to the latest checkpoint of the experiment")
+    evaluator.add_argument("--artifact", default=None, help="An exported model to evaluate, instead of a checkpoint")
+    evaluator.add_argument("--episodes", default=100, type=int, help="The number of episodes to play")
+    evaluator.add_argument("--num-envs", default=4, type=int, help="The number of emulators to play on in parallel")
+    evaluator.add_argument("--frames-per-action", default=4, type=int, help=
+                           "The number of frames to be passed before an action can be performed")
+    evaluator.add_argument("--max-score", default=None, type=int, help="Ends an episode once this score is reached")
+    evaluator.add_argument("--max-steps", default=None, type=int, help="Ends an episode after these many frames")
+    evaluator.add_argument("--output", default=None, help=
+                           "The path to write the results to. Defaults to eval.json in the experiment folder")
+    evaluator.add_argument("--cuda", action="store_true", help="Uses cuda")
+
+    # arguments for generating a dataset of transitions
+    generator = subparsers.add_parser("generate", parents=[common])
+    generator.add_argument("--output", default=None, help=
+                           "The folder to write the dataset to. Defaults to dataset in the experiment folder")
+    generator.add_argument("--transitions", default=100000, type=int, help="The number of transitions to generate")
+    generator.add_argument("--policy", default="random", help="The policy choosing the actions: random or scripted")
+    generator.add_argument("--noise", default=0.1, type=float, help=
+                           "Probability of a random action with the scripted policy")
+    generator.add_argument("--shard-size", default=10000, type=int, help="The number of transitions per shard")
+    generator.add_argument("--workers", default=os.cpu_count() or 1, type=int, help=
+                           "Number of emulator processes generating shards")
+    generator.add_argument("--frames-per-action", default=4, type=int, help=
+                           "The number of frames to be passed before an action can be performed")
+    generator.add_argument("--seed", default=0, type=int, help="Seed of the generated games")
+    generator.add_argument("--in-channels", default=1, type=int, help=
+                           "Number of the latest stacked frames stored as a state, up to 4. Should match the "
+                           "--in-channels of the trainings using the dataset")
+
+    # arguments for running a grid of trainings
+    sweeper = subparsers.add_parser("sweep", parents=[common])
+    sweeper.add_argument("--grid", action="append", default=[], help=
+                         "Values of a train argument to sweep over, as <argument>=<value>[,<value>...], "
+                         "for example lr=1e-4,1e-3. Can be given multiple times")
+    sweeper.add_argument("--workers", default=2, type=int, help="Number of trainings to run concurrently")
+    sweeper.add_argument("--threads-per-run", default=1, type=int, help=
+                         "Number of cpu cores (and torch threads) each training is pinned to")
+    sweeper.add_argument("train_args", nargs=argparse.REMAINDER, help=
+                         "Arguments passed to every training, after '--'")
+
+    # arguments for population based training
+    populator = subparsers.add_parser("pbt", parents=[common])
+    populator.add_argument("--population", default=4, type=int, help="Number of models trained together")
+    populator.add_argument("--envs-per-member", default=1, type=int, help=
+                           "Number of emulators every member acts on. The pool has population times this many")
+    populator.add_argument("--ready-every", default=50000, type=int, help=
+                           "Number of frames between the steps replacing the worst members by perturbed copies "
+                           "of the best ones")
+    populator.add_argument("--truncation", default=0.25, type=float, help=
+                           "Fraction of the population replaced at every step, and copied from")
+    populator.add_argument("--perturb-factors", default="0.8,1.2", help=
+                           "The factors the copied lr, gamma horizon and epsilon schedule are multiplied by")
+    populator.add_argument("--window", default=10, type=int, help=
+                           "Number of latest episodes the members are ranked on")
+    populator.add_argument("train_args", nargs=argparse.REMAINDER, help=
+                           "Arguments of the train command after '--', giving the initial hyperparameters and "
+                           "the rest of the configuration, shared by the members")
+
+    # arguments for serving emulators to trainings on other processes or machines
+    server = subparsers.add_parser("serve", parents=[common])
+    server.add_argument("--address", default="127.0.0.1:5555", help="The address to listen on, unix:<path> or "
+                        "<host>:<port>")
+    server.add_argument("--num-envs", default=4, type=int, help="The number of emulators")
+    server.add_argument("--render-interval", default=1, type=int, help=
+                        "Number of steps between rendered frames, unless the client asks for a frame")
+    server.add_argument("--raw-frames", action="store_true", help=
+                        "Sends the frames as captured, instead of preprocessing them on the server")
+
+    # arguments for benchmarking the training stack
+    benchmarker = subparsers.add_parser("benchmark", parents=[common])
+    benchmarker.add_argument("--suite", default="end-to-end", choices=["end-to-end", "learner"], help=
+                             "end-to-end: trains from scratch on a reduced configuration, measuring the time and "
+                             "frames needed to reach the target greedy scores. learner: times the replay memory, "
+                             "the model, the TD targets, the optimizer and the checkpoints, without an emulator")
+    benchmarker.add_argument("--seeds", default="0,1,2", help="The seeds to train with, one run each")
+    benchmarker.add_argument("--targets", default="1,5,10", help="The mean greedy scores to reach")
+    benchmarker.add_argument("--eval-every", default=25000, type=int, help="Number of frames between evaluations")
+    benchmarker.add_argument("--eval-episodes", default=10, type=int, help="Number of episodes per evaluation")
+    benchmarker.add_argument("--max-seconds", default=3600, type=float, help=
+                             "Training time budget of every run, not counting the evaluations. 0 for no budget")
+    benchmarker.add_argument("--replay-sizes", default="10000,50000", help=
+                             "The replay memory sizes to benchmark, for the learner suite")
+    benchmarker.add_argument("--batch-sizes", default="32,128,512", help=
+                             "The batch sizes to benchmark, for the learner suite")
+    benchmarker.add_argument("--iterations", default=200, type=int, help=
+                             "Number of timed iterations per benchmark, for the learner suite")
+    benchmarker.add_argument("--cuda", action="store_true", help="Runs the model on cuda, for the learner suite")
+    benchmarker.add_argument("--output", default=None, help=
+                             "The path to write the results to. Defaults to benchmark.json in the experiment folder")
+    benchmarker.add_argument("train_args", nargs=argparse.REMAINDER, help=
+                             "Arguments passed to the trainings after '--', overriding the reduced configuration")
+
     # getting arguments
     args = parser.parse_args()
 
-    # creating checkpoint manager
-    checkpoint_mgr = CheckpointManager('model', args.out_dir, args.exp_name, frequency=args.checkpoint_freq)
+    # creating the experiment folder
+    out_home = os.path.join(args.out_dir, args.exp_name)
+    Path(out_home).mkdir(parents=True, exist_ok=True)
 
     # creating logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG if args.debug else logging.INFO)
-    # creating formatter for the logger
-    formatter = logging.Formatter("[%(asctime)s %(levelname)s] %(message)s", "%d-%m-%Y %H:%M:%S")
-    # creating the log file and setting format
-    file_handler = logging.FileHandler(os.path.join(checkpoint_mgr.out_dir, "log"))
-    file_handler.setFormatter(formatter)
-    # attaching log file to logger
-    logger.addHandler(file_handler)
-    # printing to stdout, if verbose
-    if args.verbose:
-        stream_handler = logging.StreamHandler(sys.stdout)
-        stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
-    # attaching except hook callback
-    sys.excepthook = lambda tp, val, tb: logger.error(f"Unhandled Exception:\nType: {tp}\nValue: {val}\n"
-                                                      f"Traceback: {''.join(traceback.format_tb(tb))}")
+    logger = setup_logging(args, out_home)
 
     logger.info("Program started.")
     logger.info("Arguments: %s", args)
-    logger.info("Logging results every %d epoch(s)", args.log_freq)
 
     # executing
     if args.command == "train":
-        Solver(args, checkpoint_mgr).train_network()
+        import torch
+        from net import Solver
+
+        logger.info("Logging results every %.1f second(s)", args.metrics_interval)
+        if args.num_threads is not None:
+            torch.set_num_threads(args.num_threads)
+        if args.world_size > 1:
+            if args.cuda:
+                raise ValueError("Data parallel learners are only supported on the cpu")
+            # the learners set up their own logging, in their own processes
+            torch.multiprocessing.spawn(train_worker, args=(args,), nprocs=args.world_size)
+        else:
+            Solver(args, create_checkpoint_manager(args)).train_network()
+    elif args.command == "export":
+        from net.export import export_model
+
+        checkpoint_mgr = create_checkpoint_manager(args)
+        checkpoint = args.checkpoint if args.checkpoint is not None else checkpoint_mgr.latest()
+        if checkpoint is None:
+            raise FileNotFoundError(f"No checkpoints found in {checkpoint_mgr.checkpoints_dir}")
+        export_model(checkpoint, args.output, precision=args.precision)
+    elif args.command == "eval":
+        import torch
+        from net import Model
+        from net.evaluation import evaluate
+        from net.runtime import Policy
+        from net.utils import load_checkpoint
+
+        checkpoint_mgr = create_checkpoint_manager(args)
+        device = "cuda:0" if args.cuda else "cpu"
+        if args.artifact is not None:
+            policy = Policy.load(args.artifact, device)
+        else:
+            checkpoint = args.checkpoint if args.checkpoint is not None else checkpoint_mgr.latest()
+            if checkpoint is None:
+                raise FileNotFoundError(f"No checkpoints found in {checkpoint_mgr.checkpoints_dir}")
+            data = load_checkpoint(checkpoint, map_location=device)
+            model = Model(input_dim=(84, 84), in_channels=data.get('in_channels', 1)).to(device)
+            model.load_state_dict(data['state_dict'])
+            model.eval()
+            policy = Policy.from_module(model, device)
+
+        results = evaluate(policy, args.episodes, num_envs=args.num_envs, frames_per_action=args.frames_per_action,
+                           max_score=args.max_score, max_steps=args.max_steps)
+
+        output = args.output if args.output is not None else os.path.join(out_home, "eval.json")
+        with open(output, "w") as f:
+            json.dump(results, f, indent=4)
+        logger.info("Results written to %s", output)
+    elif args.command == "generate":
+        from net.dataset import generate_dataset
+
+        output = args.output if args.output is not None else os.path.join(out_home, "dataset")
+        generate_dataset(output, args.transitions, workers=args.workers, policy=args.policy,
+                         shard_size=args.shard_size, frames_per_action=args.frames_per_action, noise=args.noise,
+                         seed=args.seed, in_channels=args.in_channels)
+    elif args.command == "benchmark" and args.suite == "learner":
+        import torch
+        from benchmarks.learner import run_learner
+
+        results = run_learner(replay_sizes=[int(size) for size in args.replay_sizes.split(",")],
+                              batch_sizes=[int(size) for size in args.batch_sizes.split(",")],
+                              iterations=args.iterations, device=torch.device("cuda:0" if args.cuda else "cpu"))
+
+        output = args.output if args.output is not None else os.path.join(out_home, "benchmark.json")
+        with open(output, "w") as f:
+            json.dump(results, f, indent=4)
+        logger.info("Results written to %s", output)
+    elif args.command == "benchmark":
+        from benchmarks.end_to_end import DEFAULT_TRAIN_ARGS, run_end_to_end, write_results
+
+        extra_args = args.train_args[1:] if args.train_args[:1] == ["--"] else args.train_args
+        train_args = trainer.parse_args(DEFAULT_TRAIN_ARGS + extra_args +
+                                        ["--exp-name", args.exp_name, "--out-dir", args.out_dir])
+        results = run_end_to_end(train_args, seeds=[int(seed) for seed in args.seeds.split(",")],
+                                 targets=[float(target) for target in args.targets.split(",")],
+                                 eval_every=args.eval_every, eval_episodes=args.eval_episodes,
+                                 max_seconds=args.max_seconds if args.max_seconds > 0 else None)
+
+        write_results(results, args.output if args.output is not None else os.path.join(out_home, "benchmark.json"))
+    elif args.command == "serve":
+        import asyncio
+        from game.server import EmulatorServer
+
+        preprocess = None
+        if not args.raw_frames:
+            from net.preprocessing import build_preprocess
+            preprocess = build_preprocess(84)
+
+        emulator_server = EmulatorServer(args.num_envs, preprocess=preprocess, frame_shape=(84, 84),
+                                         render_interval=args.render_interval)
+        try:
+            asyncio.run(emulator_server.serve(args.address))
+        except KeyboardInterrupt:
+            logger.info("Server stopped")
+    elif args.command == "pbt":
+        from net.pbt import PopulationTrainer
+
+        extra_args = args.train_args[1:] if args.train_args[:1] == ["--"] else args.train_args
+        train_args = trainer.parse_args(extra_args + ["--exp-name", args.exp_name, "--out-dir", args.out_dir])
+        if train_args.max_frames is None:
+            logger.warning("--max-frames is not given in the train arguments, the population will not stop on its own")
+        PopulationTrainer(train_args, args.population, envs_per_member=args.envs_per_member,
+                          ready_every=args.ready_every, truncation=args.truncation,
+                          factors=[float(factor) for factor in args.perturb_factors.split(",")],
+                          window=args.window).train()
+    elif args.command == "sweep":
+        from net.sweep import parse_grid, run_sweep
+
+        train_args = args.train_args[1:] if args.train_args[:1] == ["--"] else args.train_args
+        grid = parse_grid(args.grid)
+        # parsing the arguments like the runs will, so that every form of them is understood
+        if "max-frames" not in grid and trainer.parse_args(train_args).max_frames is None:
+            logger.warning("--max-frames is not given in the train arguments, the runs will not stop on their own")
+        run_sweep(grid, train_args, args.out_dir, args.exp_name,
+                  workers=args.workers, threads_per_run=args.threads_per_run)
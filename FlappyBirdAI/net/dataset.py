@@ -0,0 +1,245 @@
+import os
+import json
+import random
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, Callable, Optional, Tuple
+
+import numpy as np
+
+from game.constants import PIPE_WIDTH
+from net.replay import ReplayMemory
+
+logger = logging.getLogger()
+
+# number of valid actions
+NUM_ACTIONS: int = 2
+
+# shape of the preprocessed frames, a state stacks the latest of them
+FRAME_SHAPE: Tuple[int, ...] = (84, 84)
+
+# name of the file listing the shards of a dataset
+INDEX_FILE: str = "index.json"
+
+# the emulator of a worker process, created on its first shard. The entities
+# of the game are global to a process, hence only one emulator per process.
+_emulator = None
+
+
+def _random_policy(emulator, rng: random.Random, noise: float) -> int:
+    """
+    Chooses an action uniformly at random, like the warm start of training.
+    """
+
+    return rng.randrange(NUM_ACTIONS)
+
+
+def _scripted_policy(emulator, rng: random.Random, noise: float) -> int:
+    """
+    Flaps whenever the player falls below the gap of the next pipe, and
+    chooses a random action with probability ``noise``.
+    """
+
+    if rng.random() < noise:
+        return rng.randrange(NUM_ACTIONS)
+
+    entities = emulator.get_state()['entities']
+    player = next((entity for entity in entities if entity['tag'] == "player"), None)
+    if player is None:
+        return 0
+
+    (x, y), (_, vel_y) = player['pos'], player['vel']
+
+    # the lower pipe of the next pair, which the player hasn't passed yet
+    pipes = [entity['pos'] for entity in entities if entity['tag'] == "d_pipe" and entity['pos'][0] + PIPE_WIDTH >= x]
+    if not pipes:
+        return 0
+    gap_bottom = min(pipes)[1]
+
+    # the player is 64 pixels high, keeping a margin above the bottom of the gap
+    return int(vel_y >= 0 and y + 64 > gap_bottom - 45)
+
+
+# policies that can generate a dataset, by name
+POLICIES: Dict[str, Callable[[Any, random.Random, float], int]] = {
+    "random": _random_policy,
+    "scripted": _scripted_policy
+}
+
+
+def _generate_shard(path: str, size: int, policy: str, frames_per_action: int, noise: float, seed: int,
+                    res_folder: str, in_channels: int = 1) -> int:
+    """
+    Plays a new game until ``size`` transitions are collected, and saves them
+    as a shard. Runs in a worker process.
+
+    Args:
+        path (str): The directory to save the shard to.
+        size (int): The number of transitions.
+        policy (str): The name of the policy.
+        frames_per_action (int): The number of frames an action is repeated for.
+        noise (float): The probability of a random action, for the scripted policy.
+        seed (int): The seed of the shard, so that shards don't depend on the
+            worker they were generated on.
+        res_folder (str): The path to the resources folder.
+        in_channels (int): The number of latest frames stored as a state.
+
+    Returns:
+        int: The number of episodes that ended in the shard.
+    """
+
+    # importing here, so that only the worker processes import pygame
+    from game.emulator import Emulator
+    from game.stacking import StackedEmulator
+    from net.preprocessing import build_preprocess
+
+    global _emulator
+    if _emulator is None:
+        _emulator = Emulator(res_folder=res_folder, headless=True, fps=None)
+
+    # the pipes are placed using the global random number generator
+    random.seed(seed)
+    rng = random.Random(seed)
+    _emulator.reset()
+
+    env = StackedEmulator(_emulator, build_preprocess(84), k=in_channels)
+    observation = env.reset()
+
+    choose = POLICIES[policy]
+    memory = ReplayMemory(size, frame_shape=(in_channels, *FRAME_SHAPE), num_actions=NUM_ACTIONS)
+    action_index = 0
+    episodes = 0
+    for step in range(size):
+        if step % frames_per_action == 0:
+            action_index = choose(_emulator, rng, noise)
+
+        actions = [0] * NUM_ACTIONS
+        actions[action_index] = 1
+
+        # the transitions are stored like in training, the next state shifting
+        # in the new frame. An episode ending starts the next transition from
+        # the first frame of the next episode.
+        prev_observation = observation.copy()
+        state = env.step(actions)
+        memory.append(prev_observation, action_index, state.reward,
+                      np.concatenate((prev_observation[1:], state.frame[np.newaxis])), state.is_terminal)
+        observation = state.observation
+        episodes += int(state.is_terminal)
+
+    memory.save(path)
+    return episodes
+
+
+def generate_dataset(out_dir: str, transitions: int, workers: int, policy: str = "random", shard_size: int = 10000,
+                     frames_per_action: int = 4, noise: float = 0.1, seed: int = 0,
+                     res_folder: str = "res/", in_channels: int = 1) -> Dict[str, Any]:
+    """
+    Generates a dataset of preprocessed transitions by playing on headless
+    emulators, each in its own process. Every shard is saved in the format of
+    :meth:`ReplayMemory.save` as soon as it is complete, so its files can be
+    memory mapped, and an index listing the shards is written last.
+
+    Args:
+        out_dir (str): The directory to write the dataset to.
+        transitions (int): The number of transitions.
+        workers (int): The number of worker processes.
+        policy (str): The policy choosing the actions, one of ``POLICIES``.
+        shard_size (int): The number of transitions per shard.
+        frames_per_action (int): The number of frames an action is repeated for. Should match training.
+        noise (float): The probability of a random action, for the scripted policy.
+        seed (int): The seed, the shards are reproducible whatever the number of workers.
+        res_folder (str): The path to the resources folder.
+        in_channels (int): The number of latest frames stored as a state, up to 4. Should
+            match the ``--in-channels`` of training.
+
+    Returns:
+        Dict[str, Any]: The index of the dataset.
+    """
+
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy '{policy}', expected one of {', '.join(POLICIES)}")
+    if not 1 <= in_channels <= 4:
+        raise ValueError("in_channels should be between 1 and 4, the number of stacked frames")
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    sizes = [min(shard_size, transitions - start) for start in range(0, transitions, shard_size)]
+    names = [f"shard_{i:05d}" for i in range(len(sizes))]
+
+    episodes = 0
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        futures = {
+            executor.submit(_generate_shard, os.path.join(out_dir, name), size, policy, frames_per_action,
+                            noise, seed + i, res_folder, in_channels): name
+            for i, (name, size) in enumerate(zip(names, sizes))
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            episodes += future.result()
+            logger.info("Generated %s (%d/%d)", futures[future], done, len(futures))
+
+    index = {
+        'transitions': transitions,
+        'episodes': episodes,
+        'frame_shape': [in_channels, *FRAME_SHAPE],
+        'num_actions': NUM_ACTIONS,
+        'policy': policy,
+        'frames_per_action': frames_per_action,
+        'noise': noise,
+        'seed': seed,
+        'shards': [{'path': name, 'size': size} for name, size in zip(names, sizes)]
+    }
+
+    tmp_path = os.path.join(out_dir, INDEX_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp_path, os.path.join(out_dir, INDEX_FILE))
+
+    logger.info("Generated %d transitions (%d episodes) in %d shards to %s", transitions, episodes, len(sizes), out_dir)
+    return index
+
+
+def load_dataset(path: str, replay: ReplayMemory, limit: Optional[int] = None, chunk_size: int = 4096) -> int:
+    """
+    Fills a replay memory with the transitions of a dataset generated using
+    :func:`generate_dataset`. The shards are memory mapped and copied in chunks,
+    so the dataset never has to fit in memory. If the dataset is larger than the
+    memory, only its last transitions are kept.
+
+    Args:
+        path (str): The directory of the dataset.
+        replay (ReplayMemory): The replay memory to fill.
+        limit (Optional[int]): The maximum number of transitions to load.
+        chunk_size (int): The number of transitions copied at once.
+
+    Returns:
+        int: The number of transitions loaded.
+    """
+
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        index = json.load(f)
+
+    if tuple(index['frame_shape']) != replay.frame_shape:
+        raise ValueError(f"The dataset stores states of shape {tuple(index['frame_shape'])}, "
+                         f"the replay memory expects {replay.frame_shape}. Generate it with --in-channels "
+                         f"{replay.frame_shape[0]}")
+
+    # skipping the transitions that would be overwritten anyway
+    total = sum(shard['size'] for shard in index['shards'])
+    count = min(total, replay.capacity if limit is None else min(limit, replay.capacity))
+    skip = total - count
+
+    for shard in index['shards']:
+        if skip >= shard['size']:
+            skip -= shard['size']
+            continue
+
+        shard_path = os.path.join(path, shard['path'])
+        arrays = ReplayMemory.load_fields(shard_path, shard['size']).values()
+        for start in range(skip, shard['size'], chunk_size):
+            replay.extend(*(array[start:start + chunk_size] for array in arrays))
+        skip = 0
+
+    logger.info("Loaded %d transitions from the dataset in %s (%s policy)", count, path, index['policy'])
+    return count
@@ -0,0 +1,116 @@
+import os
+import logging
+from typing import List, Sequence
+
+import torch
+import torch.nn as nn
+import torch.distributed as dist
+
+logger = logging.getLogger()
+
+
+def init(rank: int, world_size: int, port: int, address: str = "127.0.0.1") -> None:
+    """
+    Joins the process group of the data parallel learners, using the gloo
+    backend, and splits the cpu cores of the machine between the learners.
+
+    Args:
+        rank (int): The rank of this process.
+        world_size (int): The number of processes.
+        port (int): The port rank 0 listens on.
+        address (str): The address of rank 0.
+    """
+
+    dist.init_process_group("gloo", init_method=f"tcp://{address}:{port}", rank=rank, world_size=world_size)
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+
+    logger.info("Joined process group as rank %d of %d", rank, world_size)
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    """
+    Checks whether this process is rank 0, which is the only one that
+    checkpoints and writes summaries. True if not distributed.
+    """
+
+    return get_rank() == 0
+
+
+def broadcast_parameters(module: nn.Module) -> None:
+    """
+    Copies the parameters and buffers of rank 0's module to the other ranks.
+
+    Args:
+        module (nn.Module): The module.
+    """
+
+    if not is_distributed():
+        return
+
+    for tensor in module.state_dict().values():
+        dist.broadcast(tensor, src=0)
+
+
+def max_ints(values: Sequence[int]) -> List[int]:
+    """
+    Gets the maximum of every value over the ranks, such as settings the ranks
+    have to agree on.
+
+    Args:
+        values (Sequence[int]): The values of this rank.
+
+    Returns:
+        List[int]: The maximums, or the given values if not distributed.
+    """
+
+    if not is_distributed():
+        return list(values)
+
+    tensor = torch.tensor(list(values), dtype=torch.long)
+    dist.all_reduce(tensor, op=dist.ReduceOp.MAX)
+    return tensor.tolist()
+
+
+def average_gradients(module: nn.Module) -> None:
+    """
+    Averages the gradients of the module across the ranks. The gradients are
+    flattened into a single buffer, so that only one all reduce is performed.
+
+    Args:
+        module (nn.Module): The module, after the backward pass.
+    """
+
+    if not is_distributed():
+        return
+
+    grads = [p.grad for p in module.parameters() if p.grad is not None]
+    flat = torch.cat([grad.reshape(-1) for grad in grads])
+    dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+    flat.div_(dist.get_world_size())
+
+    offset = 0
+    for grad in grads:
+        numel = grad.numel()
+        grad.copy_(flat[offset:offset + numel].view_as(grad))
+        offset += numel
+
+
+def cleanup() -> None:
+    """
+    Leaves the process group, if joined.
+    """
+
+    if is_distributed():
+        dist.destroy_process_group()
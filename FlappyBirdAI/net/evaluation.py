@@ -0,0 +1,148 @@
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from game.pool import EmulatorPool
+from net.preprocessing import build_preprocess
+from net.runtime import Policy
+
+logger = logging.getLogger()
+
+# number of valid actions
+NUM_ACTIONS: int = 2
+
+
+def evaluate(policy: Policy, episodes: int, num_envs: int = 4, frames_per_action: int = 4,
+             max_score: Optional[int] = None, max_steps: Optional[int] = None,
+             res_folder: str = "res/", seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Plays episodes using the greedy policy on a pool of headless emulators,
+    choosing the actions of all the emulators with a single forward pass.
+
+    Args:
+        policy (Policy): The policy to evaluate.
+        episodes (int): The number of episodes to play.
+        num_envs (int): The number of emulators to play on in parallel.
+        frames_per_action (int): The number of frames to be passed before an action can
+            be performed, the previous action is repeated in between. Should match training.
+        max_score (Optional[int]): Ends an episode once this score is reached.
+        max_steps (Optional[int]): Ends an episode once it has lasted these many frames.
+        res_folder (str): The path to the resources folder.
+        seed (Optional[int]): Seeds the games, so that evaluations can be compared. Unseeded if None.
+
+    Returns:
+        Dict[str, Any]: The score and episode length statistics, the throughput and
+        the results of every episode.
+    """
+
+    num_envs = min(num_envs, episodes)
+
+    scores: List[int] = []
+    lengths: List[int] = []
+
+    with EmulatorPool(num_envs, res_folder=res_folder, preprocess=build_preprocess(84), seed=seed) as pool:
+        start = time.time()
+
+        # The states are the latest frames the model takes, starting as the first
+        # frame of the episode repeated, retrieved by doing nothing.
+        no_op = [1, 0]
+        channels = policy.in_channels
+        states = np.zeros((num_envs, channels, 84, 84), dtype=np.uint8)
+
+        def start_episodes(indices: List[int]) -> None:
+            for index, result in zip(indices, pool.step([no_op] * len(indices), indices=indices,
+                                                        render=[True] * len(indices))):
+                states[index] = result.frame
+
+        start_episodes(list(range(num_envs)))
+        total_frames = 0
+
+        # the number of episodes that have been started
+        started = num_envs
+        # the envs still playing an episode
+        active = list(range(num_envs))
+        # the number of frames each env has been playing its episode for
+        steps = np.zeros(num_envs, dtype=np.int64)
+        action_indices = np.zeros(num_envs, dtype=np.int64)
+
+        while active:
+            # choosing actions for the envs that can perform one in this frame,
+            # in one pass.
+            deciding = [index for index in active if steps[index] % frames_per_action == 0]
+            if deciding:
+                action_indices[deciding] = policy.act(states[deciding])
+
+            actions = []
+            for index in active:
+                action = [0] * NUM_ACTIONS
+                action[action_indices[index]] = 1
+                actions.append(action)
+
+            # only rendering the frames the next actions are chosen on, the
+            # game plays the same either way
+            render = [-(steps[index] + 1) % frames_per_action < channels or
+                      (max_steps is not None and steps[index] + 1 >= max_steps) for index in active]
+            results = pool.step(actions, indices=active, render=render)
+            total_frames += len(active)
+
+            finished = []
+            restarted = []
+            for index, result in zip(active, results):
+                # the frame of a terminal state is the last of the episode, the
+                # stack is filled when the next one starts
+                if result.frame is not None and not result.is_terminal:
+                    # shifting the new frame in
+                    states[index, :-1] = states[index, 1:]
+                    states[index, -1] = result.frame
+                steps[index] += 1
+
+                capped = (max_score is not None and result.score >= max_score) or \
+                         (max_steps is not None and steps[index] >= max_steps)
+                if not (result.is_terminal or capped):
+                    continue
+
+                scores.append(int(result.score))
+                lengths.append(int(steps[index]))
+                steps[index] = 0
+
+                # the emulator resets itself on terminal states only
+                if capped and not result.is_terminal:
+                    pool.reset([index])
+
+                # starting a new episode, if more are needed
+                if started < episodes:
+                    started += 1
+                    restarted.append(index)
+                else:
+                    finished.append(index)
+
+            if restarted:
+                start_episodes(restarted)
+
+            active = [index for index in active if index not in finished]
+
+        elapsed = time.time() - start
+
+    results = {
+        'episodes': len(scores),
+        'score_mean': float(np.mean(scores)),
+        'score_median': float(np.median(scores)),
+        'score_max': int(np.max(scores)),
+        'length_mean': float(np.mean(lengths)),
+        'length_median': float(np.median(lengths)),
+        'length_max': int(np.max(lengths)),
+        'frames': total_frames,
+        'seconds': elapsed,
+        'frames_per_second': total_frames / elapsed if elapsed > 0 else float("inf"),
+        'scores': scores,
+        'lengths': lengths
+    }
+
+    logger.info("Evaluated %d episodes: mean score %.2f, median score %.1f, max score %d, "
+                "mean length %.1f, %.1f frames/sec", results['episodes'], results['score_mean'],
+                results['score_median'], results['score_max'], results['length_mean'],
+                results['frames_per_second'])
+
+    return results
@@ -0,0 +1,59 @@
+import json
+import logging
+
+import torch
+
+from net.model import Model
+from net.quantization import quantize
+from net.utils import load_checkpoint
+
+logger = logging.getLogger()
+
+# precisions the model can be exported with
+PRECISIONS = ("fp32", "fp16", "int8")
+
+
+def export_model(checkpoint_path: str, out_path: str, precision: str = "fp32") -> None:
+    """
+    Exports the model in a training checkpoint as an inference only TorchScript
+    artifact, which can be loaded using :class:`net.runtime.Policy`. The optimizer
+    state and the rest of the training state are dropped.
+
+    Args:
+        checkpoint_path (str): The path to the training checkpoint.
+        out_path (str): The path to write the artifact to.
+        precision (str): The precision of the weights. One of "fp32", "fp16" (halves
+            the size of the artifact, the weights are upcast when loaded on the cpu)
+            or "int8" (dynamically quantized linear layers, for cpu inference).
+    """
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+
+    # loading the weights
+    data = load_checkpoint(checkpoint_path, map_location="cpu")
+    model = Model(input_dim=(84, 84), in_channels=data.get('in_channels', 1))
+    model.load_state_dict(data['state_dict'])
+    model.eval()
+
+    # converting the weights
+    if precision == "fp16":
+        model = model.half()
+    elif precision == "int8":
+        model = quantize(model)
+
+    # tracing the model. The weights of a fp16 model are traced in fp16 too,
+    # so that the artifact stores them in half precision.
+    example = torch.zeros(1, model.in_channels, 84, 84, dtype=torch.half if precision == "fp16" else torch.float)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+
+    # storing the information needed by the runtime along with the model
+    meta = {
+        'precision': precision,
+        'input_shape': list(example.shape[1:]),
+        'frame': data['frame']
+    }
+    torch.jit.save(traced, out_path, _extra_files={'meta.json': json.dumps(meta)})
+
+    logger.info("Exported model from %s to %s (%s)", checkpoint_path, out_path, precision)
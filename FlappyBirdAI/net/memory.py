@@ -0,0 +1,232 @@
+import os
+import time
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from net.replay import ReplayMemory
+
+logger = logging.getLogger()
+
+# bytes per megabyte, the unit the footprint is reported in
+MB: int = 2 ** 20
+
+
+def replay_nbytes(capacity: int, frame_shape: Tuple[int, ...], num_actions: int = 2) -> int:
+    """
+    Projects the bytes a replay memory takes at capacity, without allocating it.
+
+    Args:
+        capacity (int): The number of transitions.
+        frame_shape (Tuple[int, ...]): The shape of the stored states.
+        num_actions (int): The number of actions.
+
+    Returns:
+        int: The bytes.
+    """
+
+    return ReplayMemory(1, frame_shape=frame_shape, num_actions=num_actions).nbytes * capacity
+
+
+def tensors_nbytes(tensors: Iterable[torch.Tensor]) -> int:
+    """
+    Sums the bytes of tensors, counting tensors sharing the same data once.
+    """
+
+    sizes = {}
+    for tensor in tensors:
+        sizes[tensor.data_ptr()] = max(sizes.get(tensor.data_ptr(), 0), tensor.numel() * tensor.element_size())
+    return sum(sizes.values())
+
+
+def module_nbytes(module: nn.Module) -> int:
+    """
+    The bytes of the parameters and buffers of a module.
+    """
+
+    return tensors_nbytes(list(module.parameters()) + list(module.buffers()))
+
+
+def optimizer_nbytes(optimizer: optim.Optimizer) -> int:
+    """
+    The bytes of the state of an optimizer, such as the moments of Adam. The
+    state is created by the first step, so it is empty until training starts.
+    """
+
+    return tensors_nbytes(value for state in optimizer.state.values() for value in state.values()
+                          if isinstance(value, torch.Tensor))
+
+
+def emulator_nbytes(emulator) -> Dict[str, int]:
+    """
+    The bytes of the pygame surfaces and collision masks of an emulator: its
+    screen, and the images and masks of the entities of the game. Images and
+    masks shared by several entities are counted once.
+
+    Args:
+        emulator (Emulator): The emulator.
+
+    Returns:
+        Dict[str, int]: The bytes of the surfaces and of the masks.
+    """
+
+    from game.core.managers import EntityManager
+
+    surfaces = {id(emulator.screen): emulator.screen}
+    masks = {}
+    # copying the entities, since they can be added and removed while they are counted
+    for entity in list(EntityManager.entities):
+        if entity.render_component is not None:
+            image = entity.render_component.image
+            surfaces[id(image)] = image
+        if entity.collision_component is not None:
+            mask = entity.collision_component.mask
+            masks[id(mask)] = mask
+
+    # a mask stores a bit per pixel
+    return {
+        'surfaces': sum(surface.get_pitch() * surface.get_height() for surface in surfaces.values()),
+        'masks': sum((mask.get_size()[0] * mask.get_size()[1] + 7) // 8 for mask in masks.values())
+    }
+
+
+def process_rss() -> Optional[int]:
+    """
+    The resident set size of the process, from ``/proc``.
+
+    Returns:
+        Optional[int]: The bytes, or None if ``/proc`` isn't available.
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def available_memory() -> Optional[int]:
+    """
+    The memory available to new allocations without swapping, from ``/proc/meminfo``.
+
+    Returns:
+        Optional[int]: The bytes, or None if ``/proc`` isn't available.
+    """
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    # the value is in kilobytes
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+def check_replay_footprint(capacity: int, frame_shape: Tuple[int, ...], num_actions: int = 2, processes: int = 1,
+                           headroom: float = 0.9) -> None:
+    """
+    Checks that a replay memory would fit in the available memory at capacity,
+    before it is allocated, so that a run fails when it starts instead of being
+    killed once the memory fills up. The storage is zero filled, so it is only
+    committed as transitions are written.
+
+    Args:
+        capacity (int): The number of transitions.
+        frame_shape (Tuple[int, ...]): The shape of the stored states.
+        num_actions (int): The number of actions.
+        processes (int): The number of processes on the machine holding a replay
+            memory of the same size, such as the data parallel learners.
+        headroom (float): The fraction of the available memory the replay
+            memories may take.
+
+    Raises:
+        MemoryError: If the replay memories would not fit.
+    """
+
+    available = available_memory()
+    if available is None:
+        logger.warning("Can't read the available memory, the footprint of the replay memory isn't checked")
+        return
+
+    nbytes = replay_nbytes(capacity, frame_shape, num_actions)
+    logger.info("The replay memory takes %.1f MB at capacity (%d transitions of shape %s), %.1f MB are available",
+                nbytes / MB, capacity, tuple(frame_shape), available / MB)
+
+    if nbytes * processes > available * headroom:
+        raise MemoryError(
+            f"The replay memory takes {nbytes / MB:.1f} MB at capacity"
+            f"{f' in each of {processes} processes' if processes > 1 else ''}, only {available / MB:.1f} MB "
+            f"are available. Lower --max-replay or --in-channels, or skip the check with --skip-memory-check"
+        )
+
+
+class MemoryMonitor:
+    """
+    Reports where the memory of a training run goes: the replay memory, the
+    model and optimizer state, the surfaces and masks of the emulator, and the
+    resident set size of the process, in MB. Used as a source of
+    :class:`Metrics`, it only measures every ``interval`` seconds, the flushes
+    in between don't report it.
+    """
+
+    def __init__(self, replay: ReplayMemory, model: nn.Module, optimizer: optim.Optimizer, emulator=None,
+                 interval: float = 60.0):
+        """
+        Args:
+            replay (ReplayMemory): The replay memory.
+            model (nn.Module): The model.
+            optimizer (optim.Optimizer): The optimizer of the model.
+            emulator (Optional[Emulator]): The emulator, if it runs in this process.
+            interval (float): The minimum time between reports, in seconds.
+        """
+
+        self.replay = replay
+        self.model = model
+        self.optimizer = optimizer
+        self.emulator = emulator
+        self.interval = interval
+
+        self._last: Optional[float] = None
+
+    def measure(self) -> Dict[str, float]:
+        """
+        Measures the footprint.
+
+        Returns:
+            Dict[str, float]: The MB held by every part, by name.
+        """
+
+        # the storage is committed as it fills up, the filled part is resident
+        replay = self.replay
+        values = {
+            'memory/replay_mb': replay.nbytes * len(replay) / max(replay.capacity, 1) / MB,
+            'memory/replay_capacity_mb': replay.nbytes / MB,
+            'memory/model_mb': module_nbytes(self.model) / MB,
+            'memory/optimizer_mb': optimizer_nbytes(self.optimizer) / MB
+        }
+
+        if self.emulator is not None:
+            for name, nbytes in emulator_nbytes(self.emulator).items():
+                values[f'memory/emulator_{name}_mb'] = nbytes / MB
+
+        rss = process_rss()
+        if rss is not None:
+            values['memory/rss_mb'] = rss / MB
+
+        if torch.cuda.is_initialized():
+            values['memory/cuda_mb'] = torch.cuda.memory_allocated() / MB
+
+        return values
+
+    def __call__(self) -> Dict[str, float]:
+        now = time.monotonic()
+        if self._last is not None and now - self._last < self.interval:
+            return {}
+        self._last = now
+        return self.measure()
@@ -0,0 +1,149 @@
+import math
+import logging
+import threading
+from typing import Dict, List, Optional, Callable
+
+from tensorboardX import SummaryWriter
+
+logger = logging.getLogger()
+
+
+class Metrics:
+    """
+    Keeps rolling aggregates (mean, min, max) of the values recorded during
+    training, and flushes them to tensorboard and the log from a background
+    thread at a fixed time interval. Recording a value only updates the
+    aggregate in memory, so it is cheap enough to do on every frame.
+    """
+
+    def __init__(self, writer: Optional[SummaryWriter], interval: float = 10.0):
+        """
+        Args:
+            writer (Optional[SummaryWriter]): The summary writer to flush to. Flushed
+                only to the log if None.
+            interval (float): The time between flushes, in seconds.
+        """
+
+        self.writer = writer
+        self.interval = interval
+
+        # aggregates of the values recorded since the last flush, as
+        # [count, sum, min, max], by name
+        self._aggregates: Dict[str, List[float]] = {}
+        # the step the aggregates are written at
+        self._step = 0
+        self._lock = threading.Lock()
+
+        # functions returning values computed at flush time, by name
+        self._sources: List[Callable[[], Dict[str, float]]] = []
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, name: str, value: float) -> None:
+        """
+        Records a value.
+
+        Args:
+            name (str): The name of the metric.
+            value (float): The value.
+        """
+
+        with self._lock:
+            aggregate = self._aggregates.get(name)
+            if aggregate is None:
+                self._aggregates[name] = [1, value, value, value]
+            else:
+                aggregate[0] += 1
+                aggregate[1] += value
+                if value < aggregate[2]:
+                    aggregate[2] = value
+                if value > aggregate[3]:
+                    aggregate[3] = value
+
+    def add_source(self, source: Callable[[], Dict[str, float]]) -> None:
+        """
+        Adds a function that is called on every flush, from the background thread,
+        returning values to be written as they are (not aggregated).
+
+        Args:
+            source (Callable[[], Dict[str, float]]): The function, returning the values by name.
+        """
+
+        self._sources.append(source)
+
+    def set_step(self, step: int) -> None:
+        """
+        Sets the step (frame) the next flush is written at.
+
+        Args:
+            step (int): The step.
+        """
+
+        self._step = step
+
+    def start(self) -> 'Metrics':
+        """
+        Starts the background thread flushing the metrics.
+
+        Returns:
+            Metrics: self, for chaining.
+        """
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """
+        Stops the background thread and flushes the remaining values.
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the aggregates of the values recorded since the last flush, and resets them.
+        """
+
+        # swapping the aggregates out, so that recording is blocked only briefly
+        with self._lock:
+            aggregates, self._aggregates = self._aggregates, {}
+            step = self._step
+
+        values: Dict[str, float] = {}
+        for source in self._sources:
+            values.update(source())
+
+        if not aggregates and not values:
+            return
+
+        summary = []
+        for name in sorted(aggregates):
+            count, total, minimum, maximum = aggregates[name]
+            mean = total / count
+            summary.append(f"{name}: {mean:.4f} [{minimum:.4f}, {maximum:.4f}]")
+
+            if self.writer is not None and math.isfinite(mean):
+                self.writer.add_scalar(f"{name}/mean", mean, step)
+                self.writer.add_scalar(f"{name}/min", minimum, step)
+                self.writer.add_scalar(f"{name}/max", maximum, step)
+
+        for name in sorted(values):
+            summary.append(f"{name}: {values[name]:.4f}")
+            if self.writer is not None:
+                self.writer.add_scalar(name, values[name], step)
+
+        logger.info("Frame: %d, %s", step, ", ".join(summary))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush metrics")
@@ -0,0 +1,91 @@
+from typing import Tuple, Dict
+
+import torch
+import torch.nn as nn
+
+
+class Model(nn.Module):
+    """
+    The module for the network.
+
+    The frames of a state are given as input channels, so that a state is
+    evaluated in a single forward pass and the network sees how the game
+    changes between the frames. With a single input channel, the frames are
+    evaluated one at a time, which is how the network was first trained.
+    """
+
+    def __init__(self, input_dim: Tuple[int, int], in_channels: int = 1):
+        super(Model, self).__init__()
+        self.in_channels = in_channels
+        self.convnet: nn.Sequential = nn.Sequential(
+            nn.Conv2d(in_channels, 16, (8, 8), stride=4),
+            nn.ReLU(),
+            nn.Conv2d(16, 32, (4, 4), stride=2),
+            nn.ReLU(),
+        )
+
+        # computing the final width of the image after the convolutional layers
+        # function is called two times as there are two conv2d layers
+        width_convnet_out = self._conv2d_size_out(self._conv2d_size_out(input_dim[0], 8, 4), 4, 2)
+
+        # computing the final height of the image after the convolutional layers
+        # function is called two times as there are two conv2d layers
+        height_convnet_out = self._conv2d_size_out(self._conv2d_size_out(input_dim[1], 8, 4), 4, 2)
+
+        self.densenet: nn.Sequential = nn.Sequential(
+            Flatten(),
+            nn.Linear(32 * width_convnet_out * height_convnet_out, 256),
+            nn.Linear(256, 2)
+        )
+
+    def migrate_state_dict(self, state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        """
+        Adapts the weights of a model taking a single frame to this model. The
+        weights of the first convolution are used for the latest frame, and
+        the other frames get zero weights, so that the migrated model computes
+        exactly what the original one did on the latest frame of a state.
+
+        Args:
+            state_dict (Dict[str, torch.Tensor]): The weights.
+
+        Returns:
+            Dict[str, torch.Tensor]: The migrated weights, or the given ones if they
+            already match this model.
+        """
+
+        weight = state_dict['convnet.0.weight']
+        saved_channels = weight.shape[1]
+        if saved_channels == self.in_channels:
+            return state_dict
+        if saved_channels != 1:
+            raise ValueError(f"Can't migrate weights taking {saved_channels} channels to a model "
+                             f"taking {self.in_channels}")
+
+        migrated = dict(state_dict)
+        migrated['convnet.0.weight'] = weight.new_zeros(weight.shape[0], self.in_channels, *weight.shape[2:])
+        migrated['convnet.0.weight'][:, -1:] = weight
+        return migrated
+
+    def _conv2d_size_out(self, size, kernel_size, stride):
+            return (size - (kernel_size - 1) - 1) // stride  + 1
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Performs forward pass.
+        
+        Args:
+            x (torch.Tensor): The input images, of shape (N, in_channels, H, W)
+        
+        Returns:
+            torch.Tensor: The output of the network
+        """
+
+        conv_out = self.convnet(x)
+        return self.densenet(conv_out)
+
+class Flatten(nn.Module):
+    def __init__(self):
+        super(Flatten, self).__init__()
+    
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return x.view(x.size(0), -1)
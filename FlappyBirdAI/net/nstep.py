@@ -0,0 +1,99 @@
+from collections import deque
+from typing import Any, Deque, List, Tuple
+
+import numpy as np
+
+# a transition as appended to the replay memory: the state, the action index,
+# the discounted return, the next state, the terminal flag and the horizon
+Transition = Tuple[np.ndarray, int, float, np.ndarray, bool, int]
+
+
+class NStepBuilder:
+    """
+    Turns the transitions of every frame into n-step transitions, whose reward
+    is the discounted return over the next n frames and whose next state is the
+    one n frames later, so that the TD target bootstraps from ``gamma ** n *
+    max(Q(next state))``.
+
+    The returns are computed incrementally, as the frames arrive: every pending
+    transition of the rolling window adds the new reward, discounted by its age,
+    and the oldest one is complete once it spans n frames. When an episode ends,
+    the pending transitions are all completed with the terminal state and
+    shorter horizons, they don't bootstrap. With n = 1, every transition is
+    completed as it arrives.
+    """
+
+    def __init__(self, n: int, gamma: float):
+        """
+        Args:
+            n (int): The number of frames a transition spans, at most 255.
+            gamma (float): The discount factor.
+        """
+
+        if not 1 <= n <= 255:
+            raise ValueError("n should be between 1 and 255, the horizons are stored as uint8")
+
+        self.n = n
+        self.gamma = gamma
+
+        # the discount of the reward received i frames after a state
+        self._discounts: List[float] = [gamma ** i for i in range(n)]
+        # the pending transitions, oldest first, as [state, action, return, horizon]
+        self._pending: Deque[List[Any]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def push(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray,
+             is_terminal: bool) -> List[Transition]:
+        """
+        Adds the transition of a frame, and returns the transitions it completes.
+
+        Args:
+            state (np.ndarray): The state the action was performed on. Copied if
+                it is kept, so it can be overwritten afterwards.
+            action (int): The index of the action performed.
+            reward (float): The reward received.
+            next_state (np.ndarray): The state after performing the action.
+            is_terminal (bool): Whether the next state is terminal.
+
+        Returns:
+            List[Transition]: The completed transitions, oldest first.
+        """
+
+        for pending in self._pending:
+            pending[2] += self._discounts[pending[3]] * reward
+            pending[3] += 1
+        self._pending.append([state if self.n == 1 else state.copy(), action, reward, 1])
+
+        completed: List[Transition] = []
+        if is_terminal:
+            while self._pending:
+                state, action, ret, horizon = self._pending.popleft()
+                completed.append((state, action, ret, next_state, True, horizon))
+        elif self._pending[0][3] == self.n:
+            state, action, ret, horizon = self._pending.popleft()
+            completed.append((state, action, ret, next_state, False, horizon))
+        return completed
+
+    def get_state(self) -> List[List[Any]]:
+        """
+        Gets the pending transitions, so that they can be resumed.
+
+        Returns:
+            List[List[Any]]: The pending transitions.
+        """
+
+        return [list(pending) for pending in self._pending]
+
+    def set_state(self, state: List[List[Any]]) -> None:
+        """
+        Restores the pending transitions returned by :meth:`get_state`. If n is
+        smaller than when they were saved, the ones spanning n frames or more are
+        dropped.
+
+        Args:
+            state (List[List[Any]]): The pending transitions.
+        """
+
+        self._pending = deque(list(pending) for pending in state if pending[3] < self.n)
@@ -0,0 +1,588 @@
+import os
+import math
+import json
+import time
+import random
+import logging
+import argparse
+from collections import deque
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import torch
+import torch.optim as optim
+import torch.nn.functional as F
+
+from tensorboardX import SummaryWriter
+
+from game.pool import EmulatorPool
+from game.stacking import FrameStack, StackedEmulator
+from net.dataset import load_dataset
+from net.memory import check_replay_footprint
+from net.metrics import Metrics
+from net.model import Model
+from net.nstep import NStepBuilder
+from net.preprocessing import build_preprocess
+from net.replay import ReplayMemory
+from net.scheduler import TrainingScheduler
+from net.solver import td_targets
+from net.utils import CheckpointManager, seed_everything
+
+logger = logging.getLogger()
+
+# number of valid actions
+NUM_ACTIONS: int = 2
+
+# the hyperparameters explored, with the bounds they are kept in
+HYPERPARAMETERS: Dict[str, Tuple[float, float]] = {
+    'lr': (1e-6, 1e-2),
+    'gamma': (0.9, 0.9999),
+    'final_epsilon': (1e-4, 0.1),
+    'explore': (1e3, 1e7)
+}
+
+
+def perturb(hyperparameters: Dict[str, float], names: Sequence[str], factors: Sequence[float],
+            rng: random.Random) -> Dict[str, float]:
+    """
+    Multiplies every explored hyperparameter by a factor chosen at random, keeping
+    it within its bounds. Gamma is close to 1, so its horizon ``1 / (1 - gamma)``
+    is scaled instead.
+
+    Args:
+        hyperparameters (Dict[str, float]): The hyperparameters.
+        names (Sequence[str]): The names of the hyperparameters to perturb.
+        factors (Sequence[float]): The factors to choose from.
+        rng (random.Random): The random number generator.
+
+    Returns:
+        Dict[str, float]: The perturbed hyperparameters.
+    """
+
+    perturbed = dict(hyperparameters)
+    for name in names:
+        factor = rng.choice(factors)
+        if name == 'gamma':
+            value = 1 - (1 - perturbed[name]) / factor
+        else:
+            value = perturbed[name] * factor
+
+        low, high = HYPERPARAMETERS[name]
+        value = min(max(value, low), high)
+        perturbed[name] = int(round(value)) if name == 'explore' else value
+    return perturbed
+
+
+class PopulationModel:
+    """
+    The models of a population evaluated as one, mirroring :meth:`Model.forward`:
+    the convolutions of the models run as a single grouped convolution, and their
+    linear layers as batched matrix products, so that the states of every member
+    go through one forward pass instead of one per member. The weights are
+    copied into stacked tensors, which :meth:`load` refreshes for a member once
+    its weights changed.
+    """
+
+    def __init__(self, models: Sequence[Model]):
+        """
+        Args:
+            models (Sequence[Model]): The models, with the same architecture.
+        """
+
+        self.models = list(models)
+        with torch.no_grad():
+            self._stacked: Dict[str, torch.Tensor] = {
+                name: torch.stack([dict(model.named_parameters())[name] for model in self.models])
+                for name, _ in self.models[0].named_parameters()
+            }
+
+    def load(self, index: int) -> None:
+        """
+        Copies the weights of a model into the stacked ones.
+
+        Args:
+            index (int): The index of the model.
+        """
+
+        with torch.no_grad():
+            for name, param in self.models[index].named_parameters():
+                self._stacked[name][index].copy_(param)
+
+    def __call__(self, states: torch.Tensor) -> torch.Tensor:
+        """
+        Computes the Q values of the states of every model.
+
+        Args:
+            states (torch.Tensor): The states, of shape (P, N, in_channels, H, W), the
+                N states of the p-th model first.
+
+        Returns:
+            torch.Tensor: The Q values, of shape (P, N, 2).
+        """
+
+        population, batch = states.shape[:2]
+        stacked = self._stacked
+        # the states of every model as the channels of a group
+        x = states.transpose(0, 1).reshape(batch, -1, *states.shape[3:])
+        with torch.no_grad():
+            for i in (0, 2):
+                weight = stacked[f'convnet.{i}.weight']
+                x = F.relu(F.conv2d(x, weight.view(-1, *weight.shape[2:]), stacked[f'convnet.{i}.bias'].view(-1),
+                                    stride=self.models[0].convnet[i].stride, groups=population))
+
+            # flattening the features of every model, like Flatten
+            x = x.view(batch, population, -1).transpose(0, 1)
+            for i in (1, 2):
+                x = torch.baddbmm(stacked[f'densenet.{i}.bias'].unsqueeze(1), x,
+                                  stacked[f'densenet.{i}.weight'].transpose(1, 2))
+        return x
+
+
+class Member:
+    """
+    A member of the population: a model and its optimizer, trained with its own
+    hyperparameters and epsilon, acting on its own emulators of the pool. Its
+    checkpoints are written to its own folder, which is how other members copy
+    its weights.
+    """
+
+    def __init__(self, index: int, args: argparse.Namespace, hyperparameters: Dict[str, float], envs: List[int],
+                 device: torch.device, window: int, frequency: int):
+        """
+        Args:
+            index (int): The index of the member.
+            args (argparse.Namespace): The arguments of the train command.
+            hyperparameters (Dict[str, float]): The hyperparameters of the member.
+            envs (List[int]): The emulators of the pool the member acts on.
+            device (torch.device): The device the model runs on.
+            window (int): The number of recent episodes the member is ranked on.
+            frequency (int): The number of frames between checkpoints.
+        """
+
+        self.index = index
+        self.name = f"member_{index}"
+        self.hyperparameters = dict(hyperparameters)
+        self.envs = envs
+        self.device = device
+
+        self.model: Model = Model(input_dim=(84, 84), in_channels=args.in_channels).to(device)
+        self.optimizer = optim.Adam(self.model.parameters(), lr=self.hyperparameters['lr'])
+        self.epsilon: float = args.initial_epsilon
+
+        self.checkpoint_mgr = CheckpointManager('model', args.out_dir, os.path.join(args.exp_name, self.name),
+                                                frequency=frequency, retain=2)
+
+        # the scores of the latest episodes, which the member is ranked on
+        self.recent_scores: deque = deque(maxlen=window)
+        self.episodes: int = 0
+        # the member whose weights were last copied, if any
+        self.parent: Optional[int] = None
+        # the number of times the weights changed, so that copies of them are refreshed
+        self.updates: int = 0
+
+    def restore(self) -> Optional[int]:
+        """
+        Restores the latest checkpoint of the member, if any.
+
+        Returns:
+            Optional[int]: The frame of the checkpoint, or None if there is none.
+        """
+
+        frame, epsilon, state = self.checkpoint_mgr.restore(self.model, self.optimizer)
+        if frame is None:
+            return None
+
+        self.epsilon = epsilon
+        self.set_hyperparameters(state['hyperparameters'])
+        self.parent = state.get('parent')
+        return frame
+
+    def save(self, frame: int) -> None:
+        """
+        Saves a checkpoint, with the hyperparameters of the member.
+
+        Args:
+            frame (int): The frame.
+        """
+
+        self.checkpoint_mgr.save(self.model, self.optimizer, frame, self.epsilon,
+                                 state={'hyperparameters': self.hyperparameters, 'parent': self.parent})
+
+    def exploit(self, source: 'Member') -> None:
+        """
+        Copies the weights, the optimizer state, epsilon and the hyperparameters of
+        another member, from its latest checkpoint.
+
+        Args:
+            source (Member): The member to copy.
+        """
+
+        _, epsilon, state = source.checkpoint_mgr.restore(self.model, self.optimizer)
+        self.epsilon = epsilon
+        self.set_hyperparameters(state['hyperparameters'])
+        self.parent = source.index
+        self.updates += 1
+        # the scores were those of the replaced policy
+        self.recent_scores.clear()
+
+    def set_hyperparameters(self, hyperparameters: Dict[str, float]) -> None:
+        """
+        Sets the hyperparameters, updating the learning rate of the optimizer.
+
+        Args:
+            hyperparameters (Dict[str, float]): The hyperparameters.
+        """
+
+        self.hyperparameters = dict(hyperparameters)
+        for group in self.optimizer.param_groups:
+            group['lr'] = self.hyperparameters['lr']
+
+    @property
+    def score(self) -> float:
+        """
+        The mean score of the latest episodes, -inf if none ended since the
+        member was created or last copied.
+        """
+
+        return float(np.mean(self.recent_scores)) if self.recent_scores else -math.inf
+
+    def act(self, greedy: Optional[Sequence[int]]) -> List[int]:
+        """
+        Chooses the actions on every emulator of the member, epsilon greedily.
+
+        Args:
+            greedy (Optional[Sequence[int]]): The indices of the actions with the highest
+                Q value on every emulator, or None to choose random actions only.
+
+        Returns:
+            List[int]: The indices of the actions.
+        """
+
+        actions = [random.randrange(NUM_ACTIONS) for _ in self.envs]
+        if greedy is None:
+            return actions
+
+        return [action if random.random() <= self.epsilon else greedy[i] for i, action in enumerate(actions)]
+
+    def learn(self, replay: ReplayMemory, batch_size: int) -> float:
+        """
+        Performs a gradient step on a minibatch sampled from the shared replay
+        memory, like :meth:`Solver._learn`, discounting with the member's gamma.
+
+        Args:
+            replay (ReplayMemory): The replay memory.
+            batch_size (int): The batch size.
+
+        Returns:
+            float: The loss.
+        """
+
+        state_ts, actions_ts, reward_ts, state_t1s, is_terminals, horizons = replay.sample(batch_size, self.device)
+
+        out_state_ts = self.model(state_ts)
+        out_state_t1s = self.model(state_t1s)
+        y = td_targets(reward_ts, is_terminals, out_state_t1s, self.hyperparameters['gamma'], horizons)
+
+        loss = F.mse_loss(torch.sum(out_state_ts * actions_ts, dim=1), y)
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+        self.updates += 1
+        return loss.item()
+
+    def decay_epsilon(self, initial_epsilon: float) -> None:
+        """
+        Scales epsilon down linearly, over the member's number of exploration frames.
+        """
+
+        final_epsilon = self.hyperparameters['final_epsilon']
+        if self.epsilon > final_epsilon:
+            self.epsilon = max(final_epsilon,
+                               self.epsilon - (initial_epsilon - final_epsilon) / self.hyperparameters['explore'])
+
+
+class PopulationTrainer:
+    """
+    Population based training: a population of models, each with its own
+    hyperparameters, trained together on a single pool of headless emulators.
+    Every frame steps the emulators of all the members at once, and the
+    transitions go to a single replay memory the members sample from, so the
+    population observes the game once instead of once per member. The actions
+    of all the members are chosen in a single forward pass.
+
+    Every ``ready_every`` frames, the members are ranked on their recent scores.
+    The bottom ones copy the weights of a top one through its checkpoint
+    (exploit) and perturb the copied hyperparameters (explore).
+    """
+
+    def __init__(self, args: argparse.Namespace, population: int, envs_per_member: int = 1,
+                 ready_every: int = 50000, truncation: float = 0.25, factors: Sequence[float] = (0.8, 1.2),
+                 window: int = 10):
+        """
+        Args:
+            args (argparse.Namespace): The arguments of the train command, giving the initial
+                hyperparameters and the rest of the configuration.
+            population (int): The number of members.
+            envs_per_member (int): The number of emulators every member acts on.
+            ready_every (int): The number of frames between exploit and explore steps.
+            truncation (float): The fraction of the population replaced by the top members.
+            factors (Sequence[float]): The factors the hyperparameters are perturbed by.
+            window (int): The number of recent episodes the members are ranked on.
+        """
+
+        if population < 2:
+            raise ValueError("The population should have at least 2 members")
+        if not 0 < truncation <= 0.5:
+            raise ValueError("truncation should be in (0, 0.5]")
+        if args.world_size > 1 or args.emulator_address is not None:
+            raise ValueError("Population based training runs in a single process, on its own emulators")
+        if not 1 <= args.in_channels <= 4:
+            raise ValueError("in_channels should be between 1 and 4, the number of stacked frames")
+
+        self.args = args
+        self.ready_every = ready_every
+        self.truncation = truncation
+        self.factors = list(factors)
+        self.device = torch.device("cuda:0" if args.cuda else "cpu")
+        self.out_dir = os.path.join(args.out_dir, args.exp_name)
+
+        self.rng = random.Random(args.seed)
+        if args.seed is not None:
+            seed_everything(args.seed)
+
+        # the n-step returns are discounted when the transitions are stored, with
+        # the initial gamma, so gamma is only explored with 1-step transitions
+        self.explored: List[str] = [name for name in HYPERPARAMETERS if name != 'gamma' or args.n_step == 1]
+
+        # the first member starts from the given hyperparameters, the others from perturbed ones
+        initial = {'lr': args.lr, 'gamma': args.gamma, 'final_epsilon': args.final_epsilon, 'explore': args.explore}
+        self.members: List[Member] = [
+            Member(index, args, initial if index == 0 else perturb(initial, self.explored, (0.5, 1, 2), self.rng),
+                   envs=list(range(index * envs_per_member, (index + 1) * envs_per_member)), device=self.device,
+                   window=window, frequency=ready_every)
+            for index in range(population)
+        ]
+
+        # resuming the members, if they have checkpoints. The replay memory isn't
+        # checkpointed, the population observes again.
+        frames = [member.restore() for member in self.members]
+        self.start_frame: int = max((frame for frame in frames if frame is not None), default=0)
+
+        # the models of the members evaluated as one, with the updates of every
+        # member the stacked weights hold, and the float states they act on
+        self.population_model = PopulationModel([member.model for member in self.members])
+        self._loaded: List[int] = [member.updates for member in self.members]
+        self._states_t: torch.Tensor = torch.zeros(population, envs_per_member, args.in_channels, 84, 84,
+                                                   device=self.device)
+
+        # the replay memory shared by the members
+        if not args.skip_memory_check:
+            check_replay_footprint(args.max_replay, (args.in_channels, 84, 84), NUM_ACTIONS)
+        self.D = ReplayMemory(args.max_replay, frame_shape=(args.in_channels, 84, 84), num_actions=NUM_ACTIONS)
+
+        # the transitions collected before training, counted over all the emulators
+        self.observe_for: int = args.observe_for
+        if args.dataset is not None:
+            self.observe_for = max(0, self.observe_for - load_dataset(args.dataset, self.D))
+
+        self.num_envs = population * envs_per_member
+        self.pool = EmulatorPool(self.num_envs, preprocess=build_preprocess(84), seed=args.seed)
+
+        # the transitions of every emulator become n-step transitions on their own
+        self.stacks = [FrameStack(4) for _ in range(self.num_envs)]
+        self.nsteps = [NStepBuilder(args.n_step, args.gamma) for _ in range(self.num_envs)]
+
+        # the gradient steps taken by every member, once done observing
+        self.scheduler = TrainingScheduler(0, frames_per_update=args.frames_per_update,
+                                           gradient_steps=args.gradient_steps, max_frames=args.max_frames)
+
+        self.writer = SummaryWriter(logdir=self.out_dir)
+        self.metrics = Metrics(self.writer, interval=args.metrics_interval)
+        self.metrics.add_source(lambda: {f"{member.name}/{name}": float(value) for member in self.members
+                                         for name, value in member.hyperparameters.items()})
+
+        # the exploit and explore steps taken
+        self.history: List[Dict[str, Any]] = []
+
+    def train(self) -> Dict[str, Any]:
+        """
+        Trains the population until the maximum number of frames.
+
+        Returns:
+            Dict[str, Any]: The results, also written to pbt.json in the experiment folder.
+        """
+
+        start = time.time()
+        self.metrics.start()
+        try:
+            self._train()
+        finally:
+            self.pool.close()
+            self.metrics.close()
+            self.writer.close()
+
+        return self.write_results(time.time() - start)
+
+    def _train(self) -> None:
+        args = self.args
+
+        # the first frames, doing nothing
+        observations = []
+        for stack, state in zip(self.stacks, self.pool.step([StackedEmulator.NO_OP] * self.num_envs,
+                                                              render=[True] * self.num_envs)):
+            observations.append(stack.reset(state.frame).copy())
+
+        action_indices = [0] * self.num_envs
+        transitions = 0
+        num_frames = self.start_frame
+
+        logger.info("Training a population of %d on %d emulators, observing for %d transitions%s...",
+                    len(self.members), self.num_envs, self.observe_for, " (warm start)" if args.warm_start else "")
+        while not self.scheduler.is_done(num_frames):
+            observing = transitions < self.observe_for
+
+            # choosing the actions of every member, in one pass for the population
+            if num_frames % args.frames_per_action == 0:
+                greedy = None if observing and args.warm_start else self._greedy_actions(observations)
+                for member in self.members:
+                    chosen = member.act(greedy[member.index] if greedy is not None else None)
+                    for env, action_index in zip(member.envs, chosen):
+                        action_indices[env] = action_index
+
+            actions = [[int(action_index == i) for i in range(NUM_ACTIONS)] for action_index in action_indices]
+            states = self.pool.step(actions, render=[True] * self.num_envs)
+            transitions += self.num_envs
+
+            # starting the next episodes like StackedEmulator, from a frame doing nothing
+            ended = [env for env, state in enumerate(states) if state.is_terminal]
+            first_frames = dict(zip(ended, self.pool.step([StackedEmulator.NO_OP] * len(ended), indices=ended,
+                                                          render=[True] * len(ended)))) if ended else {}
+
+            self.metrics.set_step(num_frames)
+            for member in self.members:
+                for env in member.envs:
+                    state = states[env]
+                    frame_u8 = state.frame
+                    observation = observations[env]
+                    for transition in self.nsteps[env].push(
+                            observation[-args.in_channels:], action_indices[env], state.reward,
+                            np.concatenate((observation[len(observation) - args.in_channels + 1:],
+                                            frame_u8[np.newaxis])), state.is_terminal):
+                        self.D.append(*transition)
+
+                    if state.is_terminal:
+                        member.recent_scores.append(state.score)
+                        member.episodes += 1
+                        self.metrics.record(f"{member.name}/score", state.score)
+                        observations[env] = self.stacks[env].reset(first_frames[env].frame).copy()
+                    else:
+                        observations[env] = self.stacks[env].push(frame_u8).copy()
+
+            if not observing:
+                for member in self.members:
+                    member.decay_epsilon(args.initial_epsilon)
+                    for _ in range(self.scheduler.steps_at(num_frames)):
+                        self.metrics.record(f"{member.name}/loss", member.learn(self.D, args.batch_size))
+                    self.metrics.record(f"{member.name}/epsilon", member.epsilon)
+
+                if num_frames > 0 and num_frames % self.ready_every == 0:
+                    self._exploit_and_explore(num_frames)
+
+            num_frames += 1
+
+        logger.info("Stopped training at frame %d", num_frames)
+
+    def _greedy_actions(self, observations: Sequence[np.ndarray]) -> List[List[int]]:
+        """
+        Chooses the actions with the highest Q value on every emulator, with the
+        model of the member acting on it, in a single forward pass.
+
+        Args:
+            observations (Sequence[np.ndarray]): The uint8 stacks of frames of the emulators.
+
+        Returns:
+            List[List[int]]: The indices of the actions of every member, on its emulators.
+        """
+
+        # refreshing the stacked weights of the members that learned since
+        for member in self.members:
+            if self._loaded[member.index] != member.updates:
+                self.population_model.load(member.index)
+                self._loaded[member.index] = member.updates
+
+        channels = self._states_t.shape[2]
+        for member in self.members:
+            for i, env in enumerate(member.envs):
+                self._states_t[member.index, i].copy_(torch.from_numpy(observations[env][-channels:]))
+        return torch.argmax(self.population_model(self._states_t.div_(255)), dim=2).tolist()
+
+    def _exploit_and_explore(self, frame: int) -> None:
+        """
+        Replaces the bottom members by perturbed copies of the top ones. Members
+        without a finished episode in their window, such as the ones just replaced,
+        are left out of the ranking.
+        """
+
+        # saving every member first, the checkpoints are what the weights are copied from
+        for member in self.members:
+            member.save(frame)
+
+        # shuffling first, so that ties are broken at random
+        ranked = [member for member in self.members if member.recent_scores]
+        self.rng.shuffle(ranked)
+        ranked.sort(key=lambda member: member.score, reverse=True)
+        if len(ranked) < 2:
+            logger.info("Frame %d: less than 2 members finished an episode, the population is kept", frame)
+            return
+        cutoff = max(1, int(len(ranked) * self.truncation))
+        top, bottom = ranked[:cutoff], ranked[-cutoff:]
+
+        for member in bottom:
+            source = self.rng.choice(top)
+            score = member.score
+            member.exploit(source)
+            member.set_hyperparameters(perturb(member.hyperparameters, self.explored, self.factors, self.rng))
+            # saving the new member, so that it is resumed as it is now
+            member.save(frame)
+
+            logger.info("Frame %d: %s (score %.2f) copied %s (score %.2f), now %s", frame, member.name,
+                        score, source.name, source.score, member.hyperparameters)
+            self.history.append({'frame': frame, 'member': member.index, 'source': source.index,
+                                 'hyperparameters': dict(member.hyperparameters)})
+
+    def write_results(self, seconds: float) -> Dict[str, Any]:
+        """
+        Writes the hyperparameters and scores of every member, and the exploit and
+        explore steps, to pbt.json in the experiment folder.
+
+        Args:
+            seconds (float): The time spent training.
+
+        Returns:
+            Dict[str, Any]: The results.
+        """
+
+        members = [{
+            'member': member.index,
+            'hyperparameters': member.hyperparameters,
+            'score_mean': member.score if member.recent_scores else None,
+            'episodes': member.episodes,
+            'parent': member.parent
+        } for member in self.members]
+        best = max(self.members, key=lambda member: member.score)
+
+        results = {
+            'population': len(self.members),
+            'num_envs': self.num_envs,
+            'seconds': seconds,
+            'best': best.index,
+            'members': members,
+            'history': self.history
+        }
+
+        path = os.path.join(self.out_dir, "pbt.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=4)
+        logger.info("Best member: %s, with %s. Results written to %s", best.name, best.hyperparameters, path)
+        return results
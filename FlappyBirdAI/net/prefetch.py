@@ -0,0 +1,159 @@
+import queue
+import random
+import logging
+import threading
+from typing import Tuple, List, Optional
+
+import numpy as np
+
+import torch
+
+from net.replay import ReplayMemory
+
+logger = logging.getLogger()
+
+
+class _Slot:
+    """
+    Preallocated buffers holding one minibatch.
+    """
+
+    def __init__(self, replay: ReplayMemory, batch_size: int, pin_memory: bool):
+        # uint8 staging arrays the transitions are copied into
+        self.staging: Tuple[np.ndarray, ...] = (
+            np.zeros((batch_size,) + replay.frame_shape, dtype=np.uint8),
+            np.zeros(batch_size, dtype=np.uint8),
+            np.zeros(batch_size, dtype=np.float32),
+            np.zeros((batch_size,) + replay.frame_shape, dtype=np.uint8),
+            np.zeros(batch_size, dtype=np.bool_),
+            np.zeros(batch_size, dtype=np.uint8)
+        )
+
+        # tensors the minibatch is assembled into
+        def tensor(*shape, dtype=torch.float) -> torch.Tensor:
+            t = torch.zeros(*shape, dtype=dtype)
+            return t.pin_memory() if pin_memory else t
+
+        self.states = tensor(batch_size, *replay.frame_shape)
+        self.actions = tensor(batch_size, replay.num_actions)
+        self.rewards = tensor(batch_size)
+        self.next_states = tensor(batch_size, *replay.frame_shape)
+        self.terminals = tensor(batch_size, dtype=torch.bool)
+        self.horizons = tensor(batch_size, dtype=torch.uint8)
+
+    def fill(self, replay: ReplayMemory, rng: random.Random) -> None:
+        states, actions, rewards, next_states, terminals, horizons = replay.gather(len(self.rewards), out=self.staging,
+                                                                                  rng=rng)
+
+        self.states.copy_(torch.from_numpy(states)).div_(255)
+        self.next_states.copy_(torch.from_numpy(next_states)).div_(255)
+        self.actions.zero_()
+        self.actions.scatter_(1, torch.from_numpy(actions.astype(np.int64)).unsqueeze(1), 1)
+        self.rewards.copy_(torch.from_numpy(rewards))
+        self.terminals.copy_(torch.from_numpy(terminals))
+        self.horizons.copy_(torch.from_numpy(horizons))
+
+
+class MinibatchPrefetcher:
+    """
+    Samples minibatches from the replay memory in a background thread, so that
+    the next ones are ready by the time a gradient step needs them. The
+    minibatches are assembled into a fixed number of preallocated (optionally
+    pinned) buffers, which are reused once released.
+    """
+
+    def __init__(self, replay: ReplayMemory, batch_size: int, depth: int = 2,
+                 device: torch.device = torch.device("cpu"), pin_memory: bool = False, seed: Optional[int] = None):
+        """
+        Args:
+            replay (ReplayMemory): The replay memory. Can be appended to while sampling.
+            batch_size (int): The batch size.
+            depth (int): The number of minibatches prepared ahead.
+            device (torch.device): The device the minibatches are used on.
+            pin_memory (bool): Whether to pin the buffers, for faster copies to the gpu.
+            seed (Optional[int]): Seed for choosing the transitions. Drawn from the
+                global random number generator if None.
+        """
+
+        self.replay = replay
+        self.batch_size = batch_size
+        self.device = device
+
+        self._rng = random.Random(seed if seed is not None else random.getrandbits(64))
+        self._slots: List[_Slot] = [_Slot(replay, batch_size, pin_memory) for _ in range(depth + 1)]
+        self._free: "queue.Queue[Optional[_Slot]]" = queue.Queue()
+        self._ready: "queue.Queue[_Slot]" = queue.Queue()
+        for slot in self._slots:
+            self._free.put(slot)
+
+        # the slot handed out by the last call to get, if not released yet
+        self._current: Optional[_Slot] = None
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def get(self) -> Tuple[torch.Tensor, ...]:
+        """
+        Gets the next minibatch, waiting for it if it isn't ready. The previous
+        minibatch is released, and its tensors must no longer be used.
+
+        Returns:
+            Tuple[torch.Tensor, ...]: The states and next states as float tensors in [0, 1],
+            the one hot encoded actions, the rewards, the terminal flags and the horizons.
+        """
+
+        self.release()
+
+        slot = self._ready.get()
+        batch = (slot.states, slot.actions, slot.rewards, slot.next_states, slot.terminals, slot.horizons)
+
+        if self.device.type == "cpu":
+            # the buffers are used directly, until released
+            self._current = slot
+            return batch
+
+        # the copies to the device are made before the buffers are released
+        batch = tuple(tensor.to(self.device, non_blocking=True) for tensor in batch)
+        torch.cuda.current_stream(self.device).synchronize()
+        self._free.put(slot)
+        return batch
+
+    def release(self) -> None:
+        """
+        Releases the last minibatch, so that its buffers can be refilled.
+        """
+
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+
+    def close(self) -> None:
+        """
+        Stops the background thread.
+        """
+
+        self._stop.set()
+        self._free.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            slot = self._free.get()
+            if slot is None:
+                break
+
+            # waiting for the replay memory to hold enough transitions
+            while len(self.replay) < self.batch_size:
+                if self._stop.wait(0.01):
+                    return
+
+            try:
+                slot.fill(self.replay, self._rng)
+            except Exception:
+                logger.exception("Failed to prefetch a minibatch")
+                self._free.put(slot)
+                self._stop.wait(1)
+                continue
+
+            self._ready.put(slot)
@@ -0,0 +1,25 @@
+from typing import Callable
+
+import numpy as np
+
+from torchvision import transforms
+
+
+def build_preprocess(size: int = 84) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Constructs the transform used to pre process the frames of the emulator.
+
+    Args:
+        size (int): The width and height of the processed frame.
+
+    Returns:
+        Callable[[np.ndarray], np.ndarray]: The transform, which converts an RGB frame
+        to a grayscale uint8 frame of shape (size, size).
+    """
+
+    return transforms.Compose([
+        transforms.ToPILImage(),
+        transforms.Grayscale(),
+        transforms.Resize((size, size)),
+        np.array
+    ])
@@ -0,0 +1,108 @@
+import copy
+import logging
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger()
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    """
+    Creates a copy of the model with dynamically quantized int8 linear layers,
+    for inference on the cpu. The model itself is left untouched.
+
+    Args:
+        model (nn.Module): The fp32 model.
+
+    Returns:
+        nn.Module: The quantized copy.
+    """
+
+    model = copy.deepcopy(model).cpu().eval()
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def action_agreement(model: nn.Module, quantized: nn.Module, states: torch.Tensor) -> float:
+    """
+    Computes the fraction of states on which the quantized model chooses the
+    same greedy action as the fp32 model.
+
+    Args:
+        model (nn.Module): The fp32 model.
+        quantized (nn.Module): The quantized model.
+        states (torch.Tensor): The states to compare on.
+
+    Returns:
+        float: The fraction of agreeing actions.
+    """
+
+    with torch.no_grad():
+        actions = model(states).argmax(dim=1)
+        quantized_actions = quantized(states.cpu()).argmax(dim=1)
+
+    return (actions.cpu() == quantized_actions).float().mean().item()
+
+
+class QuantizedActor:
+    """
+    Quantized copy of the model used for acting, while the model itself is
+    trained in fp32. The copy is refreshed from the model's weights periodically.
+    """
+
+    def __init__(self, model: nn.Module, refresh_every: int, min_agreement: float = 0.95, start_step: int = 0):
+        """
+        Args:
+            model (nn.Module): The fp32 model being trained. Has to be on the cpu.
+            refresh_every (int): The number of steps after which the copy is refreshed.
+            min_agreement (float): A warning is logged if the fraction of greedy actions
+                agreeing with the fp32 model drops below this, when checked.
+            start_step (int): The step the copy is made at, such as the frame training
+                resumes from.
+        """
+
+        self.model = model
+        self.refresh_every = refresh_every
+        self.min_agreement = min_agreement
+        self.quantized: nn.Module = quantize(model)
+        # the step of the latest refresh
+        self._refreshed_at: int = start_step
+
+    def __call__(self, states: torch.Tensor) -> torch.Tensor:
+        """
+        Performs a forward pass through the quantized copy.
+
+        Args:
+            states (torch.Tensor): The states.
+
+        Returns:
+            torch.Tensor: The Q values.
+        """
+
+        with torch.no_grad():
+            return self.quantized(states)
+
+    def step(self, step: int, check_states: torch.Tensor = None) -> None:
+        """
+        Refreshes the quantized copy, if at least ``refresh_every`` steps passed since
+        the latest refresh. The steps don't have to be consecutive, so that it can
+        only be called on the steps the weights are updated on.
+
+        Args:
+            step (int): The current step.
+            check_states (torch.Tensor): States to check the agreement of the greedy actions
+                on, after refreshing. Not checked if None.
+        """
+
+        if step - self._refreshed_at < self.refresh_every:
+            return
+
+        self.quantized = quantize(self.model)
+        self._refreshed_at = step
+
+        if check_states is not None:
+            agreement = action_agreement(self.model, self.quantized, check_states)
+            logger.debug("Refreshed quantized actor, greedy action agreement: %.4f", agreement)
+            if agreement < self.min_agreement:
+                logger.warning("Greedy actions of the quantized actor agree with the model on only %.2f%% of "
+                               "the states", agreement * 100)
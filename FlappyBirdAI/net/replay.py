@@ -0,0 +1,272 @@
+import os
+import json
+import random
+import shutil
+import threading
+from typing import Dict, Tuple, Optional
+
+import numpy as np
+
+import torch
+
+
+class ReplayMemory:
+    """
+    Fixed size replay memory, backed by preallocated numpy arrays.
+
+    Frames are stored as uint8, which is lossless for the output of the
+    preprocessing transform (``ToTensor`` divides a uint8 image by 255),
+    and takes a quarter of the space of float tensors.
+
+    Appending and sampling are thread safe, so that minibatches can be
+    sampled in the background while transitions are being appended.
+
+    A transition can span several frames (see :class:`NStepBuilder`), its
+    reward then being the discounted return over them, and its horizon the
+    number of frames between the state and the next state.
+    """
+
+    # names of the arrays that make up the memory
+    FIELDS: Tuple[str, ...] = ("states", "actions", "rewards", "next_states", "terminals", "horizons")
+
+    def __init__(self, capacity: int, frame_shape: Tuple[int, ...] = (1, 84, 84), num_actions: int = 2):
+        self.capacity = capacity
+        self.frame_shape = tuple(frame_shape)
+        self.num_actions = num_actions
+
+        # allocating storage
+        self.states: np.ndarray = np.zeros((capacity,) + self.frame_shape, dtype=np.uint8)
+        self.actions: np.ndarray = np.zeros(capacity, dtype=np.uint8)
+        self.rewards: np.ndarray = np.zeros(capacity, dtype=np.float32)
+        self.next_states: np.ndarray = np.zeros((capacity,) + self.frame_shape, dtype=np.uint8)
+        self.terminals: np.ndarray = np.zeros(capacity, dtype=np.bool_)
+        self.horizons: np.ndarray = np.ones(capacity, dtype=np.uint8)
+
+        # index where the next transition will be written
+        self._cursor = 0
+        # number of transitions stored
+        self._size = 0
+
+        # guards the storage against being written while it is being sampled
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The bytes of the storage at capacity. The storage is zero filled, so
+        most platforms only commit its pages as transitions are written.
+        """
+
+        return sum(getattr(self, field).nbytes for field in ReplayMemory.FIELDS)
+
+    def append(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray, is_terminal: bool,
+               horizon: int = 1) -> None:
+        """
+        Adds a transition to the memory, overwriting the oldest one if the
+        memory is full.
+
+        Args:
+            state (np.ndarray): The uint8 frame the action was performed on.
+            action (int): The index of the action performed.
+            reward (float): The reward received, or the discounted return over the horizon.
+            next_state (np.ndarray): The uint8 frame after performing the action, or
+                ``horizon`` frames later.
+            is_terminal (bool): Whether the next state is terminal.
+            horizon (int): The number of frames between the state and the next state.
+        """
+
+        with self._lock:
+            i = self._cursor
+            self.states[i] = state
+            self.actions[i] = action
+            self.rewards[i] = reward
+            self.next_states[i] = next_state
+            self.terminals[i] = is_terminal
+            self.horizons[i] = horizon
+
+            self._cursor = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+               terminals: np.ndarray, horizons: Optional[np.ndarray] = None) -> None:
+        """
+        Adds a batch of transitions to the memory at once, overwriting the oldest
+        ones if the memory is full. Equivalent to appending them one by one.
+
+        Args:
+            states (np.ndarray): The uint8 frames the actions were performed on.
+            actions (np.ndarray): The indices of the actions performed.
+            rewards (np.ndarray): The rewards received.
+            next_states (np.ndarray): The uint8 frames after performing the actions.
+            terminals (np.ndarray): Whether the next states are terminal.
+            horizons (Optional[np.ndarray]): The number of frames between the states and
+                the next states. All 1 if None.
+        """
+
+        n = len(actions)
+        if horizons is None:
+            horizons = np.ones(n, dtype=np.uint8)
+        arrays = (states, actions, rewards, next_states, terminals, horizons)
+
+        # only the most recent transitions would survive
+        if n > self.capacity:
+            arrays = tuple(array[n - self.capacity:] for array in arrays)
+            n = self.capacity
+
+        with self._lock:
+            i = self._cursor
+            # the number of transitions written before wrapping around
+            head = min(n, self.capacity - i)
+            for field, array in zip(ReplayMemory.FIELDS, arrays):
+                storage = getattr(self, field)
+                storage[i:i + head] = array[:head]
+                storage[:n - head] = array[head:]
+
+            self._cursor = (i + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+
+    def sample(self, batch_size: int, device: torch.device = torch.device("cpu")) -> Tuple[torch.Tensor, ...]:
+        """
+        Samples a minibatch of transitions, without replacement.
+
+        Args:
+            batch_size (int): The number of transitions to sample.
+            device (torch.device): The device to move the minibatch to.
+
+        Returns:
+            Tuple[torch.Tensor, ...]: The states and next states as float tensors
+            in [0, 1], the one hot encoded actions, the rewards, the terminal flags
+            and the horizons.
+        """
+
+        states, actions, rewards, next_states, terminals, horizons = self.gather(batch_size)
+
+        states = torch.from_numpy(states).to(device).float().div_(255)
+        next_states = torch.from_numpy(next_states).to(device).float().div_(255)
+        actions_one_hot = torch.zeros(batch_size, self.num_actions, device=device)
+        actions_one_hot[torch.arange(batch_size), torch.from_numpy(actions.astype(np.int64)).to(device)] = 1
+        rewards = torch.from_numpy(rewards).to(device)
+        terminals = torch.from_numpy(terminals).to(device)
+        horizons = torch.from_numpy(horizons).to(device)
+
+        return states, actions_one_hot, rewards, next_states, terminals, horizons
+
+    def gather(self, batch_size: int, out: Optional[Tuple[np.ndarray, ...]] = None,
+               rng: random.Random = random) -> Tuple[np.ndarray, ...]:
+        """
+        Samples a minibatch of transitions, without replacement, as they are stored.
+        The indices are chosen and the transitions are copied while holding the lock,
+        so a concurrent append can't overwrite them halfway.
+
+        Args:
+            batch_size (int): The number of transitions to sample.
+            out (Optional[Tuple[np.ndarray, ...]]): Arrays to copy the transitions into, one per
+                field, in the order of ``FIELDS``. New arrays are allocated if None.
+            rng (random.Random): The random number generator choosing the transitions.
+
+        Returns:
+            Tuple[np.ndarray, ...]: The uint8 states, the action indices, the rewards,
+            the uint8 next states, the terminal flags and the horizons.
+        """
+
+        with self._lock:
+            indices = np.array(rng.sample(range(self._size), batch_size))
+
+            if out is None:
+                return tuple(getattr(self, field)[indices] for field in ReplayMemory.FIELDS)
+
+            for field, array in zip(ReplayMemory.FIELDS, out):
+                np.take(getattr(self, field), indices, axis=0, out=array)
+            return out
+
+    def save(self, path: str) -> None:
+        """
+        Saves the memory to a directory, as one ``.npy`` file per field, so
+        that it can be memory mapped when loading. The directory is written
+        to a temporary location first and then swapped in, so an interrupted
+        save never leaves a partially written memory behind.
+
+        Args:
+            path (str): The directory to save to.
+        """
+
+        with self._lock:
+            self._save(path)
+
+    def _save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        # saving only the filled part of the memory, keeping the storage
+        # order so that a restored memory samples exactly like this one
+        for field in ReplayMemory.FIELDS:
+            np.save(os.path.join(tmp_path, field + ".npy"), getattr(self, field)[:self._size])
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({"capacity": self.capacity, "size": self._size, "cursor": self._cursor}, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """
+        Loads a memory saved using :meth:`save`. The files are memory mapped
+        and copied into the preallocated storage, keeping the most recent
+        transitions if the saved memory is larger than the capacity.
+
+        Args:
+            path (str): The directory to load from.
+        """
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        arrays = ReplayMemory.load_fields(path, meta["size"])
+
+        # putting the saved transitions in chronological order
+        saved_size = meta["size"]
+        order = np.arange(saved_size)
+        if saved_size == meta["capacity"]:
+            order = (order + meta["cursor"]) % saved_size
+
+        if saved_size <= self.capacity and (saved_size < meta["capacity"] or meta["capacity"] == self.capacity):
+            # the saved layout fits as is
+            order = np.arange(saved_size)
+            self._cursor = meta["cursor"] % self.capacity
+        else:
+            # keeping only the most recent transitions
+            order = order[saved_size - min(saved_size, self.capacity):]
+            self._cursor = len(order) % self.capacity
+
+        with self._lock:
+            for field, array in arrays.items():
+                getattr(self, field)[:len(order)] = array[order]
+
+            self._size = len(order)
+
+    @staticmethod
+    def load_fields(path: str, size: int) -> Dict[str, np.ndarray]:
+        """
+        Memory maps the fields of a memory saved using :meth:`save`. Memories saved
+        before transitions could span several frames have no horizons, which are 1.
+
+        Args:
+            path (str): The directory the memory was saved to.
+            size (int): The number of saved transitions.
+
+        Returns:
+            Dict[str, np.ndarray]: The arrays, by field.
+        """
+
+        arrays = {}
+        for field in ReplayMemory.FIELDS:
+            file = os.path.join(path, field + ".npy")
+            if field == "horizons" and not os.path.exists(file):
+                arrays[field] = np.ones(size, dtype=np.uint8)
+            else:
+                arrays[field] = np.load(file, mmap_mode="r")
+        return arrays
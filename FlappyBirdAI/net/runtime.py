@@ -0,0 +1,104 @@
+import json
+from typing import Union, Dict, Any
+
+import numpy as np
+
+import torch
+
+
+class Policy:
+    """
+    Greedy policy backed by a model exported using :func:`net.export.export_model`.
+    Only depends on torch and numpy, so evaluation and demo processes don't
+    have to import the training stack.
+    """
+
+    def __init__(self, module: torch.nn.Module, meta: Dict[str, Any], device: torch.device):
+        self.module = module
+        self.meta = meta
+        self.device = device
+        self._dtype = torch.half if meta['precision'] == "fp16" and device.type == "cuda" else torch.float
+
+    @staticmethod
+    def load(path: str, device: Union[str, torch.device] = "cpu") -> 'Policy':
+        """
+        Loads an exported model.
+
+        Args:
+            path (str): The path to the artifact.
+            device (Union[str, torch.device]): The device to run the model on.
+
+        Returns:
+            Policy: The policy.
+        """
+
+        device = torch.device(device)
+        extra_files = {'meta.json': ''}
+        module = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+        meta = json.loads(extra_files['meta.json'])
+
+        # half precision convolutions are not supported on the cpu
+        if meta['precision'] == "fp16" and device.type != "cuda":
+            module = module.float()
+
+        module.eval()
+        return Policy(module, meta, device)
+
+    @staticmethod
+    def from_module(module: torch.nn.Module, device: Union[str, torch.device] = "cpu") -> 'Policy':
+        """
+        Wraps a model that has not been exported, such as the one being trained.
+
+        Args:
+            module (torch.nn.Module): The model.
+            device (Union[str, torch.device]): The device the model is on.
+
+        Returns:
+            Policy: The policy.
+        """
+
+        return Policy(module, {'precision': "fp32", 'input_shape': [getattr(module, "in_channels", 1), 84, 84]},
+                      torch.device(device))
+
+    @property
+    def in_channels(self) -> int:
+        """
+        The number of latest frames of a state the model takes. Artifacts exported
+        before the frames could be channels take a single frame.
+        """
+
+        return self.meta.get('input_shape', [1])[0]
+
+    def q_values(self, states: Union[np.ndarray, torch.Tensor]) -> torch.Tensor:
+        """
+        Computes the Q values of a batch of states.
+
+        Args:
+            states (Union[np.ndarray, torch.Tensor]): The preprocessed frames, of shape
+                (N, C, 84, 84), C being :attr:`in_channels`. uint8 frames are scaled to [0, 1].
+
+        Returns:
+            torch.Tensor: The Q values, of shape (N, 2).
+        """
+
+        states = torch.as_tensor(states, device=self.device)
+        if states.dtype == torch.uint8:
+            states = states.to(self._dtype).div_(255)
+        else:
+            states = states.to(self._dtype)
+
+        with torch.no_grad():
+            return self.module(states).float()
+
+    def act(self, states: Union[np.ndarray, torch.Tensor]) -> np.ndarray:
+        """
+        Chooses the action with the highest Q value for a batch of states.
+
+        Args:
+            states (Union[np.ndarray, torch.Tensor]): The preprocessed frames, of shape (N, C, 84, 84).
+
+        Returns:
+            np.ndarray: The indices of the chosen actions.
+        """
+
+        return self.q_values(states).argmax(dim=1).cpu().numpy()
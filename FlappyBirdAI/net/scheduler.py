@@ -0,0 +1,78 @@
+from typing import Optional
+
+
+class TrainingScheduler:
+    """
+    Decides, for every emulator frame, whether the network is updated and how
+    many gradient steps are taken, decoupling the speed of acting from the
+    speed of learning.
+    """
+
+    def __init__(self, observe_for: int, frames_per_update: int = 1, gradient_steps: int = 1,
+                 warm_start: bool = False, max_frames: Optional[int] = None):
+        """
+        Args:
+            observe_for (int): The number of frames to observe before training.
+            frames_per_update (int): The number of emulator frames between updates.
+            gradient_steps (int): The number of gradient steps per update.
+            warm_start (bool): Whether to fill the replay memory using random actions while
+                observing, without running the network or capping the frame rate.
+            max_frames (Optional[int]): The frame to stop training at. Runs forever if None.
+        """
+
+        if frames_per_update < 1:
+            raise ValueError("frames_per_update should be at least 1")
+        if gradient_steps < 1:
+            raise ValueError("gradient_steps should be at least 1")
+
+        self.observe_for = observe_for
+        self.frames_per_update = frames_per_update
+        self.gradient_steps = gradient_steps
+        self.warm_start = warm_start
+        self.max_frames = max_frames
+
+    def is_observing(self, frame: int) -> bool:
+        """
+        Checks whether the frame is part of the observation phase, in which the
+        network is not trained.
+        """
+
+        return frame <= self.observe_for
+
+    def is_warm_starting(self, frame: int) -> bool:
+        """
+        Checks whether the frame is part of the warm start, in which the replay
+        memory is filled as fast as possible.
+        """
+
+        return self.warm_start and self.is_observing(frame)
+
+    def steps_at(self, frame: int) -> int:
+        """
+        Gets the number of gradient steps to take at the frame.
+
+        Args:
+            frame (int): The frame.
+
+        Returns:
+            int: The number of gradient steps, 0 if the network should not be updated.
+        """
+
+        if self.is_observing(frame) or frame % self.frames_per_update != 0:
+            return 0
+        return self.gradient_steps
+
+    def is_done(self, frame: int) -> bool:
+        """
+        Checks whether training should stop at the frame.
+        """
+
+        return self.max_frames is not None and frame >= self.max_frames
+
+    @property
+    def replay_ratio(self) -> float:
+        """
+        The number of gradient steps taken per emulator frame, once training.
+        """
+
+        return self.gradient_steps / self.frames_per_update
@@ -0,0 +1,537 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+from collections import deque
+from typing import List, Tuple, Dict, Any, Callable, Optional, Union
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import torch.nn.functional as F
+import torch.backends.cudnn as cudnn
+
+from tensorboardX import SummaryWriter
+
+import numpy as np
+
+from game.emulator import Emulator
+from game.server import EmulatorClient, RemoteEmulator
+from game.stacking import StackedEmulator
+from profiling import Profiler
+from net.model import Model
+from net import distributed
+from net.dataset import load_dataset
+from net.memory import MemoryMonitor, check_replay_footprint
+from net.metrics import Metrics
+from net.nstep import NStepBuilder
+from net.prefetch import MinibatchPrefetcher
+from net.preprocessing import build_preprocess
+from net.quantization import QuantizedActor
+from net.replay import ReplayMemory
+from net.scheduler import TrainingScheduler
+from net.utils import CheckpointManager, get_rng_state, set_rng_state, seed_everything
+
+logger = logging.getLogger()
+
+class Solver:
+    # number of valid actions
+    NUM_ACTIONS: int = 2
+
+    def __init__(self, args: argparse.Namespace, checkpoint_mgr: CheckpointManager):
+        # initializing args
+        self.args = args
+
+        # setting checkpoint manager
+        self.checkpoint_mgr = checkpoint_mgr
+
+        # timing the stages of the training loop, if enabled
+        self.profiler = Profiler(enabled=args.profile, trace=args.profile_trace is not None)
+
+        # enabling builtin cudnn auto tuner
+        cudnn.benchmark = True
+
+        # choosing device
+        self.device = torch.device("cuda:0" if args.cuda else "cpu")
+        
+        # creating the model, taking the latest frames of a state as input channels
+        if not 1 <= args.in_channels <= 4:
+            raise ValueError("in_channels should be between 1 and 4, the number of stacked frames")
+        self.in_channels: int = args.in_channels
+        self.model: Model = Model(input_dim=(84, 84), in_channels=self.in_channels).to(self.device)
+
+        # optimizer
+        self.optimizer = optim.Adam(self.model.parameters(), lr=args.lr)
+
+        # seeding the random number generators, if a seed is given. Overridden
+        # by the states stored in the checkpoint, if resuming. Every data parallel
+        # learner gets a different seed, so that they play different games.
+        if args.seed is not None:
+            seed_everything(args.seed + distributed.get_rank())
+
+        # setting up replay memory size and replay memory, storing the frames the model takes
+        self.max_replay: int = args.max_replay
+        # failing now if the replay memory can't grow to its capacity, instead of
+        # once it has filled up. Every learner on the machine holds its own.
+        if not args.skip_memory_check:
+            check_replay_footprint(self.max_replay, (self.in_channels, 84, 84), Solver.NUM_ACTIONS,
+                                   processes=distributed.get_world_size())
+        self.D: ReplayMemory = ReplayMemory(self.max_replay, frame_shape=(self.in_channels, 84, 84),
+                                            num_actions=Solver.NUM_ACTIONS)
+
+        # building the n-step transitions stored in replay memory, as the frames arrive
+        self.nstep: NStepBuilder = NStepBuilder(args.n_step, args.gamma)
+
+        # restoring checkpoint, if any. The replay memory and the state of the
+        # game are only stored by rank 0, the other learners start them afresh.
+        self.start_frame, self.start_epsilon, self.resume_state = checkpoint_mgr.restore(
+            self.model, self.optimizer, replay=self.D if distributed.is_main_process() else None
+        )
+        if not distributed.is_main_process():
+            self.resume_state = None
+
+        # making sure every data parallel learner starts with the same weights
+        distributed.broadcast_parameters(self.model)
+
+        # checking if the values returned by restoring checkpoint are None
+        if self.start_frame is None:
+            self.start_frame = 0
+        if self.start_epsilon is None:
+            self.start_epsilon = args.initial_epsilon
+
+        # pre-filling the replay memory with a generated dataset, if given and
+        # the memory wasn't restored. The loaded transitions count towards the
+        # frames to observe before training.
+        observe_for: int = args.observe_for
+        if args.dataset is not None and len(self.D) == 0:
+            loaded = load_dataset(args.dataset, self.D)
+            observe_for = max(0, observe_for - loaded)
+            logger.info("Observing for %d frames instead of %d", observe_for, args.observe_for)
+
+        # observing again from the checkpoint if its replay memory wasn't
+        # restored, such as after migrating the model, so that there are
+        # transitions to sample
+        if self.start_frame > 0 and len(self.D) == 0:
+            observe_for += self.start_frame
+
+        # The frame stored in a checkpoint has already been played, so resuming
+        # the game continues from the next one. Only rank 0 restores the replay
+        # memory and the state of the game, the learners agree on the latest
+        # first frame and on observing until every replay memory has transitions,
+        # so that they take the same gradient steps and keep averaging them together.
+        first_frame = self.start_frame if self.resume_state is None else self.start_frame + 1
+        observe_for, self.first_frame = distributed.max_ints([observe_for, first_frame])
+
+        # setting up connection to emulator, 0 fps runs uncapped. A remote emulator
+        # is the one of the server matching the rank, and returns preprocessed frames.
+        self.fps: Optional[int] = args.fps if args.fps > 0 else None
+        self.emulator_client: Optional[EmulatorClient] = None
+        if args.emulator_address is not None:
+            self.emulator_client = EmulatorClient(args.emulator_address)
+            try:
+                self.emulator: Union[Emulator, RemoteEmulator] = RemoteEmulator(self.emulator_client,
+                                                                                distributed.get_rank(),
+                                                                                frame_shape=(84, 84))
+            except (IndexError, ValueError):
+                self.emulator_client.close()
+                raise
+        else:
+            self.emulator: Union[Emulator, RemoteEmulator] = Emulator(
+                fps=self.fps, profiler=self.profiler, headless=args.headless or not distributed.is_main_process()
+            )
+
+        # creating the quantized copy of the model used for acting, if enabled
+        self.actor: Optional[QuantizedActor] = None
+        if args.quantized_actor > 0:
+            if args.cuda:
+                raise ValueError("The quantized actor is only supported on the cpu")
+            self.actor = QuantizedActor(self.model, args.quantized_actor, min_agreement=args.quantized_agreement,
+                                        start_step=self.start_frame)
+
+        # loss function
+        self.loss_func = F.mse_loss
+
+        # constructing the transform, to pre process the image
+        self.preprocess: Callable[[np.ndarray], np.ndarray] = build_preprocess(84)
+
+        # stacking the last 4 preprocessed frames next to the emulator, in a ring buffer
+        self.env: StackedEmulator = StackedEmulator(self.emulator, self.preprocess if self.emulator_client is None
+                                                    else None, k=4, profiler=self.profiler)
+
+        # the float state the network is run on, written in place on every frame.
+        # A batch of one state, whatever the number of input channels.
+        self._state_t: torch.Tensor = torch.zeros(1, self.in_channels, 84, 84, device=self.device)
+
+        # creating summary writer to log values, only on rank 0
+        self.writer: Optional[SummaryWriter] = \
+            SummaryWriter(logdir=checkpoint_mgr.out_dir) if distributed.is_main_process() else None
+
+        # aggregating the values to log, flushed periodically in the background
+        self.metrics = Metrics(self.writer, interval=args.metrics_interval)
+
+        # scheduling the updates of the network
+        self.scheduler = TrainingScheduler(observe_for, frames_per_update=args.frames_per_update,
+                                           gradient_steps=args.gradient_steps, warm_start=args.warm_start,
+                                           max_frames=args.max_frames)
+
+        # logging the percentiles of the stage timings with the other values
+        if args.profile:
+            self.metrics.add_source(lambda: {"profile/" + k: v for k, v in self.profiler.percentiles().items()})
+
+        # logging the memory footprint with the other values, the surfaces of a
+        # remote emulator belong to the server
+        if args.memory_interval > 0:
+            self.metrics.add_source(MemoryMonitor(
+                self.D, self.model, self.optimizer, emulator=self.emulator if isinstance(self.emulator, Emulator)
+                else None, interval=args.memory_interval
+            ))
+
+        # statistics of the episodes played, written to the summary when training stops
+        self.num_frames: int = self.start_frame
+        self.episodes: int = 0
+        self.recent_scores: deque = deque(maxlen=100)
+        self.max_score: int = 0
+
+        # samples minibatches in the background, if enabled. Created on the first
+        # gradient step.
+        self.prefetcher: Optional[MinibatchPrefetcher] = None
+
+    def train_network(self, callback: Optional[Callable[[int], bool]] = None) -> None:
+        """
+        Trains the network until the scheduler stops it.
+
+        Args:
+            callback (Optional[Callable[[int], bool]]): Called with the frame number after
+                every frame. Training stops early if it returns True.
+        """
+
+        start = time.time()
+        self.metrics.start()
+        try:
+            self._train(callback)
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+            if self.emulator_client is not None:
+                self.emulator_client.close()
+            self.metrics.close()
+            if self.args.profile_trace is not None:
+                self.profiler.save_trace(self.args.profile_trace)
+            if distributed.is_main_process():
+                self.write_summary(time.time() - start)
+
+    def write_summary(self, seconds: float) -> None:
+        """
+        Writes the statistics of the run to summary.json in the experiment folder.
+
+        Args:
+            seconds (float): The time spent training.
+        """
+
+        summary = {
+            'frames': self.num_frames,
+            'episodes': self.episodes,
+            'score_mean_100': float(np.mean(self.recent_scores)) if self.recent_scores else 0.0,
+            'score_max': self.max_score,
+            'seconds': seconds
+        }
+
+        with open(os.path.join(self.checkpoint_mgr.out_dir, "summary.json"), "w") as f:
+            json.dump(summary, f, indent=4)
+
+    def _train(self, callback: Optional[Callable[[int], bool]] = None) -> None:
+        # initializing action index
+        action_index: int = 0
+
+        # initializing previous action index
+        prev_action_index: int = 0
+
+        observation: np.ndarray
+        if self.resume_state is not None:
+            # Resuming from the state stored in the checkpoint:
+            set_rng_state(self.resume_state['rng'])
+            self.emulator.set_state(self.resume_state['emulator'])
+            if 'stack' in self.resume_state:
+                observation = self.env.restore(self.resume_state['stack'])
+            else:
+                # checkpoints written before the frames were stacked next to the
+                # emulator store the state as a float tensor of shape (4, 1, 84, 84)
+                legacy_state_t: torch.Tensor = self.resume_state['state_t']
+                observation = self.env.restore(legacy_state_t.mul(255).round().byte().squeeze(1).numpy())
+            action_index = prev_action_index = self.resume_state['action_index']
+            self.nstep.set_state(self.resume_state.get('nstep', []))
+            logger.info("Resumed training from frame %d, with %d transitions in replay memory",
+                        self.start_frame, len(self.D))
+        else:
+            # Retrieving the first state by doing nothing. The state is the
+            # preprocessed frame stacked 4 times. Done to infer information
+            # such as velocity, etc.
+            observation = self.env.reset()
+
+        # the stack the next action is performed on, copied since the stack is
+        # overwritten by the next step
+        prev_observation: np.ndarray = observation.copy()
+
+        # the state to choose the next action on, converted from the uint8
+        # stack in place on every frame instead of being reallocated
+        state_t: torch.Tensor = self._state_t
+        self._load_state(observation)
+
+        # initializing epsilon, the probability of selecting a random 
+        # action
+        epsilon: float = self.start_epsilon
+
+        # initializing the count for frames
+        num_frames: int = self.first_frame
+
+        # initializing the length of the current episode
+        episode_frames: int = 0
+
+        logger.info("Observing game for %d frames%s...", self.scheduler.observe_for,
+                    " (warm start)" if self.scheduler.warm_start else "")
+        while not self.scheduler.is_done(num_frames):
+            # Populating replay memory:
+
+            # running at full speed with random actions during the warm start
+            warm_starting = self.scheduler.is_warm_starting(num_frames)
+            self.emulator.fps = None if warm_starting else self.fps
+
+            with self.profiler.stage("action_selection"):
+                # forward passing the network (or its quantized copy), getting
+                # rewards for each action. Not needed during the warm start.
+                output: Optional[torch.Tensor] = None
+                if not warm_starting:
+                    with torch.no_grad():
+                        output = self.model(state_t) if self.actor is None else self.actor(state_t)
+
+                # initializing actions array
+                actions_t = torch.zeros(Solver.NUM_ACTIONS).to(self.device)
+
+                # if an action can be performed in this frame
+                if num_frames % self.args.frames_per_action == 0:
+                    if warm_starting or torch.rand(1) <= epsilon:
+                        # choosing a random action
+                        action_index = torch.randint(Solver.NUM_ACTIONS, (1,)).item()
+
+                    else:
+                        # choosing action with the highest reward
+                        action_index = torch.argmax(output[-1]).item()
+
+                    actions_t[action_index] = 1
+                else:
+                    # previous action should be performed
+                    actions_t[prev_action_index] = 1
+
+            # running action in the emulator
+            reward_t: float
+            is_terminal: bool
+            with self.profiler.stage("emulator/step"):
+                # the frame is preprocessed and pushed onto the stack of the
+                # last 4 frames. If the episode ended, the stack of the next
+                # episode is returned instead.
+                state = self.env.step(actions_t.tolist())
+                frame_u8: np.ndarray = state.frame
+                reward_t, is_terminal, score = state.reward, state.is_terminal, state.score
+
+            # recording the values to log
+            with self.profiler.stage("logging"):
+                episode_frames += 1
+                self.metrics.set_step(num_frames)
+                self.metrics.record("reward", reward_t)
+                if output is not None:
+                    self.metrics.record("q_value", torch.max(output).item())
+                if is_terminal:
+                    self.metrics.record("score", score)
+                    self.metrics.record("episode_length", episode_frames)
+                    episode_frames = 0
+
+                    self.episodes += 1
+                    self.recent_scores.append(score)
+                    self.max_score = max(self.max_score, score)
+
+            # storing transition in replay memory
+            # storing the frames of state_t the model takes, and the same frames shifted by the new frame, which
+            # is the last frame of the episode if it ended. When an episode ends, the next transition starts from
+            # the first frame of the next episode. The transitions are stored once they span n frames, or the
+            # episode ended.
+            # The frames are stored as uint8, the oldest transition is dropped once the memory is full.
+            with self.profiler.stage("replay_append"):
+                for transition in self.nstep.push(
+                        prev_observation[-self.in_channels:], action_index, reward_t,
+                        np.concatenate((prev_observation[len(prev_observation) - self.in_channels + 1:],
+                                        frame_u8[np.newaxis])), is_terminal):
+                    self.D.append(*transition)
+
+            # training
+            if not self.scheduler.is_observing(num_frames):
+                # scaling epsilon down linearly
+                if epsilon > self.args.final_epsilon:
+                    epsilon -= (self.args.initial_epsilon - self.args.final_epsilon) / self.args.explore
+
+                # updating the network, if scheduled in this frame
+                state_ts: Optional[torch.Tensor] = None
+                for _ in range(self.scheduler.steps_at(num_frames)):
+                    state_ts, loss = self._learn()
+
+                    # recording the values to log
+                    with self.profiler.stage("logging"):
+                        self.metrics.record("loss", loss)
+
+                # refreshing the quantized actor with the new weights, if due
+                if self.actor is not None and state_ts is not None:
+                    with self.profiler.stage("quantize"):
+                        self.actor.step(num_frames, check_states=state_ts)
+
+                # checkpointing, only on rank 0
+                with self.profiler.stage("checkpoint"):
+                    if distributed.is_main_process():
+                        self.checkpoint_mgr.save(
+                            module=self.model, optimizer=self.optimizer, frame=num_frames, epsilon=epsilon,
+                            replay=self.D, state=self._training_state(state.observation, action_index)
+                            if self.checkpoint_mgr.is_due(num_frames) else None
+                        )
+
+                self.metrics.record("epsilon", epsilon)
+
+            # updating variables
+            num_frames += 1
+            self.num_frames = num_frames
+            self._load_state(state.observation)
+            np.copyto(prev_observation, state.observation)
+            prev_action_index = action_index
+
+            # stopping early, if requested
+            if callback is not None and callback(num_frames):
+                break
+
+        logger.info("Stopped training at frame %d", num_frames)
+
+    def _learn(self) -> Tuple[torch.Tensor, float]:
+        """
+        Performs a gradient step on a minibatch sampled from the replay memory.
+
+        Returns:
+            Tuple[torch.Tensor, float]: The states of the minibatch and the loss.
+        """
+
+        # sampling a minibatch from replay memory
+        state_ts: torch.Tensor
+        actions_ts: torch.Tensor
+        reward_ts: torch.Tensor
+        state_t1s: torch.Tensor
+        is_terminals: torch.Tensor
+        horizons: torch.Tensor
+        with self.profiler.stage("sample"):
+            if self.args.prefetch > 0:
+                # starting to prefetch minibatches in the background on the first step
+                if self.prefetcher is None:
+                    self.prefetcher = MinibatchPrefetcher(self.D, self.args.batch_size, depth=self.args.prefetch,
+                                                          device=self.device, pin_memory=self.args.cuda)
+                state_ts, actions_ts, reward_ts, state_t1s, is_terminals, horizons = self.prefetcher.get()
+            else:
+                state_ts, actions_ts, reward_ts, state_t1s, is_terminals, horizons = self.D.sample(
+                    self.args.batch_size, self.device
+                )
+
+        with self.profiler.stage("td_target"):
+            # performing a forward pass on the state_ts, getting the rewards
+            # for all actions
+            out_state_ts: torch.Tensor = self.model(state_ts)
+
+            # performing a forward pass on the state_t1s, getting the rewards
+            # for all actions
+            out_state_t1s: torch.Tensor = self.model(state_t1s)
+
+            # calculating the optimal rewards. If the state is a terminal state,
+            # the optimal reward is the terminal reward, else, the optimal reward
+            # is given by: reward_j + gamma ** horizon_j * max(Q(state_j1)), the reward
+            # being the discounted return over the horizon
+            y: torch.Tensor = td_targets(reward_ts, is_terminals, out_state_t1s, self.args.gamma, horizons)
+
+        with self.profiler.stage("optimize"):
+            # out_state_ts contains rewards for all the possible actions, hence a
+            # multidimensional array (in this case, shape: [batch_size, 2]). However,
+            # the optimal rewards, y, is calculated only for the chosen action,
+            # and thus, a linear array (in this case, shape: [batch_size]). To
+            # get the rewards for the actions that were performed, the out_state_ts
+            # is multiplied with actions_ts (since actions_ts contains only 1's and 0's,
+            # 1 when an action is performed and 0 when it is not, only the reward for the
+            # performed action will remain in the final product, the other element will
+            # be 0.) and summed row wise, producing the required 1D array.
+            reduced_out_state_ts: torch.Tensor = torch.sum(out_state_ts * actions_ts, dim=1)
+
+            # calculating loss
+            loss = self.loss_func(reduced_out_state_ts, y)
+
+            # computing gradients, clearing the ones of the previous step
+            self.optimizer.zero_grad()
+            loss.backward()
+
+            # averaging the gradients of the data parallel learners, if any.
+            # Each learner samples its own minibatch, so the effective batch
+            # size is the batch size times the number of learners.
+            distributed.average_gradients(self.model)
+
+            # stepping optimizer
+            self.optimizer.step()
+
+        return state_ts, loss.item()
+
+    def _load_state(self, observation: np.ndarray) -> torch.Tensor:
+        """
+        Converts the latest frames of a uint8 stack to the float state of shape (1, in_channels, 84, 84),
+        in [0, 1], writing into the preallocated state tensor.
+
+        Args:
+            observation (np.ndarray): The stack of frames, of shape (4, 84, 84).
+
+        Returns:
+            torch.Tensor: The state.
+        """
+
+        self._state_t.copy_(torch.from_numpy(observation[-self.in_channels:]).unsqueeze(0))
+        return self._state_t.div_(255)
+
+    def _training_state(self, observation: np.ndarray, action_index: int) -> Dict[str, Any]:
+        """
+        Constructs the state needed to resume training exactly from the next frame.
+
+        Args:
+            observation (np.ndarray): The stack of frames the next action will be chosen on.
+            action_index (int): The index of the last performed action.
+
+        Returns:
+            Dict[str, Any]: The state.
+        """
+
+        return {
+            'rng': get_rng_state(),
+            'emulator': self.emulator.get_state(),
+            'stack': observation.copy(),
+            'action_index': action_index,
+            'nstep': self.nstep.get_state()
+        }
+
+
+def td_targets(rewards: torch.Tensor, is_terminals: torch.Tensor, next_q_values: torch.Tensor,
+               gamma: float, horizons: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    Computes the optimal rewards of a minibatch: the reward for terminal states,
+    and reward + gamma ** horizon * max(Q(next state)) otherwise.
+
+    Args:
+        rewards (torch.Tensor): The rewards, or the discounted returns over the horizons, of shape (N,).
+        is_terminals (torch.Tensor): The terminal flags, of shape (N,).
+        next_q_values (torch.Tensor): The Q values of the next states, of shape (N, num_actions).
+        gamma (float): The discount factor.
+        horizons (Optional[torch.Tensor]): The number of frames between the states and the
+            next states, of shape (N,). All 1 if None.
+
+    Returns:
+        torch.Tensor: The optimal rewards, of shape (N,).
+    """
+
+    discounts = gamma if horizons is None else torch.pow(gamma, horizons.float())
+    return rewards + discounts * torch.max(next_q_values, dim=1)[0] * (~is_terminals).float()
@@ -0,0 +1,182 @@
+import os
+import sys
+import csv
+import json
+import queue
+import logging
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Sequence
+
+logger = logging.getLogger()
+
+
+def parse_grid(specs: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    Parses grid specifications of the form "lr=1e-4,1e-3".
+
+    Args:
+        specs (Sequence[str]): The specifications.
+
+    Returns:
+        Dict[str, List[str]]: The values of every argument, by argument name.
+    """
+
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if not values:
+            raise ValueError(f"Invalid grid specification '{spec}', expected <argument>=<value>[,<value>...]")
+        grid[name.lstrip("-")] = values.split(",")
+
+    return grid
+
+
+def expand_grid(grid: Dict[str, List[str]]) -> List[Dict[str, str]]:
+    """
+    Expands a grid into every combination of its values.
+
+    Args:
+        grid (Dict[str, List[str]]): The values of every argument, by argument name.
+
+    Returns:
+        List[Dict[str, str]]: The combinations.
+    """
+
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def partition_cores(slots: int, threads_per_run: int) -> List[List[int]]:
+    """
+    Splits the cpu cores available to this process into disjoint sets, one per
+    concurrent run.
+
+    Args:
+        slots (int): The number of concurrent runs.
+        threads_per_run (int): The number of cores per run.
+
+    Returns:
+        List[List[int]]: The cores of every slot.
+    """
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if slots * threads_per_run > len(cores):
+        raise ValueError(f"{slots} runs with {threads_per_run} threads each need {slots * threads_per_run} cores, "
+                         f"only {len(cores)} are available")
+
+    return [cores[i * threads_per_run:(i + 1) * threads_per_run] for i in range(slots)]
+
+
+def run_sweep(grid: Dict[str, List[str]], train_args: List[str], out_dir: str, exp_name: str,
+              workers: int, threads_per_run: int) -> List[Dict[str, Any]]:
+    """
+    Runs the train command for every combination of the grid, ``workers`` at a
+    time. Each run is pinned to its own set of cores, uses as many torch threads
+    as it has cores, and writes to its own experiment folder inside the sweep's,
+    along with its console output, in output.log.
+
+    Args:
+        grid (Dict[str, List[str]]): The values of the train arguments, by argument name.
+        train_args (List[str]): Arguments passed to every run.
+        out_dir (str): The folder the sweep's folder is created in.
+        exp_name (str): The name of the sweep.
+        workers (int): The number of concurrent runs.
+        threads_per_run (int): The number of cores and torch threads per run.
+
+    Returns:
+        List[Dict[str, Any]]: The arguments and summary of every run.
+    """
+
+    combinations = expand_grid(grid)
+    main_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+    # the free sets of cores
+    slots: "queue.Queue[List[int]]" = queue.Queue()
+    for cores in partition_cores(min(workers, len(combinations)), threads_per_run):
+        slots.put(cores)
+
+    def run(values: Dict[str, str]) -> Dict[str, Any]:
+        run_name = "_".join(f"{name}={value}" for name, value in values.items())
+        command = [sys.executable, main_path, "train", "--out-dir", out_dir,
+                   "--exp-name", os.path.join(exp_name, run_name), "--num-threads", str(threads_per_run)]
+        for name, value in values.items():
+            command += ["--" + name, value]
+        command += train_args
+
+        env = dict(os.environ, OMP_NUM_THREADS=str(threads_per_run), MKL_NUM_THREADS=str(threads_per_run))
+
+        # the output of the run, which holds the traceback of a run failing
+        # before its logger is set up
+        run_dir = os.path.join(out_dir, exp_name, run_name)
+        os.makedirs(run_dir, exist_ok=True)
+
+        cores = slots.get()
+        try:
+            logger.info("Starting run %s on cores %s", run_name, cores)
+            with open(os.path.join(run_dir, "output.log"), "ab") as output:
+                process = subprocess.Popen(command, env=env, stdout=output, stderr=subprocess.STDOUT)
+                # pinning the run once started, since a preexec_fn isn't safe in threads.
+                # Python starts long after, so the threads of the run inherit the cores.
+                if hasattr(os, "sched_setaffinity"):
+                    try:
+                        os.sched_setaffinity(process.pid, cores)
+                    except ProcessLookupError:
+                        pass
+                returncode = process.wait()
+        finally:
+            slots.put(cores)
+
+        logger.info("Run %s finished with exit code %d", run_name, returncode)
+
+        # reading the summary written by the run
+        result: Dict[str, Any] = {'run': run_name, **values, 'returncode': returncode}
+        summary_path = os.path.join(run_dir, "summary.json")
+        if os.path.exists(summary_path):
+            with open(summary_path) as f:
+                result.update(json.load(f))
+
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, combinations))
+
+    write_results(results, os.path.join(out_dir, exp_name))
+    return results
+
+
+def write_results(results: List[Dict[str, Any]], sweep_dir: str) -> None:
+    """
+    Writes the results of the runs to results.csv and results.json in the
+    sweep's folder, and logs them as a table.
+
+    Args:
+        results (List[Dict[str, Any]]): The results of every run.
+        sweep_dir (str): The sweep's folder.
+    """
+
+    # collecting the columns, keeping their order of appearance
+    columns: List[str] = []
+    for result in results:
+        columns += [column for column in result if column not in columns]
+
+    with open(os.path.join(sweep_dir, "results.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+
+    with open(os.path.join(sweep_dir, "results.json"), "w") as f:
+        json.dump(results, f, indent=4)
+
+    # formatting the table
+    rows = [[_format(result.get(column, "")) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    lines = ["  ".join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines += ["  ".join(value.ljust(width) for value, width in zip(row, widths)) for row in rows]
+
+    logger.info("Sweep results:\n%s", "\n".join(lines))
+
+
+def _format(value: Any) -> str:
+    return f"{value:.4f}" if isinstance(value, float) else str(value)
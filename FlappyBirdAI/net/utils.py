@@ -1,29 +1,54 @@
 import os
 import glob
+import pickle
+import random
+import logging
 from pathlib import Path
-from typing import Union, Tuple, List
+from typing import Union, Tuple, List, Dict, Any, Optional
+
+import numpy as np
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
 
+from net.replay import ReplayMemory
+
+logger = logging.getLogger()
+
 class CheckpointManager:
-    def __init__(self, name: str, out_dir: str, exp_name: str, frequency: int = 1, retain: int=5):
+    def __init__(self, name: str, out_dir: str, exp_name: str, frequency: int = 1, retain: int=5,
+                 save_replay: bool = False):
         self._name = name
         self._retain = retain
         self._out_home = os.path.join(out_dir, exp_name)
         self._checkpoints_dir = os.path.join(self._out_home, "checkpoints")
         self._is_resume = os.path.exists(self._checkpoints_dir)
         self._frequency = frequency
+        self._save_replay = save_replay
+        self._replay_dir = os.path.join(self._checkpoints_dir, "replay")
 
         # creating directory if it doesnt exist
         Path(self._checkpoints_dir).mkdir(parents=True, exist_ok=True)
 
+    def save(self, module: nn.Module, optimizer: optim.Optimizer, frame: int, epsilon: float,
+             replay: ReplayMemory = None, state: Dict[str, Any] = None) -> None:
+        """
+        Saves a checkpoint, if the frame is a multiple of the frequency.
+
+        Args:
+            module (nn.Module): The model.
+            optimizer (optim.Optimizer): The optimizer.
+            frame (int): The current frame.
+            epsilon (float): The current value of epsilon.
+            replay (ReplayMemory): The replay memory. Saved only if the manager was
+                created with ``save_replay``. Only the latest replay memory is kept on disk.
+            state (Dict[str, Any]): Any additional state needed to resume training,
+                such as RNG states.
+        """
 
-        
-    def save(self, module: nn.Module, optimizer: optim.Optimizer, frame: int, epsilon: float) -> None:
         # checking whether to checkpoint or not, based on frequency
-        if frame % self._frequency != 0:
+        if not self.is_due(frame):
             return
 
         # removing old checkpoints, if present
@@ -38,33 +63,96 @@ class CheckpointManager:
             'state_dict': module.state_dict(),
             'frame': frame,
             'optimizer': optimizer.state_dict(),
-            'epsilon': epsilon
+            'epsilon': epsilon,
+            'state': _encode_state(state),
+            'replay': False,
+            'in_channels': getattr(module, "in_channels", 1)
         }
 
+        # saving the replay memory before the checkpoint, so that a checkpoint
+        # claiming to have a replay memory always has a complete one
+        if self._save_replay and replay is not None:
+            replay.save(self._replay_dir)
+            data['replay'] = True
+
         # saving the data
         torch.save(data, self._create_path(frame))
 
-    def restore(self, module: nn.Module, optimizer: optim.Optimizer) -> Union[Tuple[None, None], Tuple[int, float]]:
+    def restore(self, module: nn.Module, optimizer: optim.Optimizer, replay: ReplayMemory = None) \
+            -> Union[Tuple[None, None, None], Tuple[int, float, Optional[Dict[str, Any]]]]:
+        """
+        Restores the latest checkpoint, if any.
+
+        Args:
+            module (nn.Module): The model to load the weights into.
+            optimizer (optim.Optimizer): The optimizer to load the state into.
+            replay (ReplayMemory): The replay memory to load into, if the latest
+                checkpoint was saved along with one.
+
+        Returns:
+            Union[Tuple[None, None, None], Tuple[int, float, Optional[Dict[str, Any]]]]: The frame,
+            epsilon and the additional state of the checkpoint, or Nones if there is no checkpoint.
+        """
+
         # getting files in the checkpoints folder
         files = self._get_files_in_dir()
 
         # if there are no files, return False
         if not files:
-            return None, None
+            return None, None, None
 
         # getting the latest checkpoint file
         checkpoint_file = files[0]
 
         # loading the data
-        data = torch.load(checkpoint_file)
+        data = load_checkpoint(checkpoint_file)
+
+        # migrating the weights, if the module has changed since
+        state_dict = data['state_dict']
+        if hasattr(module, "migrate_state_dict"):
+            state_dict = module.migrate_state_dict(state_dict)
+        migrated = state_dict is not data['state_dict']
+
+        # loading data to module and optimizer. The state of the optimizer
+        # doesn't match migrated weights, it starts afresh.
+        module.load_state_dict(state_dict)
+        if migrated:
+            logger.info("Migrated the weights of %s, the optimizer and the replay memory start afresh",
+                        checkpoint_file)
+        else:
+            optimizer.load_state_dict(data['optimizer'])
+
+        # loading the replay memory. Only the latest one is kept, so it
+        # belongs to the latest checkpoint. A migrated model stores other states.
+        if replay is not None and data.get('replay') and os.path.exists(self._replay_dir) and not migrated:
+            replay.load(self._replay_dir)
 
-        # loading data to module and optimizer
-        module.load_state_dict(data['state_dict'])
-        optimizer.load_state_dict(data['optimizer'])
+        # returning frame, epsilon and the additional state
+        return data['frame'], data['epsilon'], _decode_state(data.get('state'))
 
-        # returning frame and epsilon
-        return data['frame'], data['epsilon']
-        
+    def latest(self) -> Optional[str]:
+        """
+        Gets the path to the latest checkpoint.
+
+        Returns:
+            Optional[str]: The path, or None if there are no checkpoints.
+        """
+
+        files = self._get_files_in_dir()
+        return files[0] if files else None
+
+    def is_due(self, frame: int) -> bool:
+        """
+        Checks whether a checkpoint will be saved at the given frame.
+
+        Args:
+            frame (int): The frame.
+
+        Returns:
+            bool: True if a checkpoint will be saved.
+        """
+
+        return frame % self._frequency == 0
 
     def _get_files_in_dir(self) -> List[str]:
         # getting the files in the checkpoint folder
@@ -88,3 +176,110 @@ class CheckpointManager:
     @property
     def checkpoints_dir(self):
         return self._checkpoints_dir
+
+
+def load_checkpoint(path: str, map_location: Union[str, torch.device, None] = None) -> Dict[str, Any]:
+    """
+    Loads a checkpoint written by :class:`CheckpointManager`. Checkpoints only hold
+    tensors and python primitives, so they load with the restricted unpickler
+    ``torch.load`` defaults to. Checkpoints written before the arrays of the state
+    were encoded as tensors hold numpy objects, and are loaded unrestricted.
+
+    Args:
+        path (str): The path of the checkpoint.
+        map_location (Union[str, torch.device, None]): Where to load the tensors.
+
+    Returns:
+        Dict[str, Any]: The data of the checkpoint.
+    """
+
+    try:
+        return torch.load(path, map_location=map_location)
+    except pickle.UnpicklingError:
+        logger.warning("%s holds numpy objects, loading it unrestricted", path)
+        return torch.load(path, map_location=map_location, weights_only=False)
+
+
+# the key of the dicts numpy arrays are encoded as in the saved state
+_NDARRAY_KEY: str = "__ndarray__"
+
+
+def _encode_state(state: Any) -> Any:
+    """
+    Encodes the numpy arrays and scalars of the state to resume training (the
+    numpy RNG state, the frame stack, etc.) as tensors and python numbers, so
+    that the checkpoint loads with the restricted unpickler.
+    """
+
+    if isinstance(state, np.ndarray):
+        # the unsigned types torch lacks are widened, the dtype restores them
+        array = state.astype(np.int64) if state.dtype in (np.uint16, np.uint32, np.uint64) else state
+        return {_NDARRAY_KEY: torch.from_numpy(np.array(array)), 'dtype': str(state.dtype)}
+    if isinstance(state, np.generic):
+        return state.item()
+    if isinstance(state, dict):
+        return {key: _encode_state(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(_encode_state(value) for value in state)
+    return state
+
+
+def _decode_state(state: Any) -> Any:
+    """
+    Decodes the arrays encoded by :func:`_encode_state`.
+    """
+
+    if isinstance(state, dict):
+        if _NDARRAY_KEY in state:
+            return state[_NDARRAY_KEY].cpu().numpy().astype(state['dtype'])
+        return {key: _decode_state(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(_decode_state(value) for value in state)
+    return state
+
+
+def get_rng_state() -> Dict[str, Any]:
+    """
+    Gets the states of the python, numpy and torch random number generators.
+
+    Returns:
+        Dict[str, Any]: The states.
+    """
+
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+
+    return state
+
+
+def set_rng_state(state: Dict[str, Any]) -> None:
+    """
+    Sets the states of the python, numpy and torch random number generators.
+
+    Args:
+        state (Dict[str, Any]): The states, as returned by :func:`get_rng_state`.
+    """
+
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def seed_everything(seed: int) -> None:
+    """
+    Seeds the python, numpy and torch random number generators.
+
+    Args:
+        seed (int): The seed.
+    """
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
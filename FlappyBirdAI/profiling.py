@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Deque, Optional, Any
+
+import numpy as np
+
+
+class _NullStage:
+    """
+    Stage returned by a disabled profiler, which does nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+class _Stage:
+    """
+    Times a single stage. Reused every time the stage is entered, so that
+    timing doesn't allocate.
+    """
+
+    __slots__ = ("name", "durations", "profiler", "start")
+
+    def __init__(self, name: str, profiler: 'Profiler', window: int):
+        self.name = name
+        self.profiler = profiler
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args) -> None:
+        end = time.perf_counter()
+        # the durations are read by the thread flushing the metrics
+        with self.profiler._lock:
+            self.durations.append(end - self.start)
+        if self.profiler.trace is not None:
+            self.profiler.add_trace_event(self.name, self.start, end)
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    """
+    Low overhead timers for the stages of the training loop. Keeps the
+    durations of the latest calls of every stage, to compute rolling
+    percentiles, and optionally records a Chrome trace
+    (viewable in chrome://tracing).
+    """
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, enabled: bool = False, window: int = 1000, trace: bool = False,
+                 max_trace_events: int = 1000000):
+        """
+        Args:
+            enabled (bool): Whether to time the stages. A disabled profiler only
+                costs a method call per stage.
+            window (int): The number of latest durations of a stage the percentiles
+                are computed over.
+            trace (bool): Whether to record a Chrome trace.
+            max_trace_events (int): The maximum number of events recorded in the trace.
+        """
+
+        self.enabled = enabled
+        self.window = window
+        self.trace: Optional[List[Dict[str, Any]]] = [] if enabled and trace else None
+        self.max_trace_events = max_trace_events
+
+        # guards the stages and their durations, which are read from another thread
+        self._lock = threading.Lock()
+        self._stages: Dict[str, _Stage] = {}
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def stage(self, name: str):
+        """
+        Gets the context manager timing a stage.
+
+        Args:
+            name (str): The name of the stage.
+        """
+
+        if not self.enabled:
+            return _NULL_STAGE
+
+        stage = self._stages.get(name)
+        if stage is None:
+            with self._lock:
+                stage = self._stages[name] = _Stage(name, self, self.window)
+        return stage
+
+    def add_trace_event(self, name: str, start: float, end: float) -> None:
+        """
+        Adds a complete event to the trace.
+
+        Args:
+            name (str): The name of the event.
+            start (float): The start time, from ``time.perf_counter``.
+            end (float): The end time, from ``time.perf_counter``.
+        """
+
+        if len(self.trace) >= self.max_trace_events:
+            return
+
+        self.trace.append({
+            'name': name,
+            'ph': "X",
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self._pid,
+            'tid': threading.get_ident()
+        })
+
+    def percentiles(self) -> Dict[str, float]:
+        """
+        Computes the rolling percentiles of the durations of every stage.
+
+        Returns:
+            Dict[str, float]: The percentiles in milliseconds, by "<stage>/p<percentile>".
+        """
+
+        # copying the durations first, as the stages might be timed while this runs
+        with self._lock:
+            snapshot = [(name, list(stage.durations)) for name, stage in self._stages.items()]
+
+        results = {}
+        for name, durations in snapshot:
+            if len(durations) == 0:
+                continue
+            for percentile, value in zip(Profiler.PERCENTILES, np.percentile(durations, Profiler.PERCENTILES)):
+                results[f"{name}/p{percentile}"] = value * 1000
+
+        return results
+
+    def save_trace(self, path: str) -> None:
+        """
+        Writes the recorded trace as a Chrome trace JSON file.
+
+        Args:
+            path (str): The path to write to.
+        """
+
+        if self.trace is None:
+            return
+
+        with open(path, "w") as f:
+            json.dump({'traceEvents': self.trace, 'displayTimeUnit': "ms"}, f)
@@ -0,0 +1,75 @@
+import random
+import inspect
+
+import numpy as np
+
+import torch
+import torch.optim as optim
+
+from net.model import Model
+from net.nstep import NStepBuilder
+from net.utils import CheckpointManager, get_rng_state, set_rng_state
+
+
+def _training_state():
+    nstep = NStepBuilder(3, 0.99)
+    frame = np.full((1, 84, 84), 7, dtype=np.uint8)
+    nstep.push(frame, 1, 0.1, frame, False)
+    nstep.push(frame, 0, 1.0, frame, False)
+
+    return {
+        'rng': get_rng_state(),
+        'emulator': {'score': 3, 'entities': [{'tag': "player", 'pos': (10.0, 20.0), 'vel': (0.0, 1.5),
+                                               'remove': False}]},
+        'stack': np.arange(4 * 84 * 84, dtype=np.int64).reshape(4, 84, 84).astype(np.uint8),
+        'action_index': 1,
+        'nstep': nstep.get_state()
+    }
+
+
+def test_save_restore(tmp_path):
+    model = Model(input_dim=(84, 84))
+    optimizer = optim.Adam(model.parameters(), lr=1e-4)
+    model(torch.rand(2, 1, 84, 84)).sum().backward()
+    optimizer.step()
+
+    state = _training_state()
+    checkpoint_mgr = CheckpointManager('model', str(tmp_path), "exp", frequency=10)
+    checkpoint_mgr.save(model, optimizer, 10, 0.5, state=state)
+
+    # the checkpoint holds no numpy objects, it loads with the restricted unpickler
+    # of the torch versions having one
+    if "weights_only" in inspect.signature(torch.load).parameters:
+        torch.load(checkpoint_mgr.latest(), weights_only=True)
+
+    restored_model = Model(input_dim=(84, 84))
+    restored_optimizer = optim.Adam(restored_model.parameters(), lr=1e-4)
+    frame, epsilon, restored = checkpoint_mgr.restore(restored_model, restored_optimizer)
+
+    assert (frame, epsilon) == (10, 0.5)
+    for name, weight in model.state_dict().items():
+        assert torch.equal(weight, restored_model.state_dict()[name])
+
+    assert restored['stack'].dtype == np.uint8
+    np.testing.assert_array_equal(restored['stack'], state['stack'])
+    assert restored['emulator'] == state['emulator']
+    assert restored['action_index'] == 1
+
+    nstep = NStepBuilder(3, 0.99)
+    nstep.set_state(restored['nstep'])
+    for pending, expected in zip(nstep.get_state(), state['nstep']):
+        np.testing.assert_array_equal(pending[0], expected[0])
+        assert pending[1:] == expected[1:]
+
+
+def test_restored_rng_state_replays(tmp_path):
+    model = Model(input_dim=(84, 84))
+    optimizer = optim.Adam(model.parameters())
+    checkpoint_mgr = CheckpointManager('model', str(tmp_path), "exp")
+
+    checkpoint_mgr.save(model, optimizer, 1, 1.0, state={'rng': get_rng_state()})
+    expected = (random.random(), np.random.rand(), torch.rand(1).item())
+
+    _, _, restored = checkpoint_mgr.restore(model, optimizer)
+    set_rng_state(restored['rng'])
+    assert (random.random(), np.random.rand(), torch.rand(1).item()) == expected
@@ -0,0 +1,35 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from net.dataset import INDEX_FILE, _generate_shard, load_dataset
+from net.replay import ReplayMemory
+
+from conftest import RES_FOLDER
+
+
+def _write_dataset(path, size, in_channels):
+    # generating the shard in this process, instead of in a worker
+    _generate_shard(os.path.join(path, "shard_00000"), size, "random", 4, 0.0, 0, RES_FOLDER, in_channels)
+    with open(os.path.join(path, INDEX_FILE), "w") as f:
+        json.dump({'frame_shape': [in_channels, 84, 84], 'policy': "random",
+                   'shards': [{'path': "shard_00000", 'size': size}]}, f)
+
+
+def test_dataset_of_stacked_frames(tmp_path):
+    _write_dataset(tmp_path, 50, in_channels=3)
+
+    replay = ReplayMemory(100, frame_shape=(3, 84, 84))
+    assert load_dataset(str(tmp_path), replay) == 50
+
+    # the next state shifts the new frame into the state, like in training
+    fields = ReplayMemory.load_fields(os.path.join(tmp_path, "shard_00000"), 50)
+    states, next_states = fields['states'], fields['next_states']
+    assert np.array_equal(next_states[:, :-1], states[:, 1:])
+    for i in np.flatnonzero(~fields['terminals'][:-1].astype(bool)):
+        assert np.array_equal(next_states[i], states[i + 1])
+
+    with pytest.raises(ValueError, match="--in-channels 1"):
+        load_dataset(str(tmp_path), ReplayMemory(100, frame_shape=(1, 84, 84)))
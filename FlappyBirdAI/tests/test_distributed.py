@@ -0,0 +1,43 @@
+import os
+import socket
+import subprocess
+import sys
+
+from conftest import RES_FOLDER
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _train(out_dir, max_frames):
+    # run from the root of the repository, where the resources are
+    return subprocess.run(
+        [sys.executable, MAIN, "train", "--world-size", "2", "--dist-port", str(_free_port()),
+         "--checkpoint-replay", "--observe-for", "20", "--checkpoint-freq", "30", "--batch-size", "8",
+         "--max-replay", "1000", "--max-frames", str(max_frames), "--fps", "0", "--headless",
+         "--exp-name", "resume", "--out-dir", str(out_dir)],
+        cwd=os.path.dirname(os.path.dirname(RES_FOLDER)), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        timeout=300
+    )
+
+
+def _observing(log):
+    with open(log) as f:
+        return [line.split("] ", 1)[1] for line in f if "Observing game" in line]
+
+
+def test_resume_data_parallel_with_replay(tmp_path):
+    assert _train(tmp_path, 40).returncode == 0
+
+    # only rank 0 restores the replay memory, the learners still take the same
+    # gradient steps
+    resumed = _train(tmp_path, 80)
+    assert resumed.returncode == 0, resumed.stderr.decode()[-2000:]
+
+    logs = [os.path.join(tmp_path, "resume", name) for name in ("log", "log.rank1")]
+    assert _observing(logs[0]) == _observing(logs[1])
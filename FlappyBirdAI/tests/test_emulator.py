@@ -0,0 +1,18 @@
+from game.core.managers import EntityManager
+from game.emulator import Emulator
+
+from conftest import RES_FOLDER
+
+
+def _entities():
+    return sorted(entity.tag or "" for entity in EntityManager.entities)
+
+
+def test_emulators_in_one_process():
+    Emulator(res_folder=RES_FOLDER, headless=True, fps=None)
+    entities = _entities()
+
+    # the managers are global, a new emulator starts from a new game
+    Emulator(res_folder=RES_FOLDER, headless=True, fps=None)
+    assert _entities() == entities
+    assert entities.count("player") == 1
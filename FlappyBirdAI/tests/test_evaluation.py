@@ -0,0 +1,93 @@
+import numpy as np
+
+import net.evaluation
+from game.emulator import GameState
+from net.evaluation import evaluate
+
+
+class ScriptedPool:
+    """
+    A pool whose emulators play episodes of set lengths, with frames filled
+    with the id of the episode they belong to. Like the emulators, an episode
+    ending returns its last frame and the next one starts on its own.
+    """
+
+    def __init__(self, num_envs, lengths, **kwargs):
+        self.lengths = lengths
+        self.episodes = []
+        self.finished = set()
+        self.steps = [0] * num_envs
+        self.current = [self._new_episode(index) for index in range(num_envs)]
+
+    def _new_episode(self, index):
+        self.episodes.append(index)
+        return len(self.episodes)
+
+    def step(self, actions, indices=None, render=None):
+        indices = range(len(self.current)) if indices is None else indices
+        render = [None] * len(indices) if render is None else render
+
+        results = []
+        for index, flag in zip(indices, render):
+            episode = self.current[index]
+            self.steps[index] += 1
+            frame = np.full((84, 84), episode, dtype=np.uint8)
+
+            is_terminal = self.steps[index] >= self.lengths[index]
+            if is_terminal:
+                self.reset([index])
+            # rendering every frame unless told otherwise, like a render interval of 1
+            results.append(GameState(None if flag is False and not is_terminal else frame, 0.0, is_terminal,
+                                     self.steps[index] // 4))
+        return results
+
+    def reset(self, indices=None):
+        for index in indices:
+            self.finished.add(self.current[index])
+            self.current[index] = self._new_episode(index)
+            self.steps[index] = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class CheckingPolicy:
+    """
+    Checks that every state it acts on only holds frames of an episode being played.
+    """
+
+    in_channels = 4
+
+    def __init__(self, pools):
+        self.pools = pools
+        self.decisions = 0
+
+    def act(self, states):
+        for state in states:
+            assert len(np.unique(state)) == 1
+            assert int(state[0, 0, 0]) not in self.pools[0].finished
+        self.decisions += len(states)
+        return np.zeros(len(states), dtype=np.int64)
+
+
+def test_evaluate_starts_episodes_from_their_first_frame(monkeypatch):
+    # the episodes of the first two emulators end at different steps, the ones
+    # of the last are capped by max_steps
+    lengths = [6, 11, 40]
+    pools = []
+
+    def make_pool(num_envs, **kwargs):
+        pools.append(ScriptedPool(num_envs, lengths))
+        return pools[-1]
+
+    monkeypatch.setattr(net.evaluation, "EmulatorPool", make_pool)
+    policy = CheckingPolicy(pools)
+    results = evaluate(policy, episodes=10, num_envs=3, frames_per_action=2, max_steps=15)
+
+    assert results['episodes'] == 10
+    # the first frame of an episode is retrieved by a no-op step, before it is played
+    assert sorted(set(results['lengths'])) == [5, 10, 15]
+    assert policy.decisions > 0
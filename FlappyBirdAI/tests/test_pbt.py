@@ -0,0 +1,23 @@
+import torch
+
+from net.model import Model
+from net.pbt import PopulationModel
+
+
+def test_population_model_matches_models():
+    torch.manual_seed(0)
+    models = [Model(input_dim=(84, 84), in_channels=4) for _ in range(3)]
+    population_model = PopulationModel(models)
+    states = torch.rand(3, 2, 4, 84, 84)
+
+    with torch.no_grad():
+        expected = torch.stack([model(states[p]) for p, model in enumerate(models)])
+    assert torch.allclose(population_model(states), expected, atol=1e-5)
+
+    # the stacked weights of a model are refreshed once loaded
+    with torch.no_grad():
+        models[1].densenet[2].bias.add_(1)
+        expected[1] += 1
+    assert not torch.allclose(population_model(states), expected, atol=1e-5)
+    population_model.load(1)
+    assert torch.allclose(population_model(states), expected, atol=1e-5)
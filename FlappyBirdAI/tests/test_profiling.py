@@ -0,0 +1,27 @@
+import threading
+
+from profiling import Profiler
+
+
+def test_percentiles_while_timing():
+    profiler = Profiler(enabled=True, window=100)
+    done = threading.Event()
+
+    def time_stages():
+        while not done.is_set():
+            for name in ("act", "learn"):
+                with profiler.stage(name):
+                    pass
+
+    thread = threading.Thread(target=time_stages)
+    thread.start()
+    try:
+        # like the thread flushing the metrics, while the stages are timed
+        for _ in range(2000):
+            profiler.percentiles()
+    finally:
+        done.set()
+        thread.join()
+
+    assert set(profiler.percentiles()) == {f"{name}/p{percentile}" for name in ("act", "learn")
+                                           for percentile in Profiler.PERCENTILES}
@@ -0,0 +1,16 @@
+from net.model import Model
+from net.quantization import QuantizedActor
+
+
+def test_refreshes_on_steps_not_multiple_of_refresh_every():
+    actor = QuantizedActor(Model(input_dim=(84, 84)), refresh_every=4)
+
+    # called every 3 steps, like when updating every 3 frames
+    refreshed = []
+    for step in range(3, 22, 3):
+        quantized = actor.quantized
+        actor.step(step)
+        if actor.quantized is not quantized:
+            refreshed.append(step)
+
+    assert refreshed == [6, 12, 18]